@@ -41,13 +41,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.metrics.MetricsMiddleware",
+    "core.slowlog.SlowQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "core.dbrouter.ReplicaPinMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.querystats.QueryStatsMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -74,6 +79,9 @@ WSGI_APPLICATION = "config.wsgi.application"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 
+# "django.db.backends.mysql" opens one connection per request. To reuse
+# connections, opt in to the pooled backend (per-process pools, core.dbpool):
+#   DATABASES["default"]["ENGINE"] = "core.db.mysqlpool"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.mysql",
@@ -85,6 +93,44 @@ DATABASES = {
     }
 }
 
+# Read replica (core.dbrouter): reads of the core models go to the
+# DB_REPLICA_ALIAS database when it is configured, e.g.
+#   DATABASES["replica"] = {**DATABASES["default"], "HOST": "replica.internal"}
+# and writes to "default". A session that wrote reads from "default" for
+# DB_PIN_SECONDS, which must exceed the replication lag.
+DATABASE_ROUTERS = ["core.dbrouter.PrimaryReplicaRouter"]
+DB_REPLICA_ALIAS = "replica"
+DB_PIN_SECONDS = 5
+
+# Connection pool of core.db.mysqlpool (core.dbpool), used only when it is
+# the ENGINE, per alias and worker process: connections kept open, seconds a
+# checkout waits for a free one, age in seconds after which a connection is
+# replaced (None: never), and a ping before an idle connection is reused.
+# Keep CONN_MAX_AGE at 0.
+DB_POOL_SIZE = 10
+DB_POOL_TIMEOUT = 5
+DB_POOL_RECYCLE = 3600
+DB_POOL_PRE_PING = True
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Local memory works per process. To share the catalog cache between workers
+# switch to the file backend, e.g.
+#   "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+#   "LOCATION": BASE_DIR / "cache",
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "farmhouse",
+    }
+}
+
+# Cache alias and entry lifetime (seconds) used by core.catalog.
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = 3600
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,7 +172,103 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# BookingDetail maps the composite key (ID_prenotazione, ID_servizio) with two
+# primary-key ForeignKeys (cpkmodel); each one alone is not unique.
+SILENCED_SYSTEM_CHECKS = ["fields.W342"]
+
+# Django's default list, with PBKDF2 verification timed for /metrics
+# (core.hashers); the algorithm and the stored hashes are unchanged.
+PASSWORD_HASHERS = [
+    "core.hashers.TimedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 AUTHENTICATION_BACKENDS = [
-    "django.contrib.auth.backends.ModelBackend",
+    "core.backends.LocalModelBackend",
     "core.backends.UserBackend",
 ]
+
+# Password hashing pool used by the async login/register views (core.hashing):
+# number of hashes computed concurrently per process and executor kind
+# ("thread" or "process").
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_EXECUTOR = "thread"
+
+# Route /login/ and /register/ to the async views (ASGI deployments).
+ASYNC_AUTH_VIEWS = False
+
+# Route the read-only pages (homepage, services, events, profile) to their
+# async ORM variants (ASGI deployments); compare with `manage.py bench_asgi`.
+ASYNC_READ_VIEWS = False
+
+# Login throttle (core.throttle): token-bucket rates per username, client IP
+# and globally; a scope set to None is not limited. The buckets live in the
+# LOGIN_THROTTLE_CACHE_ALIAS cache (shared by all workers with a file backend).
+LOGIN_THROTTLE_RATES = {"username": "5/min", "ip": "20/min", "global": "300/min"}
+LOGIN_THROTTLE_CACHE_ALIAS = "default"
+
+# Per-process cache of logged-in users (core.usercache): seconds an entry is
+# served (0 disables it) and maximum number of entries.
+USER_CACHE_TTL = 300
+USER_CACHE_SIZE = 1000
+
+# Seconds after which the per-process availability index (core.availability)
+# is rebuilt from DETTAGLIO_PRENOTAZIONE to pick up other workers' bookings.
+AVAILABILITY_INDEX_TTL = 60
+
+# Per-request SQL instrumentation (core.querystats): fraction of requests
+# wrapped (0 disables it, 1.0 instruments every request while chasing a
+# regression), sampled requests kept per URL name for the staff summary at
+# /staff/queries/, and whether to send a Server-Timing header.
+QUERY_STATS_SAMPLE_RATE = 0.01
+QUERY_STATS_WINDOW = 200
+QUERY_STATS_SERVER_TIMING = True
+
+# Prometheus metrics (core.metrics) served at /metrics: directory of the
+# per-process mmap files shared by all workers (None keeps them in memory,
+# one worker per scrape) and client addresses allowed besides staff users
+# (an empty list allows everyone).
+METRICS_DIR = None
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# Slow-query capture (core.slowlog): statements slower than SLOW_QUERY_MS
+# milliseconds (None disables it) are appended to a rotating JSON-lines log;
+# `manage.py slow_queries` aggregates it.
+SLOW_QUERY_MS = None
+SLOW_QUERY_LOG = BASE_DIR / "logs" / "slow-queries.log"
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# On-demand profiling (core.profiling): staff requests carrying ?_profile=1
+# (cProfile) or ?_profile=sample (sampler, speedscope), or the X-Profile
+# header, are profiled; the files are listed at /staff/profiles/.
+PROFILING_ENABLED = True
+PROFILING_DIR = BASE_DIR / "profiles"
+PROFILING_KEEP = 50
+PROFILING_SAMPLE_INTERVAL = 0.001
+
+# Admin changelists (core.adminperf): unfiltered lists of tables with at least
+# this many rows show the row estimate of the database catalog instead of
+# running COUNT(*) (None always counts).
+ADMIN_APPROXIMATE_COUNT_THRESHOLD = 100000
+
+# Full-text search (core.search): MySQL uses the FULLTEXT indexes of
+# sql/db.sql; other databases use a per-process inverted index whose version
+# counters live in SEARCH_CACHE_ALIAS. Results returned (local index and
+# event search) and query words considered.
+SEARCH_MAX_RESULTS = 50
+SEARCH_MAX_TERMS = 8
+SEARCH_CACHE_ALIAS = "default"
+
+# Streaming exports (core.exports, `manage.py export_data` and the admin
+# export actions): rows fetched per round trip.
+EXPORT_CHUNK_SIZE = 2000
+
+# Service status scheduler (core.servicestatus, `manage.py
+# service_status_scheduler`): seconds between polls for new bookings, and
+# between full reconciliations of every service (None: at startup only).
+SERVICE_STATUS_POLL_SECONDS = 30
+SERVICE_STATUS_RESYNC_SECONDS = 86400
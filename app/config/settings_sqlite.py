@@ -0,0 +1,31 @@
+"""
+Settings profile running the project on SQLite instead of MySQL.
+
+The unmanaged core tables, the V_SERVIZI_DISPONIBILI view and the triggers
+are created from sql/sqlite.sql (core.sqlite_schema) on every new SQLite
+database, so no MySQL server is needed:
+
+    DJANGO_SETTINGS_MODULE=config.settings_sqlite python manage.py test core
+    DJANGO_SETTINGS_MODULE=config.settings_sqlite python manage.py migrate
+    DJANGO_SETTINGS_MODULE=config.settings_sqlite python manage.py bench_views
+
+Tests always run on an in-memory database. FARMHOUSE_SQLITE_NAME selects the
+database file used by the other commands (default: app/farmhouse.sqlite3).
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("FARMHOUSE_SQLITE_NAME", BASE_DIR / "farmhouse.sqlite3"),
+        # wait for the writer instead of failing with "database is locked"
+        "OPTIONS": {"timeout": 20},
+    }
+}
+
+# Build sql/sqlite.sql on new SQLite databases (core.sqlite_schema).
+SQLITE_SCHEMA = True
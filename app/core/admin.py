@@ -1,8 +1,13 @@
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth.hashers import make_password
-from django.db import transaction
-from . import models
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from . import bulk, enrollment, exports, models, usercache
+from .adminperf import PerformanceModelAdmin
 
 
 class EmployeeForm(forms.ModelForm):
@@ -33,14 +38,98 @@ class UserForm(forms.ModelForm):
             self.fields["password"].required = True
 
 
+class CloneWeekForm(forms.Form):
+    week = forms.DateField(help_text="Any day of the week to copy.")
+    weeks = forms.IntegerField(min_value=1, max_value=52, initial=1, help_text="Weeks ahead.")
+
+
+class DateRangeForm(forms.Form):
+    start = forms.DateField()
+    end = forms.DateField(help_text="Included.")
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get("start") and cleaned.get("end") and cleaned["end"] < cleaned["start"]:
+            raise forms.ValidationError("The end date is before the start date.")
+        return cleaned
+
+
+def bulk_form_action(modeladmin, request, queryset, form, title, apply):
+    """
+    Intermediate page of a bulk action taking parameters.
+
+    Renders `form` for the selected rows (or all filtered rows with "select
+    all"); once it is submitted and valid, runs apply(queryset, cleaned_data),
+    which returns the message to report, and goes back to the changelist.
+    """
+    if "apply" in request.POST and form.is_valid():
+        try:
+            message = apply(queryset, form.cleaned_data)
+        except DatabaseError as exc:
+            modeladmin.message_user(request, f"Nothing was changed: {exc}", messages.ERROR)
+        else:
+            modeladmin.message_user(request, message, messages.SUCCESS)
+        return None
+    return TemplateResponse(
+        request,
+        "admin/core/bulk_action.html",
+        {
+            **modeladmin.admin_site.each_context(request),
+            "title": title,
+            "opts": modeladmin.model._meta,
+            "form": form,
+            "action": request.POST["action"],
+            "select_across": request.POST.get("select_across") == "1",
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        },
+    )
+
+
+def composite_selection(modeladmin, request, queryset):
+    """
+    The action queryset of a composite-key (cpkmodel) model.
+
+    cpkmodel cannot combine the pk__in lookup of the selected rows with
+    other lookups, so the selection is rebuilt from the key columns.
+    """
+    if request.POST.get("select_across") == "1":
+        return queryset
+    key = [field.attname for field in modeladmin.model._meta.fields if field.primary_key]
+    selected = Q()
+    for value in request.POST.getlist(helpers.ACTION_CHECKBOX_NAME):
+        selected |= Q(**dict(zip(key, value.split(","))))
+    return modeladmin.get_queryset(request).filter(selected)
+
+
+def service_status_action(status, label):
+    def set_status(modeladmin, request, queryset):
+        updated = bulk.set_service_status(queryset, status)
+        modeladmin.message_user(request, f"{updated} services set to {status}.", messages.SUCCESS)
+
+    set_status.__name__ = f"set_status_{status.lower()}"
+    return admin.action(description=f"Set status: {label}", permissions=["change"])(set_status)
+
+
+def export_action(name, fmt):
+    """Admin action streaming the core.exports extract `name` of the selected rows."""
+    def export(modeladmin, request, queryset):
+        if queryset.model is exports.EXPORTS[name].model:
+            queryset = composite_selection(modeladmin, request, queryset)
+        return exports.response(name, exports.for_parents(name, queryset), fmt)
+
+    export.__name__ = f"export_{fmt}"
+    return admin.action(description=f"Export selected as {fmt.upper()}", permissions=["view"])(export)
+
+
 @admin.register(models.Person)
-class Person(admin.ModelAdmin):
+class Person(PerformanceModelAdmin):
     list_display = ("cf", "name", "surname", "phone", "city")
     search_fields = ("cf", "name", "surname")
 
 
 @admin.register(models.User)
-class User(admin.ModelAdmin):
+class User(PerformanceModelAdmin):
     form = UserForm
     list_display = ("username", "cf", "email")
     search_fields = ("username",)
@@ -60,85 +149,112 @@ class User(admin.ModelAdmin):
             obj.password = make_password(pwd)
         with transaction.atomic():
             obj.save()
+            username = obj.username
+            transaction.on_commit(lambda: usercache.cache.invalidate_username(username))
 
 
 @admin.register(models.Hosts)
-class Hosts(admin.ModelAdmin):
+class Hosts(PerformanceModelAdmin):
     list_display = ("cf", "username", "hosting_date")
     search_fields = ("cf", "username")
 
 
 @admin.register(models.Package)
-class Package(admin.ModelAdmin):
+class Package(PerformanceModelAdmin):
     list_display = ("id", "name", "description")
     search_fields = ("id",)
 
 
 @admin.register(models.Service)
-class Service(admin.ModelAdmin):
+class Service(PerformanceModelAdmin):
     list_display = ("id", "type", "price", "status")
+    list_filter = ("type", "status")
     search_fields = ("id",)
+    actions = [
+        # OCCUPATO follows the bookings (core.servicestatus): no action sets it
+        service_status_action("DISPONIBILE", "available"),
+        service_status_action("MANUTENZIONE", "maintenance"),
+    ]
 
 
 @admin.register(models.Compound)
-class Compound(admin.ModelAdmin):
+class Compound(PerformanceModelAdmin):
     list_display = ("package", "service")
     search_fields = ("id",)
 
 
 @admin.register(models.Purchase)
-class Purchase(admin.ModelAdmin):
+class Purchase(PerformanceModelAdmin):
     list_display = ("package", "username", "purchase_date")
     search_fields = ("id",)
 
 
 @admin.register(models.Restaurant)
-class Restaurant(admin.ModelAdmin):
+class Restaurant(PerformanceModelAdmin):
     list_display = ("id", "table_code", "max_capacity")
     search_fields = ("id",)
 
 
 @admin.register(models.Pool)
-class Pool(admin.ModelAdmin):
+class Pool(PerformanceModelAdmin):
     list_display = ("id", "sunbed_code")
     search_fields = ("id",)
 
 
 @admin.register(models.Playground)
-class Playground(admin.ModelAdmin):
+class Playground(PerformanceModelAdmin):
     list_display = ("id", "playground_code", "max_capacity")
     search_fields = ("id",)
 
 
 @admin.register(models.Room)
-class Room(admin.ModelAdmin):
+class Room(PerformanceModelAdmin):
     list_display = ("id", "room_code", "max_capacity")
     search_fields = ("id",)
 
 
 @admin.register(models.AnimalActivity)
-class AnimalActivity(admin.ModelAdmin):
+class AnimalActivity(PerformanceModelAdmin):
     list_display = ("id", "activity_code", "description")
-    search_fields = ("id",)
+    search_fields = ("description",)
+    search_source = "activities"
 
 
 @admin.register(models.Booking)
-class Booking(admin.ModelAdmin):
+class Booking(PerformanceModelAdmin):
     list_display = ("id", "username", "booking_date")
     search_fields = ("id",)
+    actions = [export_action("bookings", "csv"), export_action("bookings", "ndjson")]
 
 
 @admin.register(models.BookingDetail)
-class BookingDetails(admin.ModelAdmin):
+class BookingDetails(PerformanceModelAdmin):
     list_display = ("booking", "service", "start_date", "end_date")
-    search_fields = (
-        "booking",
-        "service",
-    )
+    search_fields = ("=booking", "=service")
+    actions = ["cancel_bookings"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # booking and service ids, matched on the key and FKriguarda_IND
+        if not search_term.strip():
+            return queryset, False
+        ids = [int(term) for term in search_term.split() if term.isdigit()]
+        return queryset.filter(Q(booking_id__in=ids) | Q(service_id__in=ids)), False
+
+    @admin.action(description="Cancel bookings in a date range…", permissions=["delete"])
+    def cancel_bookings(self, request, queryset):
+        today = timezone.localdate()
+        form = DateRangeForm(request.POST if "apply" in request.POST else None, initial={"start": today, "end": today})
+
+        def apply(queryset, data):
+            counts = bulk.cancel_bookings(queryset, data["start"], data["end"])
+            return f"Cancelled {counts['details']} booking details and {counts['bookings']} bookings left empty."
+
+        queryset = composite_selection(self, request, queryset)
+        return bulk_form_action(self, request, queryset, form, "Cancel bookings in a date range", apply)
 
 
 @admin.register(models.Review)
-class Review(admin.ModelAdmin):
+class Review(PerformanceModelAdmin):
     list_display = (
         "id",
         "service_type",
@@ -148,60 +264,96 @@ class Review(admin.ModelAdmin):
         "id_booking",
         "review_date",
     )
-    search_fields = ("id",)
+    search_fields = ("description",)
+    search_source = "reviews"
 
 
 @admin.register(models.Employee)
-class Employee(admin.ModelAdmin):
+class Employee(PerformanceModelAdmin):
     form = EmployeeForm
     list_display = ("username", "hire_date", "termination_date")
     search_fields = ("username",)
 
 
 @admin.register(models.Event)
-class Event(admin.ModelAdmin):
+class Event(PerformanceModelAdmin):
     list_display = ("id", "seats", "title", "description", "date", "username")
-    search_fields = ("id",)
+    search_fields = ("title", "description")
+    search_source = "events"
 
 
 @admin.register(models.Enrolls)
-class Enrolls(admin.ModelAdmin):
+class Enrolls(PerformanceModelAdmin):
     list_display = ("event", "username", "enroll_date", "participants")
     search_fields = ("id",)
+    actions = [export_action("enrollments", "csv"), export_action("enrollments", "ndjson")]
+
+    def delete_model(self, request, obj):
+        enrollment.cancel_enrollment(obj.event_id, obj.username_id)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            event_ids = set(queryset.values_list("event_id", flat=True))
+            queryset.delete()
+            for event_id in event_ids:
+                enrollment.promote_waitlist(event_id)
+
+
+@admin.register(models.Waitlist)
+class Waitlist(PerformanceModelAdmin):
+    list_display = ("id", "event", "username", "participants", "request_date")
+    list_filter = ("event",)
+    search_fields = ("username__username",)
 
 
 @admin.register(models.Product)
-class Product(admin.ModelAdmin):
+class Product(PerformanceModelAdmin):
     list_display = ("id", "name", "price")
     search_fields = ("id",)
 
 
 @admin.register(models.Order)
-class Order(admin.ModelAdmin):
+class Order(PerformanceModelAdmin):
     list_display = ("id", "username", "date")
     search_fields = ("id",)
+    actions = [export_action("orders", "csv"), export_action("orders", "ndjson")]
 
 
 @admin.register(models.OrderDetail)
-class OrderDetail(admin.ModelAdmin):
+class OrderDetail(PerformanceModelAdmin):
     list_display = ("order", "product", "quantity", "unit_price")
     search_fields = ("id",)
 
 
 @admin.register(models.EmployeeRoleHistory)
-class EmployeeRoleHistory(admin.ModelAdmin):
+class EmployeeRoleHistory(PerformanceModelAdmin):
     list_display = ("username", "role", "start_date", "end_date")
     search_fields = ("username",)
 
 
 @admin.register(models.Shift)
-class Shift(admin.ModelAdmin):
+class Shift(PerformanceModelAdmin):
     list_display = ("id", "day", "start_hour", "end_hour")
     search_fields = ("id", "day")
 
 
 @admin.register(models.Performs)
-class PerformsAdmin(admin.ModelAdmin):
+class PerformsAdmin(PerformanceModelAdmin):
     list_display = ("username", "shift", "start_date")
     search_fields = ("username__username", "shift__id")
     list_filter = ("shift__day",)
+    actions = ["clone_week"]
+
+    @admin.action(description="Clone a week of assignments…", permissions=["add"])
+    def clone_week(self, request, queryset):
+        form = CloneWeekForm(
+            request.POST if "apply" in request.POST else None,
+            initial={"week": bulk.week_start(timezone.localdate())},
+        )
+
+        def apply(queryset, data):
+            counts = bulk.clone_week(queryset, data["week"], data["weeks"])
+            return f"Created {counts['created']} assignments ({counts['skipped']} already present)."
+
+        queryset = composite_selection(self, request, queryset)
+        return bulk_form_action(self, request, queryset, form, "Clone a week of assignments", apply)
@@ -29,4 +29,13 @@ class StaffConfig(AppConfig):
 
         Avoid heavy work here (long-running tasks); keep it safe for tests.
         """
-        pass
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .slowlog import install
+        from .sqlite_schema import ensure_schema
+
+        # no-op unless SQLITE_SCHEMA is set (config.settings_sqlite)
+        connection_created.connect(ensure_schema, dispatch_uid="core.sqlite_schema")
+        # no-op unless SLOW_QUERY_MS is set
+        connection_created.connect(install, dispatch_uid="core.slowlog")
@@ -0,0 +1,284 @@
+"""
+In-memory availability engine for service bookings.
+
+Overview
+- Keeps one IntervalIndex per service, built from DETTAGLIO_PRENOTAZIONE
+  (BookingDetail) and kept up to date by the handlers registered in
+  core.signals (BookingDetail post_save, Booking post_delete).
+- Each index stores sorted start/end arrays plus the longest booked span, so
+  a conflict check is a bisect over the starts followed by a scan of the
+  (usually empty) window that can still overlap: O(log n + k).
+- Intervals are half-open [start, end): a room left on the 3rd can be booked
+  again from the 3rd.
+
+Public API
+- is_free(service, start, end): True when no booking overlaps the range.
+- booked(service, start, end): the DETTAGLIO_PRENOTAZIONE rows overlapping
+  the range, read from the database (the check made under the Service row
+  lock when a booking is written).
+- free_slots(service_type, day): free booking slots per service of a type.
+
+Notes
+- The index is per process. Writes made by other workers, and bulk deletes
+  of BookingDetail rows that bypass signals, are picked up when the index is
+  older than settings.AVAILABILITY_INDEX_TTL seconds (default 60) and gets
+  rebuilt on the next lookup. It is a fast pre-filter only: writers confirm
+  with booked() inside their transaction.
+- Legacy rows stored with data_inizio == data_fine (date-only bookings) are
+  treated as occupying the whole day.
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from django.conf import settings
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+
+from . import dbrouter
+from .models import BookingDetail, Service
+
+# Start hours offered on the services page; every slot lasts SLOT_LENGTH.
+SLOT_HOURS = (8, 10, 12, 14, 16, 18, 20)
+SLOT_LENGTH = timedelta(hours=2)
+
+Interval = Tuple[datetime, datetime]
+
+
+class IntervalIndex:
+    """
+    Sorted start/end arrays for the bookings of a single service.
+
+    Entries are kept ordered by (start, key) so add/remove stay O(log n)
+    lookups plus the list shift. max_span is an upper bound on the length of
+    any stored interval; it is never decreased on removal, which keeps the
+    overlap window correct without rescanning.
+    """
+
+    __slots__ = ("starts", "entries", "max_span")
+
+    def __init__(self):
+        self.starts: List[Tuple[datetime, int]] = []
+        self.entries: Dict[int, Interval] = {}
+        self.max_span = timedelta(0)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, key: int, start: datetime, end: datetime) -> None:
+        if key in self.entries:
+            self.remove(key)
+        insort(self.starts, (start, key))
+        self.entries[key] = (start, end)
+        if end - start > self.max_span:
+            self.max_span = end - start
+
+    def remove(self, key: int) -> None:
+        interval = self.entries.pop(key, None)
+        if interval is None:
+            return
+        i = bisect_left(self.starts, (interval[0], key))
+        if i < len(self.starts) and self.starts[i] == (interval[0], key):
+            del self.starts[i]
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Interval]:
+        """
+        Return the stored intervals that intersect [start, end).
+
+        Only entries starting in (start - max_span, end) can overlap, so the
+        scan is limited to that slice of the sorted starts.
+        """
+        lo = bisect_right(self.starts, (start - self.max_span, float("inf")))
+        hi = bisect_left(self.starts, (end, -1))
+        found = []
+        for s, key in self.starts[lo:hi]:
+            e = self.entries[key][1]
+            if e > start:
+                found.append((s, e))
+        return found
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        lo = bisect_right(self.starts, (start - self.max_span, float("inf")))
+        hi = bisect_left(self.starts, (end, -1))
+        return all(self.entries[key][1] <= start for _, key in self.starts[lo:hi])
+
+
+class AvailabilityEngine:
+    """
+    Registry of per-service IntervalIndex objects.
+
+    The registry is built lazily on first use with a single query over the
+    bookings that have not ended yet, then maintained incrementally through
+    add_detail/remove_booking. All access goes through a lock so the engine
+    can be shared by the threads of one worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._indexes: Dict[int, IntervalIndex] = {}
+        self._services_by_booking: Dict[int, Set[int]] = {}
+        self._built_at: Optional[float] = None
+
+    # -- building -----------------------------------------------------------
+
+    def _ttl(self) -> float:
+        return getattr(settings, "AVAILABILITY_INDEX_TTL", 60)
+
+    def _ensure_built(self) -> None:
+        if self._built_at is not None and time.monotonic() - self._built_at < self._ttl():
+            return
+        # from the primary: a rebuild after invalidate() must see the change
+        rows = BookingDetail.objects.using(dbrouter.rebuild_alias()).filter(
+            end_date__gte=timezone.now() - timedelta(days=1)
+        ).values_list("booking_id", "service_id", "start_date", "end_date")
+        self._indexes = {}
+        self._services_by_booking = {}
+        for booking_id, service_id, start, end in rows.iterator():
+            self._add(booking_id, service_id, start, end)
+        self._built_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Drop the registry; it is rebuilt on the next lookup."""
+        with self._lock:
+            self._indexes = {}
+            self._services_by_booking = {}
+            self._built_at = None
+
+    # -- incremental maintenance ---------------------------------------------
+
+    def _add(self, booking_id, service_id, start, end) -> None:
+        start, end = normalize(start, end)
+        self._indexes.setdefault(service_id, IntervalIndex()).add(booking_id, start, end)
+        self._services_by_booking.setdefault(booking_id, set()).add(service_id)
+
+    def add_detail(self, detail: BookingDetail) -> None:
+        with self._lock:
+            if self._built_at is not None:
+                self._add(
+                    detail.booking_id,
+                    detail.service_id,
+                    detail.start_date,
+                    detail.end_date,
+                )
+
+    def remove_booking(self, booking_id: int) -> None:
+        """Drop every interval that belongs to the given Booking."""
+        with self._lock:
+            for service_id in self._services_by_booking.pop(booking_id, ()):
+                index = self._indexes.get(service_id)
+                if index is not None:
+                    index.remove(booking_id)
+
+    # -- queries --------------------------------------------------------------
+
+    def is_free(self, service_id: int, start: datetime, end: datetime) -> bool:
+        start, end = normalize(start, end)
+        with self._lock:
+            self._ensure_built()
+            index = self._indexes.get(service_id)
+            return index is None or index.is_free(start, end)
+
+    def busy(self, service_id: int, start: datetime, end: datetime) -> List[Interval]:
+        start, end = normalize(start, end)
+        with self._lock:
+            self._ensure_built()
+            index = self._indexes.get(service_id)
+            return [] if index is None else index.overlapping(start, end)
+
+
+engine = AvailabilityEngine()
+
+
+def _as_datetime(value: Union[date, datetime]) -> datetime:
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, dtime.min)
+    if settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def normalize(start: Union[date, datetime], end: Union[date, datetime]) -> Interval:
+    """
+    Return (start, end) as comparable datetimes.
+
+    Zero-length ranges come from date-only bookings and are widened to the
+    whole day so they keep blocking it.
+    """
+    start, end = _as_datetime(start), _as_datetime(end)
+    if end <= start:
+        day = timezone.localtime(start).date() if settings.USE_TZ else start.date()
+        end = _as_datetime(day + timedelta(days=1))
+    return start, end
+
+
+def is_free(
+    service: Union[Service, int],
+    start: Union[date, datetime],
+    end: Union[date, datetime],
+) -> bool:
+    """
+    Return True if `service` (instance or id) has no booking overlapping
+    [start, end).
+    """
+    service_id = service.pk if isinstance(service, Service) else int(service)
+    return engine.is_free(service_id, start, end)
+
+
+def booked(
+    service: Union[Service, int],
+    start: Union[date, datetime],
+    end: Union[date, datetime],
+) -> QuerySet:
+    """
+    Return the BookingDetail rows of `service` overlapping [start, end),
+    legacy date-only rows counting as their whole day.
+    """
+    service_id = service.pk if isinstance(service, Service) else int(service)
+    start, end = normalize(start, end)
+    return BookingDetail.objects.filter(service_id=service_id).filter(
+        Q(start_date__lt=end, end_date__gt=start)
+        | Q(end_date=F("start_date"), start_date__lt=end, start_date__gt=start - timedelta(days=1))
+    )
+
+
+def day_slots(day: date) -> List[Interval]:
+    """Return the bookable [start, end) slots of `day` as datetimes."""
+    return [
+        (
+            _as_datetime(datetime.combine(day, dtime(hour))),
+            _as_datetime(datetime.combine(day, dtime(hour))) + SLOT_LENGTH,
+        )
+        for hour in SLOT_HOURS
+    ]
+
+
+def free_slots(
+    service_type: str,
+    day: date,
+    service_ids: Optional[Iterable[int]] = None,
+) -> Dict[int, List[Interval]]:
+    """
+    Return {service_id: [free (start, end) slots]} for the available
+    services of `service_type` on `day`.
+
+    Rooms (CAMERA) are booked by the night, so their only slot is the whole
+    day. Pass service_ids when the caller already holds the catalog to avoid
+    the lookup query.
+    """
+    if service_ids is None:
+        service_ids = Service.objects.filter(
+            type=service_type, status="DISPONIBILE"
+        ).values_list("id", flat=True)
+
+    if service_type.upper() == "CAMERA":
+        slots = [normalize(day, day)]
+    else:
+        slots = day_slots(day)
+
+    return {
+        service_id: [slot for slot in slots if engine.is_free(service_id, *slot)]
+        for service_id in service_ids
+    }
@@ -5,7 +5,13 @@ Overview
 - Checks credentials against UserModel (which maps the UTENTE table).
 - On successful authentication returns (or creates) a local Django User and
   synchronizes basic attributes (email, is_staff, is_superuser) using StaffModel.
-- Uses transaction.atomic around the user sync to avoid partial updates.
+- The UTENTE row and its DIPENDENTE membership are fetched with one joined
+  query; the local user is written only when one of the synced attributes
+  actually differs, so a repeat login costs two SELECTs and no write.
+- Uses transaction.atomic around the user creation to avoid partial state.
+- get_user() is served from the per-process cache in core.usercache.
+- Every attempt is charged to the login throttle (core.throttle) before the
+  password is hashed; over-limit attempts fail without any PBKDF2 work.
 
 Security notes
 - This backend prefers hashed passwords (checked with django.check_password).
@@ -17,11 +23,13 @@ Security notes
 
 from typing import Optional
 
-from django.contrib.auth.backends import BaseBackend
+from asgiref.sync import sync_to_async
+from django.contrib.auth.backends import BaseBackend, ModelBackend
 from django.contrib.auth.models import User as DjangoUser
 from django.contrib.auth.hashers import check_password
 from django.db import transaction
 
+from . import hashing, throttle, usercache
 from .models import User, Employee
 
 
@@ -58,10 +66,17 @@ class UserBackend(BaseBackend):
         """
         if not username or not password:
             return None
-
-        try:
-            u = User.objects.get(username=username)
-        except User.DoesNotExist:
+        # raises Throttled (PermissionDenied) before any hashing when over limit
+        throttle.limiter.check(request, username)
+
+        # UTENTE row and its DIPENDENTE membership in one LEFT JOIN
+        u = (
+            User.objects.select_related("employee")
+            .only("username", "password", "email", "employee__username")
+            .filter(username=username)
+            .first()
+        )
+        if u is None:
             return None
 
         stored = u.password or ""
@@ -69,41 +84,112 @@ class UserBackend(BaseBackend):
         if not (stored and (check_password(password, stored) or stored == password)):
             return None
 
-        # Synchronize/create local Django user inside a transaction to avoid partial state.
-        with transaction.atomic():
-            user, created = DjangoUser.objects.get_or_create(
-                username=username,
-                defaults={"email": u.email or "", "first_name": "", "last_name": ""},
-            )
-
-            # Determine staff/superuser flags from StaffModel (DIPENDENTE)
-            try:
-                d = Employee.objects.get(username=username)
-                user.is_staff = True
-                user.is_superuser = True
-                # user.is_superuser = getattr(d, "ruolo", "").lower() == "admin"
-            except Employee.DoesNotExist:
-                user.is_staff = False
-                user.is_superuser = False
-
-            # If the local Django user has no usable password, keep it unusable
-            # because auth is handled by the external table.
-            if not user.has_usable_password():
-                user.set_unusable_password()
-
-            # Keep email in sync if available
-            if u.email and user.email != u.email:
-                user.email = u.email
-
-            user.save()
+        return self._sync_user(username, u.email, self._is_employee(u))
+
+    async def aauthenticate(
+        self,
+        request,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        **kwargs
+    ) -> Optional[DjangoUser]:
+        """
+        Async variant of authenticate() for ASGI deployments.
+
+        The PBKDF2 verification runs on core.hashing.pool so the event loop
+        keeps serving other requests while it is computed.
+        """
+        if not username or not password:
+            return None
+        await sync_to_async(throttle.limiter.check)(request, username)
+
+        u = await (
+            User.objects.select_related("employee")
+            .only("username", "password", "email", "employee__username")
+            .filter(username=username)
+            .afirst()
+        )
+        if u is None:
+            return None
+
+        stored = u.password or ""
+        if not (stored and (await hashing.acheck_password(password, stored) or stored == password)):
+            return None
 
+        return await sync_to_async(self._sync_user)(username, u.email, self._is_employee(u))
+
+    @staticmethod
+    def _is_employee(u: User) -> bool:
+        try:
+            return u.employee is not None
+        except Employee.DoesNotExist:
+            return False
+
+    def _sync_user(
+        self, username: str, email: Optional[str], is_staff: bool
+    ) -> DjangoUser:
+        """
+        Return the local Django user, creating or updating it only when needed.
+
+        An unchanged user costs a single SELECT and no write.
+        """
+        wanted = {"is_staff": is_staff, "is_superuser": is_staff}
+        if email:
+            wanted["email"] = email
+
+        user = DjangoUser.objects.filter(username=username).first()
+        if user is None:
+            # Synchronize/create local Django user inside a transaction to avoid partial state.
+            with transaction.atomic():
+                user, created = DjangoUser.objects.get_or_create(
+                    username=username,
+                    defaults={"email": email or "", "first_name": "", "last_name": ""},
+                )
+                if created:
+                    # auth is handled by the external table
+                    user.set_unusable_password()
+                    for field, value in wanted.items():
+                        setattr(user, field, value)
+                    user.save()
+                    return user
+
+        changed = [f for f, value in wanted.items() if getattr(user, f) != value]
+        if changed:
+            for field in changed:
+                setattr(user, field, wanted[field])
+            user.save(update_fields=changed)
         return user
 
     def get_user(self, user_id: int) -> Optional[DjangoUser]:
         """
         Retrieve the Django User by primary key. Required by Django auth.
+
+        Served from core.usercache, which also loads the UTENTE row used by
+        the views, so a logged-in page usually needs no query for either.
         """
-        try:
-            return DjangoUser.objects.get(pk=user_id)
-        except DjangoUser.DoesNotExist:
-            return None
+        return usercache.cache.get_user(user_id)
+
+
+class LocalModelBackend(ModelBackend):
+    """
+    ModelBackend for local Django accounts (e.g. createsuperuser admins).
+
+    Django's ModelBackend.aauthenticate hashes the password directly on the
+    event loop when the username is unknown (timing mitigation). This variant
+    runs the whole synchronous check in a worker thread instead. get_user()
+    goes through core.usercache like UserBackend's.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is not None and password is not None:
+            throttle.limiter.check(request, username)
+        return super().authenticate(request, username=username, password=password, **kwargs)
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        return await sync_to_async(self.authenticate)(
+            request, username=username, password=password, **kwargs
+        )
+
+    def get_user(self, user_id):
+        user = usercache.cache.get_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,132 @@
+"""
+Set-based bulk operations behind the admin actions of core/admin.py.
+
+Overview
+- set_service_status(queryset, status): one UPDATE of SERVIZIO.status for
+  every selected service (e.g. 200 sunbeds before a pool maintenance day).
+  Only DISPONIBILE and MANUTENZIONE can be set: OCCUPATO is owned by the
+  service status scheduler (core.servicestatus), which would release a
+  service set OCCUPATO by hand at its next transition.
+- clone_week(queryset, week, weeks=1): copies the SVOLGE assignments of
+  `queryset` starting in the week of `week` to the same weekday and hour
+  `weeks` weeks later, with one bulk INSERT. Assignments that already exist
+  in the target week are skipped.
+- cancel_bookings(queryset, start, end): one DELETE of the
+  DETTAGLIO_PRENOTAZIONE rows of `queryset` starting between the two dates
+  (inclusive), then one DELETE of the PRENOTAZIONE rows left without
+  details and without reviews (through the ORM, so the Booking delete
+  signals still run).
+- Each runs in one transaction on the primary (reads inside it are not
+  routed to a replica, see core.dbrouter) and returns the affected row
+  counts; no row is loaded into a model instance and saved one by one.
+
+Triggers and caches
+- The statements go through the database like any other write, so the
+  schema triggers (trg_check_dipendente_turni on svolge,
+  trg_check_pacchetto_servizi on composto, ...) still run; when one of them
+  signals, the whole operation is rolled back and the DatabaseError reaches
+  the caller (the admin reports it).
+- Set-based statements send no post_save/post_delete signals, so the
+  caches those signals maintain are refreshed here once the transaction
+  commits: the catalog cache version is bumped after status changes, the
+  availability index is rebuilt after cancellations.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from . import catalog
+from .availability import engine
+from .models import Booking, BookingDetail, Performs, Review
+
+# statuses set by hand; OCCUPATO follows the bookings (core.servicestatus)
+SERVICE_STATUSES = ("DISPONIBILE", "MANUTENZIONE")
+
+
+def _day_start(day: date) -> datetime:
+    value = datetime.combine(day, time.min)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def week_start(day: date) -> date:
+    """Monday of the week of `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def set_service_status(queryset: QuerySet, status: str) -> int:
+    """Set the status of every service of `queryset`; returns the rows updated."""
+    if status not in SERVICE_STATUSES:
+        raise ValueError(f"Unknown service status {status!r}.")
+    with transaction.atomic():
+        updated = queryset.exclude(status=status).update(status=status)
+        transaction.on_commit(catalog.cache.bump)
+    return updated
+
+
+def clone_week(queryset: QuerySet, week: date, weeks: int = 1) -> Dict[str, int]:
+    """
+    Copy the assignments of `queryset` starting in the week of `week`
+    `weeks` weeks ahead.
+
+    Returns {"created": n, "skipped": n}, skipped counting the assignments
+    already present in the target week.
+    """
+    if weeks < 1:
+        raise ValueError("weeks must be at least 1")
+    start = _day_start(week_start(week))
+    shift = timedelta(weeks=weeks)
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(start_date__gte=start, start_date__lt=start + timedelta(days=7))
+            .values_list("username_id", "shift_id", "start_date")
+        )
+        existing = set(
+            Performs.objects
+            .filter(
+                start_date__gte=start + shift,
+                start_date__lt=start + shift + timedelta(days=7),
+                username_id__in={username for username, _, _ in rows},
+            )
+            .values_list("username_id", "shift_id", "start_date")
+        )
+        clones = [
+            Performs(username_id=username, shift_id=shift_id, start_date=start_date + shift)
+            for username, shift_id, start_date in dict.fromkeys(rows)
+            if (username, shift_id, start_date + shift) not in existing
+        ]
+        Performs.objects.bulk_create(clones)
+    return {"created": len(clones), "skipped": len(rows) - len(clones)}
+
+
+def cancel_bookings(queryset: QuerySet, start: date, end: date) -> Dict[str, int]:
+    """
+    Delete the booking details of `queryset` starting from `start` to `end`
+    (inclusive), and the bookings they leave empty.
+
+    Returns {"details": n, "bookings": n}. Bookings that still have other
+    details, or a review, are kept.
+    """
+    if end < start:
+        raise ValueError("The end date is before the start date.")
+    with transaction.atomic():
+        details = queryset.filter(
+            start_date__gte=_day_start(start), start_date__lt=_day_start(end + timedelta(days=1))
+        )
+        booking_ids = set(details.values_list("booking_id", flat=True))
+        # BookingDetail has no delete receivers: a single fast DELETE
+        deleted_details = details.delete()[0]
+        # (cpkmodel cannot join the composite-key table from Booking)
+        emptied = (
+            booking_ids
+            - set(BookingDetail.objects.filter(booking_id__in=booking_ids).values_list("booking_id", flat=True))
+            - set(Review.objects.filter(id_booking__in=booking_ids).values_list("id_booking_id", flat=True))
+        )
+        if emptied:
+            Booking.objects.filter(id__in=emptied).delete()
+        transaction.on_commit(engine.invalidate)
+    return {"details": deleted_details, "bookings": len(emptied)}
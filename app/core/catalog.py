@@ -0,0 +1,209 @@
+"""
+Service catalog loader.
+
+Overview
+- Reads every available SERVIZIO row together with its subtype row
+  (CAMERA, PISCINA, ATTIVITA_CON_ANIMALI, CAMPO_DA_GIOCO, RISTORANTE) in a
+  single LEFT JOIN query, the same shape as the V_SERVIZI_DISPONIBILI view.
+- Returns typed entries: the subtype model instance (Room, Pool, ...) whose
+  `id` attribute already holds the joined Service, so templates can use
+  `istanza.id.price` without extra queries.
+
+Public API
+- load_catalog(service_type=None, using=None): {tipo_servizio: [subtype
+  instances]}
+- type_summaries(catalog): one Service per type (homepage cards)
+- normalize_type(value): maps the English aliases used by book_service
+  (ROOM, POOL, ...) to the tipo_servizio values stored in the database.
+- cache: process-wide CatalogCache holding the grouped catalog and the
+  per-type summaries under a version counter.
+
+Caching
+- The version counter and the data live in the Django cache selected by
+  settings.CATALOG_CACHE_ALIAS (locmem or file backend out of the box).
+  Each process also keeps the last payload in memory and serves it as long
+  as the stored version is unchanged, so a hit costs one version lookup.
+- core.signals bumps the version on post_save/post_delete of Service and its
+  five subtype models, core.servicestatus after it flips service statuses,
+  and the `invalidate_catalog` management command after changes made with
+  raw SQL.
+- Entries also expire after settings.CATALOG_CACHE_TIMEOUT seconds, which
+  bounds staleness for changes made outside Django.
+- A miss reloads from the primary (core.dbrouter.rebuild_alias()), never the
+  replica: the version was just bumped, and a lagging replica would put the
+  old catalog in the cache under the new version.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Model, QuerySet
+
+from . import dbrouter
+from .models import Service
+
+# tipo_servizio -> reverse one-to-one accessor on Service
+SUBTYPE_RELATIONS = {
+    "CAMERA": "room",
+    "PISCINA": "pool",
+    "ATTIVITA_CON_ANIMALI": "animalactivity",
+    "CAMPO_DA_GIOCO": "playground",
+    "RISTORANTE": "restaurant",
+}
+
+TYPE_ALIASES = {
+    "ROOM": "CAMERA",
+    "POOL": "PISCINA",
+    "ANIMAL_ACTIVITY": "ATTIVITA_CON_ANIMALI",
+    "PLAYGROUND": "CAMPO_DA_GIOCO",
+    "RESTAURANT": "RISTORANTE",
+}
+
+
+def normalize_type(value: Optional[str]) -> Optional[str]:
+    """Return the database tipo_servizio for `value` (alias or native name)."""
+    if not value:
+        return value
+    value = value.upper()
+    return TYPE_ALIASES.get(value, value)
+
+
+def catalog_queryset(
+    service_type: Optional[str] = None, available_only: bool = True
+) -> QuerySet:
+    """
+    Services joined with all subtype tables, ordered by type then id.
+
+    One query regardless of how many service types exist.
+    """
+    qs = Service.objects.select_related(*SUBTYPE_RELATIONS.values())
+    if available_only:
+        qs = qs.filter(status="DISPONIBILE")
+    if service_type:
+        qs = qs.filter(type=normalize_type(service_type))
+    return qs.order_by("type", "id")
+
+
+def _subtype_instance(service: Service) -> Optional[Model]:
+    relation = SUBTYPE_RELATIONS.get(service.type)
+    if relation is None:
+        return None
+    # select_related caches a missing reverse one-to-one as "does not exist",
+    # which getattr turns into None without hitting the database.
+    return getattr(service, relation, None)
+
+
+def load_catalog(
+    service_type: Optional[str] = None, available_only: bool = True, using: Optional[str] = None
+) -> Dict[str, List[Model]]:
+    """
+    Return {tipo_servizio: [subtype instances]} in one round trip.
+
+    Services without a matching subtype row are skipped, as the per-type
+    subtype queries used to do. `using` forces a database alias.
+    """
+    grouped: Dict[str, List[Model]] = {}
+    for service in catalog_queryset(service_type, available_only).using(using):
+        instance = _subtype_instance(service)
+        if instance is not None:
+            grouped.setdefault(service.type, []).append(instance)
+    return grouped
+
+
+def type_summaries(catalog: Dict[str, List[Model]]) -> List[Service]:
+    """Return the first Service of each type, in catalog order."""
+    return [instances[0].id for instances in catalog.values() if instances]
+
+
+class CatalogCache:
+    """
+    Versioned cache for the available-services catalog.
+
+    Counters (hits, misses) are per process and meant for monitoring; see
+    stats().
+    """
+
+    VERSION_KEY = "catalog:version"
+    DATA_KEY = "catalog:data:%s"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = None  # (version, payload, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+    @property
+    def timeout(self) -> Optional[int]:
+        return getattr(settings, "CATALOG_CACHE_TIMEOUT", 3600)
+
+    def version(self) -> int:
+        """Return the current version, initialising it if missing."""
+        version = self.backend.get(self.VERSION_KEY)
+        if version is None:
+            # A fresh, unique start value so an evicted counter never
+            # collides with a version still held in memory.
+            self.backend.add(self.VERSION_KEY, time.time_ns(), timeout=None)
+            version = self.backend.get(self.VERSION_KEY)
+        return version
+
+    def bump(self) -> None:
+        """Invalidate every cached payload by moving to a new version."""
+        try:
+            self.backend.incr(self.VERSION_KEY)
+        except ValueError:
+            self.backend.add(self.VERSION_KEY, time.time_ns(), timeout=None)
+        with self._lock:
+            self._local = None
+
+    def get(self) -> dict:
+        """
+        Return {"catalog": {...}, "summaries": [...]} for the current version,
+        loading it from the database only on a miss.
+        """
+        version = self.version()
+        now = time.monotonic()
+        local = self._local
+        if local is not None and local[0] == version and local[2] > now:
+            self._count(hit=True)
+            return local[1]
+
+        key = self.DATA_KEY % version
+        payload = self.backend.get(key)
+        if payload is None:
+            self._count(hit=False)
+            grouped = load_catalog(using=dbrouter.rebuild_alias())
+            payload = {"catalog": grouped, "summaries": type_summaries(grouped)}
+            self.backend.set(key, payload, timeout=self.timeout)
+        else:
+            self._count(hit=True)
+
+        expires_at = now + self.timeout if self.timeout else float("inf")
+        with self._lock:
+            self._local = (version, payload, expires_at)
+        return payload
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+cache = CatalogCache()
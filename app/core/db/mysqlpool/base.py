@@ -0,0 +1,42 @@
+"""
+MySQL backend with pooled connections.
+
+Same as django.db.backends.mysql (mysqlclient), except that connections
+come from, and go back to, the pool of the alias in core.dbpool:
+
+    DATABASES = {"default": {"ENGINE": "core.db.mysqlpool", ...}}
+
+Pool size, checkout timeout, recycling and pre-ping are configured with the
+DB_POOL_* settings (see core.dbpool). A connection closed inside an atomic
+block is closed for real rather than returned to the pool.
+"""
+
+from functools import partial
+
+from django.db.backends.mysql import base
+
+from core import dbpool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        pool = dbpool.registry.get(
+            self.alias, partial(base.DatabaseWrapper.get_new_connection, self, conn_params)
+        )
+        try:
+            return pool.checkout()
+        except dbpool.PoolTimeout as exc:
+            # wrapped into django.db.OperationalError by ensure_connection()
+            raise base.Database.OperationalError(str(exc)) from exc
+
+    def _close(self):
+        if self.connection is not None:
+            pool = dbpool.registry.pool(self.alias)
+            if pool is None:
+                super()._close()
+            elif self.in_atomic_block:
+                # closed mid-transaction (error, close_old_connections()):
+                # do not hand it to another request
+                pool.discard(self.connection)
+            else:
+                pool.checkin(self.connection)
@@ -0,0 +1,274 @@
+"""
+Per-process pool of DB-API connections, used by the core.db.mysqlpool backend.
+
+Overview
+- Django opens a database connection the first time a thread queries and
+  closes it when the request finishes (CONN_MAX_AGE = 0). With ENGINE
+  "core.db.mysqlpool", opening checks a connection out of the pool of the
+  database alias and closing returns it, so a request pays the TCP and
+  authentication handshake only when the pool has to grow.
+- ConnectionPool works with any DB-API 2.0 driver: it only needs a
+  zero-argument `connect` callable (mysqlclient bound to the connection
+  settings in production, a fake driver in the tests).
+- At most DB_POOL_SIZE connections are open per alias and process, idle and
+  in use together. When all of them are in use, a checkout waits up to
+  DB_POOL_TIMEOUT seconds for one to come back, then raises PoolTimeout
+  (an OperationalError for Django code).
+- Idle connections are reused most recently returned first: a steady load
+  keeps reusing a warm core while the surplus of a burst ages out.
+
+Health checks
+- Connections older than DB_POOL_RECYCLE seconds are closed and replaced
+  when they come up for reuse, well before the server's wait_timeout
+  (8 hours by default on MySQL) drops them.
+- With DB_POOL_PRE_PING, an idle connection is pinged before it is handed
+  out (conn.ping() when the driver has it, SELECT 1 otherwise). A dead one,
+  e.g. after a server restart, is replaced by a new connection.
+- Returned connections are rolled back; one that fails the rollback is
+  discarded instead of going back to the pool. The backend discards the
+  connections Django closes inside an atomic block: their state (open
+  transaction, session variables, a half-read result) is not trusted.
+
+Metrics
+- stats() of a pool: size, open, in_use, idle and the counters checkouts,
+  waits (checkouts that had to wait), timeouts, created, recycled,
+  ping_failures and discarded. registry.stats() has one entry per alias;
+  core.metrics exports them as farmhouse_db_pool_*.
+
+Settings
+- DB_POOL_SIZE: connections per alias and process (default 10).
+- DB_POOL_TIMEOUT: seconds a checkout waits for a free connection (default 5).
+- DB_POOL_RECYCLE: seconds after which a connection is replaced (default
+  3600; None keeps connections until they fail).
+- DB_POOL_PRE_PING: ping idle connections before reuse (default True).
+
+Notes
+- Pools are per process, like the other stats() of the core modules. A
+  process forked after using a pool (e.g. gunicorn --preload) drops the
+  inherited connections without closing them, since the parent still owns
+  their sockets.
+- Keep CONN_MAX_AGE at 0 with the pooled backend: a persistent connection
+  would stay checked out by its thread between requests.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def ping(conn) -> bool:
+    """True when `conn` still answers."""
+    try:
+        method = getattr(conn, "ping", None)
+        if method is not None:
+            method()
+        else:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+class ConnectionPool:
+    """Bounded pool of connections made by `connect`; see the module docstring."""
+
+    COUNTERS = ("checkouts", "waits", "timeouts", "created", "recycled", "ping_failures", "discarded")
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        size: int = 10,
+        timeout: float = 5,
+        recycle: Optional[float] = 3600,
+        pre_ping: bool = True,
+        name: str = "default",
+    ):
+        if size < 1:
+            raise ValueError("The pool size must be at least 1.")
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.name = name
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self._pid = os.getpid()
+        self._idle: List[Tuple[Any, float]] = []  # (connection, created at)
+        self._checked_out: Dict[int, float] = {}  # id(connection) -> created at
+        self._open = 0
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def _check_pid(self) -> None:
+        # called with the lock held
+        if self._pid != os.getpid():
+            self._reset_state()
+
+    # -- checkout / checkin ---------------------------------------------------
+
+    def checkout(self):
+        """Return a healthy connection, opening one if the pool is not full."""
+        with self._cond:
+            self._check_pid()
+            deadline = None
+            while not self._idle and self._open >= self.size:
+                if deadline is None:
+                    self.counters["waits"] += 1
+                    deadline = time.monotonic() + self.timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No free connection in pool {self.name!r} "
+                        f"({self.size} in use) after {self.timeout}s."
+                    )
+                self._cond.wait(remaining)
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                self._open += 1
+            self.counters["checkouts"] += 1
+
+        # the slot is reserved: health checks and connects run unlocked
+        try:
+            if entry is not None and self._reusable(*entry):
+                conn, created = entry
+            else:
+                conn, created = self.connect(), time.monotonic()
+                with self._cond:
+                    self.counters["created"] += 1
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._checked_out[id(conn)] = created
+        return conn
+
+    def _reusable(self, conn, created: float) -> bool:
+        if self.recycle is not None and time.monotonic() - created >= self.recycle:
+            _close_quietly(conn)
+            with self._cond:
+                self.counters["recycled"] += 1
+            return False
+        if self.pre_ping and not ping(conn):
+            _close_quietly(conn)
+            with self._cond:
+                self.counters["ping_failures"] += 1
+            return False
+        return True
+
+    def checkin(self, conn) -> None:
+        """Take back a connection returned by checkout()."""
+        with self._cond:
+            self._check_pid()
+            created = self._checked_out.pop(id(conn), None)
+        if created is None:
+            # not ours: opened before a fork, or returned twice
+            return
+
+        try:
+            conn.rollback()
+            keep = True
+        except Exception:
+            keep = False
+            _close_quietly(conn)
+
+        with self._cond:
+            if keep:
+                self._idle.append((conn, created))
+            else:
+                self._open -= 1
+                self.counters["discarded"] += 1
+            self._cond.notify()
+
+    def discard(self, conn) -> None:
+        """Close a connection returned by checkout() and free its slot."""
+        with self._cond:
+            self._check_pid()
+            created = self._checked_out.pop(id(conn), None)
+            if created is not None:
+                self._open -= 1
+                self.counters["discarded"] += 1
+                self._cond.notify()
+        if created is not None:
+            _close_quietly(conn)
+
+    def close(self) -> None:
+        """Close the idle connections; checked-out ones close on checkin failure."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._open - len(self._idle),
+                "idle": len(self._idle),
+                **self.counters,
+            }
+
+
+class PoolRegistry:
+    """One ConnectionPool per database alias, configured from settings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, ConnectionPool] = {}
+
+    def get(self, alias: str, connect: Callable[[], Any]) -> ConnectionPool:
+        with self._lock:
+            pool = self._pools.get(alias)
+            if pool is None:
+                pool = self._pools[alias] = ConnectionPool(
+                    connect,
+                    size=getattr(settings, "DB_POOL_SIZE", 10),
+                    timeout=getattr(settings, "DB_POOL_TIMEOUT", 5),
+                    recycle=getattr(settings, "DB_POOL_RECYCLE", 3600),
+                    pre_ping=getattr(settings, "DB_POOL_PRE_PING", True),
+                    name=alias,
+                )
+            return pool
+
+    def pool(self, alias: str) -> Optional[ConnectionPool]:
+        with self._lock:
+            return self._pools.get(alias)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            pools = dict(self._pools)
+        return {alias: pool.stats() for alias, pool in pools.items()}
+
+    def close_all(self) -> None:
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+
+registry = PoolRegistry()
@@ -0,0 +1,161 @@
+"""
+Read/write routing between the primary database and a read replica.
+
+Overview
+- PrimaryReplicaRouter (settings.DATABASE_ROUTERS) sends the reads of the
+  core models to the replica alias and their writes to "default", the
+  primary. Models of the other apps (auth, sessions, admin) are not routed
+  and stay on the primary.
+- A read of a core model goes to the primary instead when:
+    - the current request has written, or its session wrote less than
+      DB_PIN_SECONDS ago: the profile page shown right after the booking
+      redirect sees the new booking whatever the replication lag;
+    - a transaction is open on the primary: reads inside
+      transaction.atomic() (seat reservation, bookings) must see its own
+      writes and locks;
+    - no replica is configured (single-database setups, tests).
+- ReplicaPinMiddleware keeps the routing state of the request in a context
+  variable (which also reaches the sync_to_async threads of async views)
+  and, after a request that wrote, stores the pin expiry in the session.
+
+Settings
+- DB_REPLICA_ALIAS: DATABASES alias of the replica (default "replica");
+  routing is off while the alias is not configured.
+- DB_PIN_SECONDS: seconds a session keeps reading from the primary after a
+  write (default 5); keep it above the worst replication lag.
+
+Notes
+- Outside requests (management commands, background threads) reads go to
+  the replica unless a transaction is open on the primary.
+- The pin is per session: other users see new rows once the replica has
+  caught up.
+- SELECT ... FOR UPDATE is a write for the router: it runs on the primary
+  and pins the session like any other write.
+- The in-process caches (core.catalog, core.search, core.availability)
+  rebuild from rebuild_alias(), the primary: a rebuild usually follows an
+  invalidation, and reading the lagging replica then would keep its stale
+  rows under the new version until the next one.
+"""
+
+import contextvars
+import time
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = "default"
+SESSION_KEY = "_db_pinned_until"
+ROUTED_APPS = {"core"}
+
+
+class RoutingState:
+    """Routing flags of one request."""
+
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned: bool = False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+current: contextvars.ContextVar = contextvars.ContextVar("dbrouter_state", default=None)
+
+
+def replica_alias() -> Optional[str]:
+    """The configured replica alias, or None when routing is off."""
+    alias = getattr(settings, "DB_REPLICA_ALIAS", "replica")
+    return alias if alias and alias in connections.settings else None
+
+
+def pin_seconds() -> float:
+    return getattr(settings, "DB_PIN_SECONDS", 5)
+
+
+def rebuild_alias(using: Optional[str] = None) -> str:
+    """Alias a cache rebuild reads from: `using`, unless it is the replica (or None)."""
+    if using is None or using == replica_alias():
+        return PRIMARY
+    return using
+
+
+class PrimaryReplicaRouter:
+    """Route core reads to the replica and writes to the primary; see the module docstring."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        replica = replica_alias()
+        if replica is None:
+            return None
+        state = current.get()
+        if state is not None and state.pinned:
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return replica
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        state = current.get()
+        if state is not None:
+            state.wrote = state.pinned = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        replica = replica_alias()
+        if replica is not None and {obj1._state.db, obj2._state.db} <= {PRIMARY, replica}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema from the primary
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Pin sessions that wrote to the primary for DB_PIN_SECONDS."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _is_pinned(until) -> bool:
+        return until is not None and until > time.time()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if replica_alias() is None:
+            return self.get_response(request)
+        state = RoutingState(self._is_pinned(request.session.get(SESSION_KEY)))
+        token = current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        if state.wrote:
+            request.session[SESSION_KEY] = time.time() + pin_seconds()
+        return response
+
+    async def __acall__(self, request):
+        if replica_alias() is None:
+            return await self.get_response(request)
+        state = RoutingState(self._is_pinned(await request.session.aget(SESSION_KEY)))
+        token = current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        if state.wrote:
+            await request.session.aset(SESSION_KEY, time.time() + pin_seconds())
+        return response
@@ -0,0 +1,205 @@
+"""
+Seat reservation for event enrollments.
+
+Overview
+- reserve_seats() is the only code path that takes seats from EVENTO.posti.
+  The database does the arithmetic exactly once per request:
+  * new enrollment: the INSERT into ISCRIVE fires trg_decrementa_posti_evento,
+    which decrements posti with a conditional UPDATE and signals an error
+    when there are not enough seats;
+  * existing enrollment: a conditional
+    `UPDATE EVENTO SET posti = posti - n WHERE ID_evento = ? AND posti >= n`
+    reserves the seats, then the enrollment's participants are incremented,
+    both inside the same transaction.
+- No value read into Python is ever written back, so concurrent requests can
+  neither oversell nor lose updates.
+
+Waitlist
+- When an event is full, join_waitlist() queues the request in LISTA_ATTESA
+  (FIFO by ID_attesa, one entry per user and event) and runs
+  promote_waitlist() in the same transaction, under the event row lock:
+  seats freed by a cancellation that committed after reserve_seats() failed
+  (and promoted from a queue this request was not in yet) are handed out
+  at once instead of waiting for the next cancellation.
+- cancel_enrollment() deletes the enrollment (trg_iscrive_delete gives the
+  seats back) and calls promote_waitlist() in the same transaction, which
+  fills the freed seats from the queue in a single pass, PROMOTION_BATCH
+  entries at a time. Entries larger than the remaining seats keep their place
+  and smaller ones behind them are served (first fit).
+"""
+
+from typing import Optional
+
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Enrolls, Event, Waitlist
+
+ENROLLED = "enrolled"
+UPDATED = "updated"
+NO_SEATS = "no_seats"
+
+RETRIES = 3
+PROMOTION_BATCH = 100
+
+
+def reserve_seats(event_id: int, username: str, participants: int) -> str:
+    """
+    Reserve `participants` seats of an event for `username`.
+
+    Returns ENROLLED for a new enrollment, UPDATED when an existing one was
+    extended, NO_SEATS when the event cannot hold the request.
+
+    Raises:
+        ValueError: if participants is lower than 1.
+        DatabaseError: if the reservation still fails after RETRIES attempts
+            for a reason other than missing seats.
+    """
+    if participants < 1:
+        raise ValueError("participants must be at least 1")
+
+    # A few attempts: if a concurrent request inserts the same enrollment
+    # first, the INSERT fails on the primary key and the retry takes the
+    # update path; lock timeouts and deadlocks are retried the same way.
+    error = None
+    for _ in range(RETRIES):
+        try:
+            with transaction.atomic():
+                enrollment = Enrolls.objects.filter(
+                    event_id=event_id, username_id=username
+                )
+                if enrollment.exists():
+                    taken = Event.objects.filter(
+                        pk=event_id, seats__gte=participants
+                    ).update(seats=F("seats") - participants)
+                    if not taken:
+                        return NO_SEATS
+                    enrollment.update(participants=F("participants") + participants)
+                    return UPDATED
+
+                Enrolls.objects.create(
+                    event_id=event_id,
+                    username_id=username,
+                    participants=participants,
+                    enroll_date=timezone.now(),
+                )
+                return ENROLLED
+        except DatabaseError as exc:
+            # trg_decrementa_posti_evento refuses the INSERT when seats are short
+            if not Event.objects.filter(pk=event_id, seats__gte=participants).exists():
+                return NO_SEATS
+            error = exc
+    raise error
+
+
+def join_waitlist(event_id: int, username: str, participants: int) -> Optional[int]:
+    """
+    Queue a request for a full event and return its 1-based position.
+
+    A user already in the queue keeps the original entry and position.
+    Returns None when seats freed in the meantime promoted the entry at once.
+    """
+    with transaction.atomic():
+        # lock order of cancel_enrollment(): the event row, then the queue
+        Event.objects.select_for_update().filter(pk=event_id).values_list("pk").first()
+        entry, _ = Waitlist.objects.get_or_create(
+            event_id=event_id,
+            username_id=username,
+            defaults={"participants": participants, "request_date": timezone.now()},
+        )
+        promote_waitlist(event_id)
+        if not Waitlist.objects.filter(pk=entry.pk).exists():
+            return None
+        return Waitlist.objects.filter(event_id=event_id, id__lte=entry.id).count()
+
+
+def promote_waitlist(event_id: int, batch_size: Optional[int] = None) -> int:
+    """
+    Move waitlisted requests into ISCRIVE while the event has free seats.
+
+    Must run inside the transaction that freed the seats: the event row is
+    locked first, so concurrent cancellations promote one after the other.
+    New enrollments are bulk inserted (the seat trigger still fires per row);
+    users already enrolled get their participants extended with a conditional
+    seat UPDATE, and keep their waitlist entry when it updates no row.
+    Returns the number of promoted entries.
+    """
+    batch_size = batch_size or PROMOTION_BATCH
+    seats = (
+        Event.objects.select_for_update()
+        .filter(pk=event_id)
+        .values_list("seats", flat=True)
+        .first()
+    )
+    promoted = 0
+    last_id = 0
+    while seats:
+        batch = list(
+            Waitlist.objects.select_for_update()
+            .filter(event_id=event_id, id__gt=last_id, participants__lte=seats)
+            .order_by("id")[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        chosen = []
+        for entry in batch:
+            if entry.participants <= seats:
+                chosen.append(entry)
+                seats -= entry.participants
+        if not chosen:
+            continue
+
+        enrolled = set(
+            Enrolls.objects.filter(
+                event_id=event_id,
+                username_id__in=[e.username_id for e in chosen],
+            ).values_list("username_id", flat=True)
+        )
+        now = timezone.now()
+        Enrolls.objects.bulk_create(
+            [
+                Enrolls(
+                    event_id=event_id,
+                    username_id=e.username_id,
+                    participants=e.participants,
+                    enroll_date=now,
+                )
+                for e in chosen
+                if e.username_id not in enrolled
+            ]
+        )
+        served = [e.id for e in chosen if e.username_id not in enrolled]
+        for e in chosen:
+            if e.username_id in enrolled:
+                taken = Event.objects.filter(pk=event_id, seats__gte=e.participants).update(
+                    seats=F("seats") - e.participants
+                )
+                if not taken:
+                    # fewer seats than counted: the entry stays queued
+                    continue
+                Enrolls.objects.filter(
+                    event_id=event_id, username_id=e.username_id
+                ).update(participants=F("participants") + e.participants)
+                served.append(e.id)
+
+        Waitlist.objects.filter(id__in=served).delete()
+        promoted += len(served)
+    return promoted
+
+
+def cancel_enrollment(event_id: int, username: str) -> bool:
+    """
+    Delete the user's enrollment and hand the freed seats to the waitlist.
+
+    Returns False if the user was not enrolled.
+    """
+    with transaction.atomic():
+        deleted, _ = Enrolls.objects.filter(
+            event_id=event_id, username_id=username
+        ).delete()
+        if deleted:
+            promote_waitlist(event_id)
+    return bool(deleted)
@@ -0,0 +1,228 @@
+"""
+Streaming CSV and NDJSON extracts for accounting.
+
+Overview
+- EXPORTS names the extracts:
+    - "bookings": one row per DETTAGLIO_PRENOTAZIONE with its PRENOTAZIONE
+      (who, when) and the service type and price;
+    - "orders": one row per DETTAGLIO_ORDINE with its ORDINE and product;
+    - "enrollments": one row per iscrive with the event title and date.
+  Each row is read with values_list() in a single joined SELECT; no model
+  instance is built.
+- queryset(name, start, end) selects the rows of a period (booking, order or
+  enrollment date, end excluded); for_parents(name, queryset) the rows of
+  selected bookings, orders or enrollments (the admin actions).
+- lines(name, queryset, fmt) yields the file one line at a time, header
+  first; response() wraps it in a StreamingHttpResponse and the
+  export_data command writes it to a file. The first line goes out before
+  the first row is read.
+
+Flat memory
+- Rows are fetched EXPORT_CHUNK_SIZE at a time in the order of the export
+  key and written as they arrive: memory does not depend on the row count.
+- PostgreSQL and SQLite stream a single query through
+  iterator(chunk_size) (a server-side cursor on PostgreSQL). mysqlclient
+  buffers a whole result set on the client, so on MySQL the rows are read
+  in keyset pages instead: ORDER BY the key, LIMIT chunk, each page
+  starting after the last key of the previous one, which the primary key
+  index serves without OFFSET scans.
+
+Settings
+- EXPORT_CHUNK_SIZE: rows fetched per round trip (default 2000).
+
+Notes
+- The rows are not read in one transaction: on MySQL a long export sees
+  rows committed while it runs, after the page it is reading.
+- Dates and datetimes are written in ISO 8601 (datetimes in UTC with
+  USE_TZ, as the database returns them), amounts as decimal strings and
+  NULL as an empty CSV field or a JSON null.
+"""
+
+import csv
+from datetime import date, datetime, time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import DateTimeField, Model, Q, QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import BookingDetail, Enrolls, OrderDetail
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+class Export(NamedTuple):
+    model: type[Model]
+    columns: Tuple[Tuple[str, str], ...]  # (header, values_list lookup)
+    key: Tuple[str, ...]  # unique, indexed ordering of the rows
+    date: str  # lookup of the period filter
+    parent: Optional[str] = None  # relation to the model selected in the admin
+
+
+EXPORTS: Dict[str, Export] = {
+    "bookings": Export(
+        BookingDetail,
+        (
+            ("booking", "booking_id"),
+            ("username", "booking__username_id"),
+            ("booking_date", "booking__booking_date"),
+            ("service", "service_id"),
+            ("service_type", "service__type"),
+            ("price", "service__price"),
+            ("start_date", "start_date"),
+            ("end_date", "end_date"),
+        ),
+        key=("booking_id", "service_id"),
+        date="booking__booking_date",
+        parent="booking",
+    ),
+    "orders": Export(
+        OrderDetail,
+        (
+            ("order", "order_id"),
+            ("username", "order__username_id"),
+            ("date", "order__date"),
+            ("product", "product_id"),
+            ("product_name", "product__name"),
+            ("quantity", "quantity"),
+            ("unit_price", "unit_price"),
+        ),
+        key=("order_id", "product_id"),
+        date="order__date",
+        parent="order",
+    ),
+    "enrollments": Export(
+        Enrolls,
+        (
+            ("event", "event_id"),
+            ("event_title", "event__title"),
+            ("event_date", "event__date"),
+            ("username", "username_id"),
+            ("enroll_date", "enroll_date"),
+            ("participants", "participants"),
+        ),
+        key=("event_id", "username_id"),
+        date="enroll_date",
+    ),
+}
+
+
+def chunk_size() -> int:
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+def _day_start(day: date) -> datetime:
+    value = datetime.combine(day, time.min)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def queryset(name: str, start: Optional[date] = None, end: Optional[date] = None) -> QuerySet:
+    """Rows of the export `name` dated from `start` (included) to `end` (excluded)."""
+    spec = EXPORTS[name]
+    rows = spec.model._default_manager.all()
+    if start is not None:
+        rows = rows.filter(**{f"{spec.date}__gte": _day_start(start)})
+    if end is not None:
+        rows = rows.filter(**{f"{spec.date}__lt": _day_start(end)})
+    return rows
+
+
+def for_parents(name: str, parents: QuerySet) -> QuerySet:
+    """Rows of the export `name` belonging to the `parents` rows (e.g. selected bookings)."""
+    spec = EXPORTS[name]
+    if spec.parent is None or parents.model is spec.model:
+        return parents
+    return spec.model._default_manager.filter(**{f"{spec.parent}__in": parents.values("pk")})
+
+
+def _after(key: Sequence[str], last: Sequence) -> Q:
+    """Rows whose `key` columns come after `last` in lexicographic order."""
+    condition = Q()
+    for i, name in enumerate(key):
+        condition |= Q(**dict(zip(key[:i], last[:i])), **{f"{name}__gt": last[i]})
+    return condition
+
+
+def rows(name: str, queryset: QuerySet, size: Optional[int] = None) -> Iterator[tuple]:
+    """Value tuples of the export columns, in key order, fetched `size` rows at a time."""
+    spec = EXPORTS[name]
+    size = size or chunk_size()
+    lookups = [lookup for _, lookup in spec.columns]
+    values = queryset.order_by(*spec.key).values_list(*lookups)
+    if connections[queryset.db].vendor != "mysql":
+        yield from values.iterator(chunk_size=size)
+        return
+    positions = [lookups.index(column) for column in spec.key]
+    page = list(values[:size])
+    while page:
+        yield from page
+        if len(page) < size:
+            return
+        last = [page[-1][i] for i in positions]
+        page = list(values.filter(_after(spec.key, last))[:size])
+
+
+def _field(model: type[Model], lookup: str):
+    for name in lookup.split("__")[:-1]:
+        model = model._meta.get_field(name).related_model
+    return model._meta.get_field(lookup.rsplit("__", 1)[-1])
+
+
+def _datetime_positions(spec: Export) -> List[int]:
+    """Positions of the datetime columns, written with isoformat()."""
+    return [
+        i for i, (_, lookup) in enumerate(spec.columns)
+        if isinstance(_field(spec.model, lookup), DateTimeField)
+    ]
+
+
+def _isoformat(row: tuple, positions: List[int]) -> list:
+    row = list(row)
+    for i in positions:
+        if row[i] is not None:
+            row[i] = row[i].isoformat()
+    return row
+
+
+class _Line:
+    """File-like object whose write() returns the line, for csv.writer."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def lines(name: str, queryset: QuerySet, fmt: str = "csv", size: Optional[int] = None) -> Iterator[str]:
+    """The export file, one line at a time."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}.")
+    spec = EXPORTS[name]
+    headers = [header for header, _ in spec.columns]
+    # csv writes None as "" and the other values with str(); only datetimes
+    # need a conversion (str() has a space instead of the ISO "T")
+    positions = _datetime_positions(spec)
+    if fmt == "csv":
+        writer = csv.writer(_Line())
+        yield writer.writerow(headers)
+        for row in rows(name, queryset, size):
+            yield writer.writerow(_isoformat(row, positions) if positions else row)
+        return
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for row in rows(name, queryset, size):
+        yield encoder.encode(dict(zip(headers, _isoformat(row, positions)))) + "\n"
+
+
+def filename(name: str, fmt: str, start: Optional[date] = None) -> str:
+    suffix = start.strftime("-%Y-%m") if start is not None else ""
+    return f"{name}{suffix}.{fmt}"
+
+
+def response(name: str, queryset: QuerySet, fmt: str = "csv", start: Optional[date] = None) -> StreamingHttpResponse:
+    """Streaming download of the export."""
+    response = StreamingHttpResponse(lines(name, queryset, fmt), content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename(name, fmt, start)}"'
+    # the rows must reach the client as they are written (nginx buffers otherwise)
+    response["X-Accel-Buffering"] = "no"
+    return response
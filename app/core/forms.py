@@ -1,7 +1,9 @@
 """
 Registration forms for creating a PersonModel and a corresponding UserModel.
 
-This module provides RegisterForm, a simple form that collects:
+This module provides RegisterForm (plus AsyncAuthenticationForm, used by the
+async login view, and ImportRowForm, used by the import_users command), a
+simple form that collects:
 - person data: tax_code (CF), name, surname
 - account data: username, email, password1, password2
 
@@ -24,6 +26,8 @@ Notes:
 from django import forms
 from django.db import transaction
 from django.core.exceptions import ValidationError
+from django.contrib.auth import aauthenticate
+from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.hashers import make_password
 from .models import Person, User
 
@@ -100,10 +104,13 @@ class RegisterForm(forms.Form):
                 raise ValidationError("Passwords do not match.")
         return cleaned
 
-    def save(self):
+    def save(self, password_hash=None):
         """
         Persist the PersonModel (if missing) and create the UserModel.
 
+        password_hash lets async callers pass a hash computed off the event
+        loop (see core.hashing); otherwise password1 is hashed here.
+
         Important behavior:
         - If a PersonModel with the given CF already exists, this method will NOT
           update the existing person's name or surname.
@@ -135,8 +142,59 @@ class RegisterForm(forms.Form):
             user = User.objects.create(
                 username=self.cleaned_data["username"],
                 cf=person,
-                password=make_password(self.cleaned_data["password1"]),
+                password=password_hash or make_password(self.cleaned_data["password1"]),
                 email=self.cleaned_data["email"],
             )
 
         return user
+
+
+class ImportRowForm(RegisterForm):
+    """
+    RegisterForm variant validating one CSV row of the import_users command.
+
+    The row carries a single password column (mapped to password1) and no
+    database lookups are made: the command checks usernames and tax codes of
+    a whole chunk with one IN query each.
+    """
+
+    password2 = None
+
+    def clean_username(self):
+        return self.cleaned_data["username"]
+
+
+class AsyncAuthenticationForm(AuthenticationForm):
+    """
+    AuthenticationForm for async views.
+
+    clean() only validates the fields; the credential check, which hashes the
+    password, is awaited separately with aclean() so it never runs on the
+    event loop.
+    """
+
+    def clean(self):
+        return self.cleaned_data
+
+    async def aclean(self) -> bool:
+        """
+        Validate the form and authenticate the user. Returns True on success;
+        on failure the usual AuthenticationForm error is attached.
+        """
+        if not self.is_valid():
+            return False
+
+        self.user_cache = await aauthenticate(
+            self.request,
+            username=self.cleaned_data.get("username"),
+            password=self.cleaned_data.get("password"),
+        )
+        if self.user_cache is None:
+            self.add_error(None, self.get_invalid_login_error())
+            return False
+        try:
+            self.confirm_login_allowed(self.user_cache)
+        except ValidationError as e:
+            self.add_error(None, e)
+            return False
+        return True
@@ -0,0 +1,25 @@
+"""
+Password hasher recording PBKDF2 verification time.
+
+TimedPBKDF2PasswordHasher is Django's PBKDF2PasswordHasher (same algorithm
+name, so existing UTENTE and auth_user hashes keep working) with verify()
+timed into core.metrics.PASSWORD_VERIFY_SECONDS. It covers every path that
+checks a password: both authentication backends, the admin login and the
+async views' hashing pool, whose process workers write to their own metrics
+file when METRICS_DIR is set.
+"""
+
+import time
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+from . import metrics
+
+
+class TimedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    def verify(self, password, encoded):
+        started = time.perf_counter()
+        try:
+            return super().verify(password, encoded)
+        finally:
+            metrics.PASSWORD_VERIFY_SECONDS.observe(time.perf_counter() - started)
@@ -0,0 +1,113 @@
+"""
+Bounded worker pool for password hashing.
+
+Overview
+- PBKDF2 with 1,000,000 iterations is pure CPU work; running it on an ASGI
+  event loop stalls every other request of the worker. The async login and
+  registration paths submit check_password/make_password to this pool and
+  await the result instead.
+- The pool is either a ThreadPoolExecutor (default; hashlib releases the GIL
+  while hashing) or a ProcessPoolExecutor, selected by settings.
+
+Settings
+- PASSWORD_HASHING_WORKERS: concurrency limit, i.e. hashes computed at the
+  same time per process (default 2).
+- PASSWORD_HASHING_EXECUTOR: "thread" (default) or "process".
+
+Metrics
+- pool.stats() returns submitted/completed counters, the current number of
+  pending jobs, the queue depth (pending jobs waiting for a free worker) and
+  the highest queue depth seen.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+def init_worker():
+    """ProcessPoolExecutor initializer: worker processes need configured
+    settings to resolve the hashers."""
+    import django
+
+    django.setup()
+
+
+class HashingPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+        self.submitted = 0
+        self.completed = 0
+        self.pending = 0
+        self.max_queue_depth = 0
+
+    @property
+    def workers(self) -> int:
+        return getattr(settings, "PASSWORD_HASHING_WORKERS", 2)
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                kind = getattr(settings, "PASSWORD_HASHING_EXECUTOR", "thread")
+                if kind == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, initializer=init_worker
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="hashing"
+                    )
+            return self._executor
+
+    def _done(self, future) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, func, *args):
+        """Run func(*args) on the pool and await its result."""
+        executor = self._get_executor()
+        with self._lock:
+            self.submitted += 1
+            self.pending += 1
+            depth = max(0, self.pending - self.workers)
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        future = executor.submit(func, *args)
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "pending": self.pending,
+                "queue_depth": max(0, self.pending - self.workers),
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+pool = HashingPool()
+
+
+async def acheck_password(password: str, encoded: str) -> bool:
+    """check_password() computed on the hashing pool."""
+    return await pool.run(check_password, password, encoded)
+
+
+async def amake_password(password: str) -> str:
+    """make_password() computed on the hashing pool."""
+    return await pool.run(make_password, password)
@@ -0,0 +1,278 @@
+"""
+WSGI vs ASGI throughput of the read-only pages on a seeded database.
+
+Drives the homepage, services, event list and profile pages, as a logged-in
+guest of the data set written by generate_data (--prefix), through Django's
+own request handlers in three modes:
+- wsgi:       WSGIHandler with the sync views, --concurrency threads (as a
+              threaded WSGI server would run them);
+- asgi-sync:  ASGIHandler with the sync views, --concurrency concurrent
+              requests on one event loop; each sync view runs on the
+              request's sync_to_async thread;
+- asgi-async: ASGIHandler with the async ORM views of ASYNC_READ_VIEWS.
+
+No server or socket is involved: the numbers compare the handler, view and
+ORM paths, not HTTP stacks. Every mode serves --requests requests per page
+after a warm-up round and reports requests per second, p50/p95 latency,
+non-200 responses and the response size (the same templates and context
+give the same size in every mode). --output writes the JSON report.
+
+The data set is read, never written. Run it against the database the data
+was generated in (MySQL or a file-based SQLite profile; an in-memory
+database is not shared between the benchmark threads):
+
+    python manage.py generate_data --users 2000 --services-per-type 5
+    python manage.py bench_asgi --requests 500 --concurrency 16 --output asgi.json
+"""
+
+import asyncio
+import importlib
+import io
+import json
+import logging
+import math
+import statistics
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User as DjangoUser
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, reverse
+
+from core import views
+from core.models import User
+
+# URL name -> (sync view, async view)
+VARIANTS = {
+    "homepage": (views.homepage, views.ahomepage),
+    "services": (views.services, views.aservices),
+    "list-event": (views.list_event, views.alist_event),
+    "profile": (views.profile_view, views.aprofile_view),
+}
+MODES = ("wsgi", "asgi-sync", "asgi-async")
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _swap(entry, use_async: bool):
+    if isinstance(entry, URLPattern):
+        pair = VARIANTS.get(entry.name)
+        if pair is None:
+            return entry
+        return URLPattern(entry.pattern, pair[use_async], entry.default_args, entry.name)
+    module = types.ModuleType("bench_asgi_include")
+    module.urlpatterns = [_swap(child, use_async) for child in entry.url_patterns]
+    return URLResolver(entry.pattern, module, entry.default_kwargs, entry.app_name, entry.namespace)
+
+
+def build_urlconf(use_async: bool) -> types.ModuleType:
+    """ROOT_URLCONF with the pages of VARIANTS routed to one kind of view,
+    whatever ASYNC_READ_VIEWS says."""
+    root = importlib.import_module(settings.ROOT_URLCONF)
+    module = types.ModuleType("bench_asgi_urls")
+    module.urlpatterns = [_swap(entry, use_async) for entry in root.urlpatterns]
+    return module
+
+
+class Command(BaseCommand):
+    help = "Compare WSGI and ASGI throughput of the read-only pages (sync and async ORM views)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="GEN", help="generate_data prefix of the guest to log in as.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per page and mode.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated subset of " + ", ".join(MODES))
+        parser.add_argument("--host", default="localhost", help="Host header (must be in ALLOWED_HOSTS).")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options["modes"].split(",") if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+        # the guest with the most bookings gives the heaviest profile page
+        guest = (
+            User.objects.filter(username__startswith=options["prefix"].lower())
+            .annotate(n=Count("booking"))
+            .order_by("-n", "username")
+            .values_list("username", flat=True)
+            .first()
+        )
+        if guest is None:
+            raise CommandError(
+                f"No users with prefix {options['prefix']!r}: seed the database with generate_data first."
+            )
+        client = Client()
+        client.force_login(DjangoUser.objects.get_or_create(username=guest)[0])
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        paths = {name: reverse(name) for name in VARIANTS}
+        connection.close()  # the benchmark threads open their own
+
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        results = {}
+        try:
+            for mode in modes:
+                with override_settings(ROOT_URLCONF=build_urlconf(mode == "asgi-async")):
+                    runner = self.run_wsgi if mode == "wsgi" else self.run_asgi
+                    results[mode] = {
+                        name: runner(path, cookie, options) for name, path in paths.items()
+                    }
+        finally:
+            request_logger.setLevel(level)
+            client.logout()
+
+        report = {
+            "database": connection.vendor,
+            "guest": guest,
+            "options": {k: options[k] for k in ("requests", "concurrency")},
+            "modes": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        self.print_report(report)
+
+    # -- WSGI -------------------------------------------------------------------
+
+    def run_wsgi(self, path, cookie, options):
+        handler = WSGIHandler()
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SCRIPT_NAME": "",
+            "SERVER_NAME": options["host"],
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": options["host"],
+            "HTTP_COOKIE": cookie,
+            "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+
+        def send(_):
+            status = []
+            started = time.perf_counter()
+            result = handler(
+                {**environ, "wsgi.input": io.BytesIO()},
+                lambda s, headers, exc_info=None: status.append(int(s.split()[0])),
+            )
+            try:
+                size = sum(len(chunk) for chunk in result)
+            finally:
+                result.close()  # request_finished: releases the thread's connection
+            return status[0], size, time.perf_counter() - started
+
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            list(pool.map(send, range(options["concurrency"])))  # warm-up
+            started = time.perf_counter()
+            samples = list(pool.map(send, range(options["requests"])))
+            elapsed = time.perf_counter() - started
+        return self.summarize(samples, elapsed)
+
+    # -- ASGI -------------------------------------------------------------------
+
+    def run_asgi(self, path, cookie, options):
+        return asyncio.run(self._run_asgi(path, cookie, options))
+
+    async def _run_asgi(self, path, cookie, options):
+        handler = ASGIHandler()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", options["host"].encode()), (b"cookie", cookie.encode())],
+            "client": ("127.0.0.1", 50000),
+            "server": (options["host"], 80),
+        }
+
+        async def send_one():
+            messages = [{"type": "http.request", "body": b"", "more_body": False}]
+            disconnected = asyncio.get_running_loop().create_future()  # never: the client waits
+            status, size = [], 0
+
+            async def receive():
+                return messages.pop() if messages else await disconnected
+
+            async def send(message):
+                nonlocal size
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+                elif message["type"] == "http.response.body":
+                    size += len(message.get("body", b""))
+
+            started = time.perf_counter()
+            await handler(dict(scope), receive, send)
+            return status[0], size, time.perf_counter() - started
+
+        async def worker(count, samples):
+            for _ in range(count):
+                samples.append(await send_one())
+
+        async def run(total):
+            samples = []
+            share, extra = divmod(total, options["concurrency"])
+            await asyncio.gather(*(
+                worker(share + (i < extra), samples) for i in range(options["concurrency"])
+            ))
+            return samples
+
+        await run(options["concurrency"])  # warm-up
+        started = time.perf_counter()
+        samples = await run(options["requests"])
+        return self.summarize(samples, time.perf_counter() - started)
+
+    # -- report -----------------------------------------------------------------
+
+    def summarize(self, samples, elapsed):
+        timings = [seconds * 1000 for _, _, seconds in samples]
+        return {
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "errors": sum(1 for status, _, _ in samples if status != 200),
+            "bytes": samples[-1][1],
+        }
+
+    def print_report(self, report):
+        modes = list(report["modes"])
+        header = f"{'route':12}" + "".join(f" {mode + ' rps':>15} {'p50':>8} {'p95':>8}" for mode in modes)
+        self.stdout.write(header)
+        for name in VARIANTS:
+            line = f"{name:12}"
+            for mode in modes:
+                row = report["modes"][mode][name]
+                line += f" {row['rps']:>15.1f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}"
+            self.stdout.write(line)
+            sizes = {report["modes"][mode][name]["bytes"] for mode in modes}
+            errors = sum(report["modes"][mode][name]["errors"] for mode in modes)
+            if errors or len(sizes) > 1:
+                self.stdout.write(self.style.WARNING(
+                    f"  {name}: {errors} non-200 responses, response sizes {sorted(sizes)}"
+                ))
@@ -0,0 +1,117 @@
+"""
+Threaded stress benchmark for event seat reservation.
+
+Creates a throw-away event and a set of benchmark users, then lets several
+threads call core.enrollment.reserve_seats concurrently until the seats run
+out. At the end it checks that no seat was oversold or lost
+(seats left + seats enrolled == initial seats) and reports the throughput.
+
+Every thread opens its own database connection, so run it against a real
+server (MySQL) or a file-based database; an in-memory SQLite database is not
+shared between connections.
+
+    python manage.py bench_enrollment --seats 200 --threads 16 --attempts 50
+"""
+
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.enrollment import reserve_seats
+from core.models import Employee, Enrolls, Event, Person, User
+
+
+class Command(BaseCommand):
+    help = "Stress-test concurrent event enrollment and check for overselling."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seats", type=int, default=100)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--attempts", type=int, default=25, help="Reservations per thread.")
+        parser.add_argument("--participants", type=int, default=1, help="Seats per reservation.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark rows.")
+
+    def handle(self, *args, **options):
+        creator = Employee.objects.first()
+        if creator is None:
+            raise CommandError("At least one DIPENDENTE row is needed to own the event.")
+
+        seats = options["seats"]
+        threads = options["threads"]
+        usernames = [f"bench_{i}" for i in range(threads)]
+        tax_codes = [f"BNCH{i:012d}" for i in range(threads)]
+
+        event = Event.objects.create(
+            seats=seats,
+            title="Benchmark event",
+            description="Created by bench_enrollment",
+            date=timezone.localdate(),
+            username=creator,
+        )
+        for i, (username, cf) in enumerate(zip(usernames, tax_codes)):
+            person, _ = Person.objects.get_or_create(
+                cf=cf,
+                defaults={"name": "Bench", "surname": str(i), "phone": "0"},
+            )
+            User.objects.get_or_create(
+                username=username,
+                defaults={"cf": person, "password": "!", "email": f"{username}@example.com"},
+            )
+
+        results = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def worker(username):
+            local = Counter()
+            try:
+                barrier.wait()
+                for _ in range(options["attempts"]):
+                    try:
+                        local[reserve_seats(event.pk, username, options["participants"])] += 1
+                    except DatabaseError:
+                        local["error"] += 1
+            finally:
+                connection.close()
+                with lock:
+                    results.update(local)
+
+        pool = [threading.Thread(target=worker, args=(u,)) for u in usernames]
+        started = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            event.refresh_from_db()
+            enrolled = (
+                Enrolls.objects.filter(event_id=event.pk).aggregate(n=Sum("participants"))["n"]
+                or 0
+            )
+            attempts = sum(results.values())
+            successful = results["enrolled"] + results["updated"]
+
+            self.stdout.write(f"threads={threads} attempts={attempts} elapsed={elapsed:.3f}s")
+            self.stdout.write(f"results: {dict(results)}")
+            self.stdout.write(f"seats: initial={seats} left={event.seats} enrolled={enrolled}")
+            self.stdout.write(
+                f"throughput: {attempts / elapsed:.1f} reservations/s, "
+                f"{successful / elapsed:.1f} successful enrollments/s"
+            )
+
+            if event.seats < 0 or event.seats + enrolled != seats:
+                raise CommandError("Seat accounting mismatch: oversold or lost updates.")
+            self.stdout.write(self.style.SUCCESS("No oversell detected."))
+        finally:
+            if not options["keep"]:
+                Enrolls.objects.filter(event_id=event.pk).delete()
+                event.delete()
+                User.objects.filter(username__in=usernames).delete()
+                Person.objects.filter(cf__in=tax_codes).delete()
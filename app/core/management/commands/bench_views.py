@@ -0,0 +1,227 @@
+"""
+View benchmark with per-route query budgets.
+
+Seeds a data set with generate_data, then drives every route of core/urls.py
+through the Django test client as a logged-in guest and records, per route:
+- p50/p95 latency over --repeat requests (after one warm-up request);
+- the number of SQL queries of one request;
+- the peak memory allocated while serving one request (tracemalloc).
+
+Everything runs inside one transaction that is rolled back at the end, so
+the seeded rows and the bookings/enrollments made by the benchmark never
+reach the database. The JSON report (--output) has sorted keys and one entry
+per route, ready to be diffed between commits; --compare prints the deltas
+against an earlier report.
+
+The run fails when a route answers with a server error (status >= 500) or
+issues more queries than its budget in QUERY_BUDGETS: an N+1 shows up as a
+count that grows with the data volume. Budgets are only checked against
+successful responses, so an error page cannot pass for a cheap route.
+
+The choose_service and book_service routes are not measured: their
+templates (core/choose_service.html, book_service.html) do not exist and
+the pages always answer 500.
+
+    python manage.py bench_views --users 2000 --services-per-type 5 --repeat 50 \\
+        --output bench.json --compare bench-main.json
+"""
+
+import io
+import json
+import math
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth.models import User as DjangoUser
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from core import enrollment
+from core.models import Event, Service, User
+
+PREFIX = "BENCH"
+
+# Maximum SQL queries per request, session lookup included, with warm
+# catalog/user caches. Raise a budget only together with the change that
+# needs the extra query.
+QUERY_BUDGETS = {
+    "homepage": 1,
+    "services": 1,
+    "book_service_from_services": 8,
+    "register": 0,
+    "login": 0,
+    "profile": 3,
+    "list-event": 2,
+    "event_subscription": 7,
+    "cancel_enrollment": 6,
+}
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the core views (latency, queries, memory) against query budgets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--services-per-type", type=int, default=3)
+        parser.add_argument("--days", type=int, default=120)
+        parser.add_argument("--events", type=int, default=30)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--compare", help="Earlier JSON report to print deltas against.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with transaction.atomic():
+                report = self.run(options)
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        self.print_report(report, options["compare"])
+
+        failed = [
+            f"{name}: status {route['status']}"
+            for name, route in report["routes"].items()
+            if route["status"] >= 500
+        ]
+        failed += [
+            f"{name}: {route['queries']} queries (budget {route['budget']})"
+            for name, route in report["routes"].items()
+            if route["status"] < 500 and route["budget"] is not None and route["queries"] > route["budget"]
+        ]
+        if failed:
+            raise CommandError("Benchmark failed:\n  " + "\n  ".join(failed))
+
+    def run(self, options):
+        call_command(
+            "generate_data",
+            f"--prefix={PREFIX}",
+            f"--users={options['users']}",
+            f"--services-per-type={options['services_per_type']}",
+            f"--days={options['days']}",
+            f"--events={options['events']}",
+            f"--seed={options['seed']}",
+            "--employees=5",
+            stdout=io.StringIO(),
+        )
+        # the guest with the most bookings gives the heaviest profile page
+        guest = (
+            User.objects.filter(username__startswith=PREFIX.lower())
+            .annotate(n=Count("booking"))
+            .order_by("-n", "username")
+            .values_list("username", flat=True)
+            .first()
+        )
+        client = Client(raise_request_exception=False)
+        client.force_login(DjangoUser.objects.create(username=guest))
+
+        event = Event.objects.filter(date__gte=timezone.localdate()).order_by("-seats").first()
+        service = Service.objects.exclude(type="CAMERA").order_by("id").first()
+        # bookings land after the seeded season, one free slot per request
+        booking_day = timezone.localdate() + timedelta(days=options["days"] + 30)
+        slots = iter(range(10**6))
+
+        def booking_data():
+            day = booking_day + timedelta(days=next(slots))
+            return {
+                "service_type": service.type,
+                "instance": service.pk,
+                "start_date": day.isoformat(),
+                "start_time": "10:00",
+                "end_time": "12:00",
+            }
+
+        def enroll():
+            enrollment.reserve_seats(event.pk, guest, 1)
+
+        routes = [
+            ("homepage", "get", reverse("homepage"), None, None),
+            ("services", "get", reverse("services"), None, None),
+            ("book_service_from_services", "post", reverse("book_service_from_services"), booking_data, None),
+            ("register", "get", reverse("register"), None, None),
+            ("login", "get", reverse("login"), None, None),
+            ("profile", "get", reverse("profile"), None, None),
+            ("list-event", "get", reverse("list-event"), None, None),
+            ("event_subscription", "post", reverse("event_subscription", args=[event.pk]),
+             lambda: {"partecipanti": 1}, None),
+            ("cancel_enrollment", "post", reverse("cancel_enrollment", args=[event.pk]), lambda: {}, enroll),
+        ]
+
+        results = {}
+        for name, method, url, data, setup in routes:
+            results[name] = self.measure(client, method, url, data, setup, options["repeat"])
+            results[name]["budget"] = QUERY_BUDGETS.get(name)
+
+        return {
+            "database": connection.vendor,
+            "options": {k: options[k] for k in ("users", "services_per_type", "days", "events", "seed", "repeat")},
+            "routes": results,
+        }
+
+    def measure(self, client, method, url, data, setup, repeat):
+        def send():
+            # setup (e.g. re-enrolling before a cancellation) is not timed
+            if setup:
+                setup()
+            started = time.perf_counter()
+            response = client.post(url, data()) if method == "post" else client.get(url)
+            return response, (time.perf_counter() - started) * 1000
+
+        send()  # warm-up: caches, templates, session
+        timings = [send()[1] for _ in range(repeat)]
+
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(url, data()) if method == "post" else client.get(url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "status": response.status_code,
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "queries": len(queries),
+            "peak_kib": round(peak / 1024, 1),
+        }
+
+    def print_report(self, report, compare):
+        baseline = {}
+        if compare:
+            with open(compare) as f:
+                baseline = json.load(f)["routes"]
+
+        self.stdout.write(f"{'route':28} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KiB':>9}")
+        for name, route in report["routes"].items():
+            line = (
+                f"{name:28} {route['status']:>6} {route['p50_ms']:>9.2f} {route['p95_ms']:>9.2f} "
+                f"{route['queries']:>8} {route['peak_kib']:>9.1f}"
+            )
+            old = baseline.get(name)
+            if old:
+                line += (
+                    f"   Δp50 {route['p50_ms'] - old['p50_ms']:+.2f} ms"
+                    f" Δqueries {route['queries'] - old['queries']:+d}"
+                )
+            self.stdout.write(line)
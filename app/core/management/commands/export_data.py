@@ -0,0 +1,72 @@
+"""
+Stream an accounting extract (core.exports) to a file or stdout.
+
+The rows are written as they are read, EXPORT_CHUNK_SIZE at a time, so
+memory stays flat whatever the size of the period. The period is a calendar
+month (--month) or a --start/--end range of dates, end excluded; without
+either the whole table is exported.
+
+    python manage.py export_data bookings --month 2026-09 -o bookings-2026-09.csv
+    python manage.py export_data orders --start 2026-01-01 --end 2026-04-01 --format ndjson
+    python manage.py export_data enrollments --month 2026-09 | gzip > enrollments.csv.gz
+"""
+
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exports
+
+
+def month_range(value):
+    """First day of the month `value` (YYYY-MM) and of the next one."""
+    try:
+        start = date.fromisoformat(f"{value}-01")
+    except ValueError:
+        raise CommandError(f"--month must be YYYY-MM, not {value!r}.")
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+class Command(BaseCommand):
+    help = "Stream the bookings, orders or enrollments of a period as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("export", choices=sorted(exports.EXPORTS))
+        parser.add_argument("--month", help="Calendar month YYYY-MM.")
+        parser.add_argument("--start", type=date.fromisoformat, help="First day (YYYY-MM-DD).")
+        parser.add_argument("--end", type=date.fromisoformat, help="Day after the last one (YYYY-MM-DD).")
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout).")
+        parser.add_argument("--chunk-size", type=int, help="Rows per fetch (default: settings.EXPORT_CHUNK_SIZE).")
+
+    def handle(self, *args, **options):
+        start, end = options["start"], options["end"]
+        if options["month"]:
+            if start or end:
+                raise CommandError("Use either --month or --start/--end.")
+            start, end = month_range(options["month"])
+        if start and end and end <= start:
+            raise CommandError("--end must be after --start.")
+
+        name = options["export"]
+        lines = exports.lines(
+            name, exports.queryset(name, start, end), options["format"], options["chunk_size"]
+        )
+        began = time.perf_counter()
+        written = 0
+        if options["output"] == "-":
+            for line in lines:
+                self.stdout.write(line, ending="")
+                written += 1
+            report = self.stderr
+        else:
+            with open(options["output"], "w", encoding="utf-8", newline="") as f:
+                for line in lines:
+                    f.write(line)
+                    written += 1
+            report = self.stdout
+        if options["format"] == "csv":
+            written -= 1  # header
+        report.write(f"Exported {written} {name} rows in {time.perf_counter() - began:.1f}s.")
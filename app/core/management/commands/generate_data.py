@@ -0,0 +1,386 @@
+"""
+Deterministic synthetic data for load testing.
+
+Generates internally consistent rows for PERSONA, UTENTE, DIPENDENTE, SVOLGE,
+PRENOTAZIONE, DETTAGLIO_PRENOTAZIONE, RECENSIONE, ORDINE, DETTAGLIO_ORDINE,
+EVENTO and ISCRIVE (plus SERVIZIO and its subtype tables with
+--services-per-type, TURNO and PRODOTTO when those tables are empty).
+
+Consistency rules
+- Bookings of a service never overlap: each service's calendar is walked
+  from --start for --days days. Rooms are booked by night (whole days),
+  the other services by the two-hour slots of the services page; --occupancy
+  sets the booked fraction.
+- Reviews are written only for bookings that ended before today, on the
+  service trg_recensione_valida checks (the first SERVIZIO of the type).
+- Every generated employee gets one to three shifts (trg_check_dipendente_turni).
+- Enrollments never exceed the event seats, so trg_decrementa_posti_evento
+  accepts every row and leaves EVENTO.posti at the remaining seats.
+
+Rows are streamed to the database with bulk_create, --batch-size objects per
+table at a time; a batch of every table is written in one transaction, in
+foreign-key order. Primary keys are assigned here (after the current
+maximum), so child rows can reference parents without reading them back.
+
+The same --seed and --start produce the same rows; the run date only decides
+which past bookings can be reviewed and caps booking, order and review dates
+at today. Generated usernames and tax codes start
+with --prefix, which must not be in use yet.
+
+    python manage.py generate_data --users 100000 --services-per-type 50 --seed 7
+"""
+
+import random
+import time
+from collections import Counter
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+from itertools import product as cartesian
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core import availability, catalog
+from core.models import (
+    AnimalActivity,
+    Booking,
+    BookingDetail,
+    Employee,
+    Enrolls,
+    Event,
+    Order,
+    OrderDetail,
+    Performs,
+    Person,
+    Playground,
+    Pool,
+    Product,
+    Restaurant,
+    Review,
+    Room,
+    Service,
+    Shift,
+    User,
+)
+
+# Foreign-key order used when a batch is written.
+FLUSH_ORDER = (
+    Person, User, Employee, Shift, Performs,
+    Service, Room, Pool, AnimalActivity, Playground, Restaurant,
+    Booking, BookingDetail, Review,
+    Product, Order, OrderDetail,
+    Event, Enrolls,
+)
+
+NAMES = ("Mario", "Luca", "Anna", "Sara", "Marco", "Paolo", "Giulia", "Elena", "Franco", "Chiara", "Davide", "Marta")
+SURNAMES = ("Rossi", "Bianchi", "Verdi", "Neri", "Russo", "Ferrari", "Esposito", "Romano", "Colombo", "Ricci")
+CITIES = ("Torino", "Milano", "Genova", "Firenze", "Bologna", "Roma", "Napoli", "Cesena", None)
+REVIEW_TEXTS = {
+    1: "Esperienza deludente.",
+    2: "Sotto le aspettative.",
+    3: "Nella media.",
+    4: "Molto bene, torneremo.",
+    5: "Ottimo servizio, staff gentile.",
+}
+DAYS = ("LUN", "MAR", "MER", "GIO", "VEN", "SAB", "DOM")
+PRODUCTS = (
+    ("Marmellata Artigianale", "6.50"), ("Olio 500ml", "12.00"), ("Pane Casereccio", "3.00"),
+    ("Miele di Castagno", "8.00"), ("Formaggio Stagionato", "14.50"), ("Vino Rosso", "11.00"),
+)
+# subtype model, code field and code letter per tipo_servizio
+SUBTYPES = {
+    "CAMERA": (Room, "room_code", "C"),
+    "PISCINA": (Pool, "sunbed_code", "L"),
+    "ATTIVITA_CON_ANIMALI": (AnimalActivity, "activity_code", "A"),
+    "CAMPO_DA_GIOCO": (Playground, "playground_code", "F"),
+    "RISTORANTE": (Restaurant, "table_code", "T"),
+}
+CODE_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class Batcher:
+    """Buffers model instances and bulk-inserts them in FLUSH_ORDER."""
+
+    def __init__(self, batch_size, counts):
+        self.batch_size = batch_size
+        self.counts = counts
+        self.buffers = {model: [] for model in FLUSH_ORDER}
+
+    def add(self, obj):
+        buffer = self.buffers[type(obj)]
+        buffer.append(obj)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with transaction.atomic():
+            for model, buffer in self.buffers.items():
+                if buffer:
+                    model.objects.bulk_create(buffer, batch_size=self.batch_size)
+                    self.counts[model._meta.db_table] += len(buffer)
+                    buffer.clear()
+
+
+def next_id(model):
+    return (model.objects.aggregate(n=Max("pk"))["n"] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = "Generate deterministic, schema-consistent synthetic data for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--prefix", default="GEN", help="Prefix of generated usernames and tax codes.")
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--employees", type=int, default=10, help="Generated users that become employees.")
+        parser.add_argument("--services-per-type", type=int, default=0, help="New services per type (0: use existing).")
+        parser.add_argument("--start", type=date.fromisoformat, help="First day of the season (default: --days/2 ago).")
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--occupancy", type=float, default=0.5, help="Booked fraction of every calendar.")
+        parser.add_argument("--review-rate", type=float, default=0.3)
+        parser.add_argument("--orders-per-user", type=float, default=1.0, help="Average orders per user.")
+        parser.add_argument("--events", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--password", default="farmhouse", help="Password of every generated user.")
+
+    def handle(self, *args, **options):
+        if not 0 < options["occupancy"] <= 1:
+            raise CommandError("--occupancy must be in (0, 1].")
+        if options["employees"] > options["users"]:
+            raise CommandError("--employees cannot exceed --users.")
+        prefix = options["prefix"].upper()
+        if not prefix or len(prefix) > 8:
+            raise CommandError("--prefix must be 1 to 8 characters.")
+        if User.objects.filter(username__startswith=prefix.lower()).exists() or Person.objects.filter(
+            cf__startswith=prefix
+        ).exists():
+            raise CommandError(f"Rows with prefix {prefix!r} exist already; choose another --prefix.")
+
+        self.rng = random.Random(options["seed"])
+        self.options = options
+        self.tz = timezone.get_current_timezone()
+        self.today = timezone.localdate()
+        self.start = options["start"] or self.today - timedelta(days=options["days"] // 2)
+        self.end = self.start + timedelta(days=options["days"])
+        self.counts = Counter()
+        self.batch = Batcher(options["batch_size"], self.counts)
+
+        started = time.perf_counter()
+        self.usernames = self.people(prefix)
+        self.employees = self.staff()
+        self.batch.flush()
+        services = self.services()
+        self.bookings(services)
+        self.orders()
+        self.events()
+        self.batch.flush()
+        elapsed = time.perf_counter() - started
+
+        # bulk_create sends no signals: refresh the in-process caches here
+        catalog.cache.bump()
+        availability.engine.invalidate()
+
+        for table, count in sorted(self.counts.items()):
+            self.stdout.write(f"{table}: {count}")
+        total = sum(self.counts.values())
+        self.stdout.write(f"rows={total} elapsed={elapsed:.1f}s throughput={total / elapsed:.0f} rows/s")
+
+    # Helpers
+
+    def at(self, day, hour=0, minute=0):
+        return datetime.combine(day, dtime(hour, minute), tzinfo=self.tz)
+
+    def season_moment(self):
+        return self.at(self.start) + timedelta(seconds=self.rng.randrange(self.options["days"] * 86400))
+
+    # Generators
+
+    def people(self, prefix):
+        rng = self.rng
+        password = make_password(self.options["password"], salt=f"generated{self.options['seed']}")
+        usernames = []
+        width = 16 - len(prefix)
+        for i in range(self.options["users"]):
+            cf = f"{prefix}{i:0{width}d}"
+            username = f"{prefix.lower()}{i}"
+            self.batch.add(
+                Person(
+                    cf=cf,
+                    name=rng.choice(NAMES),
+                    surname=rng.choice(SURNAMES),
+                    phone=f"3{rng.randrange(10**9):09d}",
+                    city=rng.choice(CITIES),
+                )
+            )
+            self.batch.add(User(username=username, cf_id=cf, password=password, email=f"{username}@example.com"))
+            usernames.append(username)
+        return usernames
+
+    def staff(self):
+        rng = self.rng
+        shift_ids = list(Shift.objects.order_by("id").values_list("id", flat=True))
+        if not shift_ids:
+            first = next_id(Shift)
+            for i, (day, (start, end, label)) in enumerate(
+                cartesian(DAYS, ((8, 14, "Mattina"), (16, 22, "Sera")))
+            ):
+                self.batch.add(Shift(id=first + i, day=day, start_hour=dtime(start), end_hour=dtime(end), description=label))
+                shift_ids.append(first + i)
+
+        employees = self.usernames[len(self.usernames) - self.options["employees"]:]
+        for username in employees:
+            hired = self.start - timedelta(days=rng.randrange(30, 2000))
+            self.batch.add(Employee(username_id=username, hire_date=hired))
+            # at least one shift per employee
+            for shift_id in rng.sample(shift_ids, min(len(shift_ids), rng.randint(1, 3))):
+                self.batch.add(Performs(username_id=username, shift_id=shift_id, start_date=self.at(hired, 8)))
+        return employees or list(Employee.objects.values_list("username", flat=True))
+
+    def services(self):
+        """Create --services-per-type services; return [(id, type)] of all services."""
+        rng = self.rng
+        per_type = self.options["services_per_type"]
+        if per_type:
+            service_id = next_id(Service)
+            for service_type, (model, code_field, letter) in SUBTYPES.items():
+                used = set(model.objects.values_list(code_field, flat=True))
+                codes = (letter + a + b for a, b in cartesian(CODE_DIGITS, repeat=2))
+                free = [code for code in codes if code not in used][:per_type]
+                if len(free) < per_type:
+                    raise CommandError(f"Not enough free 3-character codes for {service_type}.")
+                for code in free:
+                    self.batch.add(
+                        Service(id=service_id, price=Decimal(rng.randrange(0, 150)), type=service_type)
+                    )
+                    fields = {"id_id": service_id, code_field: code}
+                    if model is AnimalActivity:
+                        fields["description"] = "Attività generata"
+                    elif model is not Pool:
+                        fields["max_capacity"] = rng.randint(2, 12)
+                    self.batch.add(model(**fields))
+                    service_id += 1
+            self.batch.flush()
+
+        services = list(Service.objects.order_by("id").values_list("id", "type"))
+        if not services:
+            raise CommandError("No services: load sql/data.sql or pass --services-per-type.")
+        return services
+
+    def bookings(self, services):
+        rng = self.rng
+        occupancy = self.options["occupancy"]
+        review_rate = self.options["review_rate"]
+        # trg_recensione_valida only looks at the first service of each type
+        reviewable = {}
+        for service_id, service_type in services:
+            reviewable.setdefault(service_type, service_id)
+
+        booking_id = next_id(Booking)
+        review_id = next_id(Review)
+        now = self.at(self.today)
+        for service_id, service_type in services:
+            for start, end in self.calendar(service_type, occupancy):
+                username = rng.choice(self.usernames)
+                booked = start - timedelta(days=rng.randint(1, 60), minutes=rng.randrange(1440))
+                self.batch.add(Booking(id=booking_id, username_id=username, booking_date=min(booked, now)))
+                self.batch.add(
+                    BookingDetail(booking_id=booking_id, service_id=service_id, start_date=start, end_date=end)
+                )
+                # draw for every booking so the other rows do not depend on the run date
+                review, vote = rng.random() < review_rate, rng.choices((1, 2, 3, 4, 5), (1, 1, 2, 4, 4))[0]
+                if review and service_id == reviewable[service_type] and end.date() < self.today:
+                    self.batch.add(
+                        Review(
+                            id=review_id,
+                            service_type=service_type,
+                            vote=vote,
+                            description=REVIEW_TEXTS[vote],
+                            username_id=username,
+                            id_booking_id=booking_id,
+                            review_date=min(end + timedelta(days=1), now),
+                        )
+                    )
+                    review_id += 1
+                booking_id += 1
+
+    def calendar(self, service_type, occupancy):
+        """Yield non-overlapping (start, end) bookings of one service."""
+        rng = self.rng
+        if service_type == "CAMERA":
+            day = self.start
+            mean_gap = 4 * (1 - occupancy) / occupancy  # stays last 4 nights on average
+            while True:
+                day += timedelta(days=round(rng.expovariate(1 / mean_gap)) if mean_gap else 0)
+                checkout = day + timedelta(days=rng.randint(1, 7))
+                if checkout > self.end:
+                    return
+                yield self.at(day), self.at(checkout)
+                day = checkout
+        else:
+            day = self.start
+            while day < self.end:
+                for hour in availability.SLOT_HOURS:
+                    if rng.random() < occupancy:
+                        start = self.at(day, hour)
+                        yield start, start + availability.SLOT_LENGTH
+                day += timedelta(days=1)
+
+    def orders(self):
+        rng = self.rng
+        products = list(Product.objects.order_by("id").values_list("id", "price"))
+        if not products:
+            first = next_id(Product)
+            for i, (name, price) in enumerate(PRODUCTS):
+                self.batch.add(Product(id=first + i, name=name, price=Decimal(price)))
+                products.append((first + i, Decimal(price)))
+
+        order_id = next_id(Order)
+        now = self.at(self.today)
+        mean = self.options["orders_per_user"]
+        for username in self.usernames:
+            for _ in range(round(rng.uniform(0, 2 * mean))):
+                self.batch.add(Order(id=order_id, username_id=username, date=min(self.season_moment(), now)))
+                for product_id, price in rng.sample(products, min(len(products), rng.randint(1, 4))):
+                    self.batch.add(
+                        OrderDetail(order_id=order_id, product_id=product_id, quantity=rng.randint(1, 5), unit_price=price)
+                    )
+                order_id += 1
+
+    def events(self):
+        rng = self.rng
+        if not self.employees:
+            self.stderr.write("No employees to create events: skipping EVENTO/ISCRIVE.")
+            return
+        event_id = next_id(Event)
+        for i in range(self.options["events"]):
+            seats = rng.randint(10, 200)
+            day = self.start + timedelta(days=rng.randrange(self.options["days"]))
+            self.batch.add(
+                Event(
+                    id=event_id,
+                    seats=seats,
+                    title=f"Evento {i + 1}",
+                    description="Evento generato",
+                    date=day,
+                    username_id=rng.choice(self.employees),
+                )
+            )
+            # seats are only ever partially taken, never oversold
+            left = round(seats * rng.uniform(0.3, 1.0))
+            for username in rng.sample(self.usernames, min(len(self.usernames), left)):
+                if left <= 0:
+                    break
+                participants = min(left, rng.randint(1, 4))
+                left -= participants
+                self.batch.add(
+                    Enrolls(
+                        event_id=event_id,
+                        username_id=username,
+                        participants=participants,
+                        enroll_date=self.at(day) - timedelta(days=rng.randint(1, 30)),
+                    )
+                )
+            event_id += 1
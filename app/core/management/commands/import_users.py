@@ -0,0 +1,187 @@
+"""
+Bulk import of registrations (PERSONA + UTENTE) from a CSV file.
+
+The file is streamed in chunks, so its size does not matter. For every chunk:
+- rows are validated with ImportRowForm (the RegisterForm rules);
+- usernames and tax codes already in the database are found with one IN
+  query each and those rows are skipped, as are repeats inside the file;
+- passwords are hashed on a process pool (PBKDF2 is CPU bound) while the
+  previous chunk is being written;
+- PERSONA and UTENTE rows are inserted with bulk_create in one transaction.
+
+Expected header (extra columns are ignored, phone and city may be empty):
+
+    tax_code,name,surname,phone,city,username,email,password
+
+    python manage.py import_users groups.csv --chunk-size 500 --workers 4
+    python manage.py import_users - < groups.csv
+"""
+
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+from core.forms import ImportRowForm
+from core.hashing import init_worker
+from core.models import Person, User
+
+COLUMNS = ("tax_code", "name", "surname", "phone", "city", "username", "email", "password")
+REQUIRED = ("tax_code", "name", "surname", "username", "email", "password")
+
+
+class Command(BaseCommand):
+    help = "Import PERSONA/UTENTE rows from a CSV file in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file", help='CSV path, or "-" for standard input.')
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Hashing processes; 0 hashes in this process.",
+        )
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only, write nothing.")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self.counts = {"read": 0, "created": 0, "existing": 0, "duplicate": 0, "invalid": 0, "failed": 0}
+        self.seen_usernames = set()
+        self.seen_tax_codes = set()
+
+        path = options["csv_file"]
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        executor = None
+        if options["workers"] > 0 and not options["dry_run"]:
+            executor = ProcessPoolExecutor(max_workers=options["workers"], initializer=init_worker)
+
+        started = time.perf_counter()
+        try:
+            reader = csv.DictReader(stream, delimiter=options["delimiter"])
+            missing = set(REQUIRED) - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+
+            rows_iter = self.rows(reader)
+            pending = None
+            while True:
+                chunk = list(islice(rows_iter, options["chunk_size"]))
+                if not chunk:
+                    break
+                rows = self.prepare(chunk)
+                if options["dry_run"]:
+                    continue
+                passwords = [row["password1"] for row in rows]
+                # map() submits the whole chunk now; hashes are collected when
+                # the chunk is written, after the previous one
+                if executor is not None:
+                    hashes = executor.map(make_password, passwords, chunksize=16)
+                else:
+                    hashes = map(make_password, passwords)
+                if pending is not None:
+                    self.write(*pending)
+                pending = (rows, hashes)
+            if pending is not None:
+                self.write(*pending)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        counts = self.counts
+        self.stdout.write(" ".join(f"{key}={value}" for key, value in counts.items()))
+        self.stdout.write(
+            f"elapsed={elapsed:.3f}s throughput={counts['read'] / elapsed if elapsed else 0:.1f} rows/s"
+        )
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run: nothing was written."))
+
+    def rows(self, reader):
+        for row in reader:
+            self.counts["read"] += 1
+            yield reader.line_num, row
+
+    def prepare(self, chunk):
+        """Validate a chunk and drop rows that exist already. Returns cleaned rows."""
+        valid = []
+        for line, row in chunk:
+            data = {key: (row.get(key) or "").strip() for key in COLUMNS}
+            data["password1"] = row.get("password") or ""
+            form = ImportRowForm(data)
+            if not form.is_valid():
+                self.counts["invalid"] += 1
+                self.report(line, "invalid", "; ".join(
+                    f"{field}: {' '.join(errors)}" for field, errors in form.errors.items()
+                ))
+                continue
+            valid.append((line, form.cleaned_data))
+
+        usernames = {row["username"] for _, row in valid}
+        tax_codes = {row["tax_code"] for _, row in valid}
+        taken_usernames = set(
+            User.objects.filter(username__in=usernames).values_list("username", flat=True)
+        )
+        taken_tax_codes = set(
+            Person.objects.filter(cf__in=tax_codes).values_list("cf", flat=True)
+        )
+
+        rows = []
+        for line, row in valid:
+            username, tax_code = row["username"], row["tax_code"]
+            if username in self.seen_usernames or tax_code in self.seen_tax_codes:
+                self.counts["duplicate"] += 1
+                self.report(line, "skipped", "repeated in the file")
+            elif username in taken_usernames or tax_code in taken_tax_codes:
+                self.counts["existing"] += 1
+                self.report(line, "skipped", "username or tax code already registered")
+            else:
+                self.seen_usernames.add(username)
+                self.seen_tax_codes.add(tax_code)
+                rows.append(row)
+        return rows
+
+    def write(self, rows, hashes):
+        if not rows:
+            return
+        hashes = list(hashes)
+        persons = [
+            Person(
+                cf=row["tax_code"],
+                name=row["name"],
+                surname=row["surname"],
+                # PERSONA.telefono is NOT NULL in the schema
+                phone=row.get("phone") or "",
+                city=row.get("city") or None,
+            )
+            for row in rows
+        ]
+        users = [
+            User(username=row["username"], cf_id=row["tax_code"], password=encoded, email=row["email"])
+            for row, encoded in zip(rows, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                Person.objects.bulk_create(persons)
+                User.objects.bulk_create(users)
+        except DatabaseError as exc:
+            # e.g. a concurrent registration took one of the keys
+            self.counts["failed"] += len(rows)
+            self.stderr.write(f"chunk of {len(rows)} rows not imported: {exc}")
+            return
+        self.counts["created"] += len(rows)
+        if self.verbosity >= 2:
+            self.stdout.write(f"imported {self.counts['created']} rows")
+
+    def report(self, line, status, reason):
+        if self.verbosity >= 2 or status == "invalid":
+            self.stderr.write(f"line {line}: {status}: {reason}")
@@ -0,0 +1,24 @@
+"""
+Bump the catalog cache version.
+
+Django signals do not see changes made with raw SQL (the
+service_status_scheduler command bumps the version itself). Run this
+command after such changes so the homepage and services pages stop serving
+the previous statuses:
+
+    python manage.py invalidate_catalog
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import catalog
+
+
+class Command(BaseCommand):
+    help = "Invalidate the cached service catalog (bumps its version counter)."
+
+    def handle(self, *args, **options):
+        catalog.cache.bump()
+        self.stdout.write(
+            self.style.SUCCESS(f"Catalog cache version is now {catalog.cache.version()}.")
+        )
@@ -0,0 +1,79 @@
+"""
+Keep SERVIZIO.status in step with the bookings (core.servicestatus).
+
+Replaces the hourly MySQL EVENT evt_aggiorna_stato_servizi: a service turns
+OCCUPATO when one of its bookings starts and DISPONIBILE when the last one
+running ends, at the time of the transition instead of up to an hour later.
+Only the services with a due transition are updated; new bookings are read
+every SERVICE_STATUS_POLL_SECONDS.
+
+Run it as a long-lived process (systemd, supervisor), one per database:
+
+    python manage.py service_status_scheduler
+    python manage.py service_status_scheduler --once   # reconcile now and exit
+
+Database errors are logged and retried after a poll interval; the pending
+transitions are kept.
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from core import servicestatus
+
+
+class Command(BaseCommand):
+    help = "Flip service statuses when bookings start and end (replaces evt_aggiorna_stato_servizi)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Reconcile every service once and exit.")
+        parser.add_argument(
+            "--poll", type=float, help="Seconds between polls for new bookings (default: settings)."
+        )
+
+    def handle(self, *args, **options):
+        scheduler = servicestatus.StatusScheduler()
+        self.report("sync", scheduler.sync())
+        if options["once"]:
+            return
+
+        poll = options["poll"] or servicestatus.poll_seconds()
+        resync = servicestatus.resync_seconds()
+        next_poll = time.monotonic() + poll
+        self.stdout.write(f"{len(scheduler)} transitions pending; polling every {poll:g}s.")
+        try:
+            while True:
+                try:
+                    if resync is not None and timezone.now() - scheduler.synced_at >= timedelta(seconds=resync):
+                        self.report("sync", scheduler.sync())
+                    if time.monotonic() >= next_poll:
+                        scheduler.poll()
+                        next_poll = time.monotonic() + poll
+                    self.report("due", scheduler.run_due())
+                except DatabaseError as exc:
+                    self.stderr.write(f"Database error, retrying in {poll:g}s: {exc}")
+                    close_old_connections()
+                    time.sleep(poll)
+                    continue
+                time.sleep(self.sleep_time(scheduler.next_due(), next_poll))
+        except KeyboardInterrupt:
+            self.stdout.write(f"Stopped: {scheduler.stats()}")
+
+    @staticmethod
+    def sleep_time(next_due, next_poll) -> float:
+        """Seconds until the next transition or poll, whichever comes first."""
+        wait = next_poll - time.monotonic()
+        if next_due is not None:
+            wait = min(wait, (next_due - timezone.now()).total_seconds())
+        return max(wait, 0)
+
+    def report(self, what, changed):
+        occupied, released = changed
+        if occupied or released:
+            self.stdout.write(
+                f"{timezone.now():%Y-%m-%d %H:%M:%S} {what}: {occupied} OCCUPATO, {released} DISPONIBILE"
+            )
@@ -0,0 +1,119 @@
+"""
+Top-N report of the slow-query log written by core.slowlog.
+
+Entries (the current log and its rotated files) are grouped by fingerprint,
+i.e. by statement shape, and ranked by total time (default), count or worst
+duration. For each group the report shows the normalized SQL, the views and
+the app frames that issued it, and the slowest instance. --explain runs
+EXPLAIN (EXPLAIN QUERY PLAN on SQLite) on that instance; only SELECTs with
+recorded parameters are explained, on the database they ran on.
+
+    python manage.py slow_queries --top 10
+    python manage.py slow_queries --sort count --view profile --explain
+    python manage.py slow_queries --log /var/log/farmhouse/slow-queries.log --json
+"""
+
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+
+from core import slowlog
+
+SORT_KEYS = {
+    "total": lambda group: group["total_ms"],
+    "count": lambda group: group["count"],
+    "max": lambda group: group["max_ms"],
+}
+
+
+class Command(BaseCommand):
+    help = "Aggregate the slow-query log into a top-N report by fingerprint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", help="Log file (default: settings.SLOW_QUERY_LOG).")
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="total")
+        parser.add_argument("--view", help="Only statements issued by this URL name.")
+        parser.add_argument("--hours", type=float, help="Only entries of the last N hours.")
+        parser.add_argument("--explain", action="store_true", help="EXPLAIN the slowest instance.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["hours"] is not None:
+            since = (datetime.now() - timedelta(hours=options["hours"])).timestamp()
+
+        groups = {}
+        for entry in slowlog.read_entries(options["log"]):
+            if since is not None and entry.get("ts", 0) < since:
+                continue
+            if options["view"] and entry.get("view") != options["view"]:
+                continue
+            group = groups.get(entry["fingerprint"])
+            if group is None:
+                group = groups[entry["fingerprint"]] = {
+                    "fingerprint": entry["fingerprint"],
+                    "normalized": entry["normalized"],
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "views": Counter(),
+                    "frames": Counter(),
+                    "slowest": entry,
+                }
+            group["count"] += 1
+            group["total_ms"] += entry["ms"]
+            group["views"][entry.get("view", "-")] += 1
+            group["frames"][entry.get("frame", "-")] += 1
+            if entry["ms"] >= group["max_ms"]:
+                group["max_ms"] = entry["ms"]
+                group["slowest"] = entry
+
+        if not groups:
+            raise CommandError("No slow queries recorded (is SLOW_QUERY_MS set?).")
+
+        top = sorted(groups.values(), key=SORT_KEYS[options["sort"]], reverse=True)[: options["top"]]
+        for group in top:
+            group["total_ms"] = round(group["total_ms"], 3)
+            group["avg_ms"] = round(group["total_ms"] / group["count"], 3)
+            group["views"] = dict(group["views"].most_common())
+            group["frames"] = dict(group["frames"].most_common())
+            if options["explain"]:
+                group["explain"] = self.explain(group["slowest"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(top, indent=2, default=str))
+            return
+        for rank, group in enumerate(top, 1):
+            self.print_group(rank, group)
+
+    def explain(self, entry):
+        if "params" not in entry or not entry["sql"].lstrip().upper().startswith("SELECT"):
+            return None
+        connection = connections[entry.get("db", "default")]
+        prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + entry["sql"], entry["params"])
+                columns = [col[0] for col in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except DatabaseError as exc:
+            return [{"error": str(exc)}]
+
+    def print_group(self, rank, group):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"#{rank} {group['fingerprint']}  count={group['count']} total={group['total_ms']:.1f} ms "
+            f"avg={group['avg_ms']:.1f} ms max={group['max_ms']:.1f} ms"
+        ))
+        self.stdout.write(f"  {group['normalized']}")
+        self.stdout.write("  views:  " + ", ".join(f"{v} ({n})" for v, n in group["views"].items()))
+        self.stdout.write("  frames: " + ", ".join(f"{f} ({n})" for f, n in group["frames"].items()))
+        slowest = group["slowest"]
+        when = datetime.fromtimestamp(slowest["ts"]).isoformat(timespec="seconds")
+        self.stdout.write(f"  slowest: {slowest['ms']:.1f} ms at {when}, params={slowest.get('params', '-')}")
+        for row in group.get("explain") or ():
+            self.stdout.write("  plan:   " + " ".join(f"{k}={v}" for k, v in row.items()))
+        self.stdout.write("")
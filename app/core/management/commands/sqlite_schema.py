@@ -0,0 +1,45 @@
+"""
+Check the SQLite port of the schema, or build it into a database file.
+
+sql/sqlite.sql mirrors sql/db.sql for the config.settings_sqlite profile.
+Without options the command lists the differences between the two files
+(tables, columns, views, indexes, triggers); --check makes them an error, so
+CI catches a db.sql change that was not ported:
+
+    python manage.py sqlite_schema --check
+    python manage.py sqlite_schema --build /tmp/farmhouse.sqlite3
+"""
+
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import sqlite_schema
+
+
+class Command(BaseCommand):
+    help = "Compare sql/sqlite.sql with sql/db.sql, or build it into a SQLite file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Fail when the files differ.")
+        parser.add_argument("--build", metavar="PATH", help="Create the schema in this SQLite file.")
+
+    def handle(self, *args, **options):
+        if options["build"]:
+            db = sqlite3.connect(options["build"])
+            try:
+                sqlite_schema.build(db)
+            except sqlite3.DatabaseError as exc:
+                raise CommandError(f"Cannot build the schema in {options['build']}: {exc}")
+            finally:
+                db.close()
+            self.stdout.write(self.style.SUCCESS(f"Schema built in {options['build']}."))
+            return
+
+        problems = sqlite_schema.diff()
+        for problem in problems:
+            self.stdout.write(problem)
+        if problems and options["check"]:
+            raise CommandError(f"sqlite.sql is out of sync with db.sql ({len(problems)} differences).")
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("sqlite.sql is in sync with db.sql."))
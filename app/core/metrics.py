@@ -0,0 +1,415 @@
+"""
+Prometheus metrics aggregated across worker processes.
+
+Overview
+- Counters and histograms are declared at module level (REQUEST_SECONDS,
+  BOOKINGS, ENROLLMENTS, LOGINS, PASSWORD_VERIFY_SECONDS, ...) and updated
+  in place by the code that knows the outcome: MetricsMiddleware times every
+  request per resolved URL name, the booking and enrollment views count their
+  results, core.signals counts logins and core.hashers times every PBKDF2
+  verification.
+- GET /metrics renders the Prometheus text format (version 0.0.4) from the
+  samples of every worker, so one scrape sees the whole server.
+
+Store
+- With settings.METRICS_DIR set, each process keeps its samples in
+  METRICS_DIR/<pid>-<start time in ns>.db, an mmap'ed table of (sample, float) records: an
+  update is an in-place write into shared memory, with no lock across
+  processes and no system call. /metrics sums the files of all processes.
+  Empty the directory before starting the server (e.g. in the gunicorn
+  on_starting hook); files of exited workers keep counting, which keeps the
+  counters monotonic across worker restarts. The start time in the name
+  keeps a new worker that reuses the PID of an exited one from taking over
+  (and zeroing) its file.
+- Without METRICS_DIR the samples stay in process memory (runserver, tests):
+  /metrics then reports the worker that answers the scrape.
+
+Cache hit ratios
+- The hit/miss counters of core.catalog and core.usercache are copied from
+  their stats() into the store at the end of every request (a few dict
+  writes). farmhouse_cache_hit_ratio is derived from the summed counters when
+  /metrics is rendered.
+
+Connection pools
+- The state (in use, idle) and counters of the core.dbpool pools are copied
+  into the store the same way. Pool gauges are summed over the process
+  files like everything else, so the files of exited workers must be
+  cleared at startup for them to stay meaningful.
+
+Settings
+- METRICS_DIR: directory of the per-process files (default None: memory).
+- METRICS_ALLOWED_IPS: client addresses allowed to read /metrics besides
+  staff users (default loopback only; an empty list allows everyone).
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HASHING_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+
+class MmapValues:
+    """
+    Append-only (key -> float) table of one process in an mmap'ed file.
+
+    Layout: an 8-byte header holding the used size, then one record per key:
+    key length (4 bytes), UTF-8 key padded to 8 bytes, value (double).
+    """
+
+    INITIAL_SIZE = 1 << 16
+    HEADER = 8
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self.INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = struct.unpack_from("i", self._map, 0)[0] or self.HEADER
+        self._positions = {key: pos for key, pos, _ in self._records(self._map, self._used)}
+
+    @staticmethod
+    def _records(buffer, used: int) -> Iterable[Tuple[str, int, float]]:
+        pos = MmapValues.HEADER
+        while pos < used:
+            length = struct.unpack_from("i", buffer, pos)[0]
+            key = bytes(buffer[pos + 4:pos + 4 + length]).decode()
+            pos += 4 + length
+            pos += -pos % 8
+            yield key, pos, struct.unpack_from("d", buffer, pos)[0]
+            pos += 8
+
+    def set(self, key: str, value: float) -> None:
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._append(key)
+        struct.pack_into("d", self._map, pos, value)
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode()
+        record = struct.pack("i", len(encoded)) + encoded
+        record += b"\0" * (-len(record) % 8)
+        end = self._used + len(record) + 8
+        if end > len(self._map):
+            size = len(self._map)
+            while size < end:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[self._used:self._used + len(record)] = record
+        pos = self._used + len(record)
+        struct.pack_into("d", self._map, pos, 0.0)
+        self._used = end
+        # publish the record only once it is complete
+        struct.pack_into("i", self._map, 0, self._used)
+        self._positions[key] = pos
+        return pos
+
+    @classmethod
+    def read(cls, path: Path) -> Dict[str, float]:
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < cls.HEADER:
+            return {}
+        used = struct.unpack_from("i", data, 0)[0]
+        return {key: value for key, _, value in cls._records(data, used)}
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class Store:
+    """Samples of this process, written through to its mmap file if enabled."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._values: Dict[str, float] = {}
+        self._file: Optional[MmapValues] = None
+
+    @property
+    def directory(self) -> Optional[Path]:
+        path = getattr(settings, "METRICS_DIR", None)
+        return Path(path) if path else None
+
+    def _check_process(self) -> None:
+        # a forked worker starts its own file and its own counts
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = {}
+            self._file = None
+            if self.directory is not None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._file = MmapValues(self.directory / f"{self._pid}-{time.time_ns()}.db")
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            self._check_process()
+            value = self._values[key] = self._values.get(key, 0.0) + amount
+            if self._file is not None:
+                self._file.set(key, value)
+
+    def set(self, key: str, value: float) -> None:
+        with self._lock:
+            self._check_process()
+            if self._values.get(key) == value:
+                return
+            self._values[key] = value
+            if self._file is not None:
+                self._file.set(key, value)
+
+    def collect(self) -> Dict[str, float]:
+        """Samples summed over every process (or this one without METRICS_DIR)."""
+        directory = self.directory
+        if directory is None or not directory.is_dir():
+            with self._lock:
+                return dict(self._values)
+        totals: Dict[str, float] = {}
+        for path in directory.glob("*.db"):
+            for key, value in MmapValues.read(path).items():
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def reset(self) -> None:
+        """Forget this process' samples (tests)."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file.path.unlink(missing_ok=True)
+            self._pid = None
+            self._values = {}
+            self._file = None
+
+
+store = Store()
+FAMILIES: Dict[str, "Metric"] = {}
+
+
+def _labels(names: Tuple[str, ...], values: Dict[str, object], extra: str = "") -> str:
+    if set(values) != set(names):
+        raise ValueError(f"expected labels {names}, got {tuple(values)}")
+    pairs = [
+        '%s="%s"' % (name, str(values[name]).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name in names
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        FAMILIES[name] = self
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        store.add(self.name + _labels(self.labels, labels), amount)
+
+    def set_total(self, value: float, **labels) -> None:
+        """Mirror a counter kept elsewhere in this process (e.g. a stats() dict)."""
+        store.set(self.name + _labels(self.labels, labels), value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._bounds = [("%r" % b) for b in self.buckets] + ["+Inf"]
+
+    def observe(self, value: float, **labels) -> None:
+        # only the first bucket holding the value is written; render()
+        # accumulates them, which keeps an observation to three updates
+        index = bisect_left(self.buckets, value)
+        store.add(self.name + "_bucket" + _labels(self.labels, labels, 'le="%s"' % self._bounds[index]), 1)
+        store.add(self.name + "_count" + _labels(self.labels, labels), 1)
+        store.add(self.name + "_sum" + _labels(self.labels, labels), value)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        store.set(self.name + _labels(self.labels, labels), value)
+
+
+REQUEST_SECONDS = Histogram(
+    "farmhouse_http_request_duration_seconds",
+    "Request latency per resolved URL name.",
+    ("route", "method"),
+)
+RESPONSES = Counter(
+    "farmhouse_http_responses_total", "Responses per resolved URL name and status code.", ("route", "status")
+)
+BOOKINGS = Counter(
+    "farmhouse_bookings_total",
+    "Service booking attempts by outcome (success, conflict, invalid, error).",
+    ("result",),
+)
+ENROLLMENTS = Counter(
+    "farmhouse_enrollments_total",
+    "Event enrollment attempts by outcome (enrolled, updated, waitlisted, invalid, error).",
+    ("result",),
+)
+LOGINS = Counter(
+    "farmhouse_logins_total", "Login attempts by outcome (success, failed, throttled).", ("result",)
+)
+PASSWORD_VERIFY_SECONDS = Histogram(
+    "farmhouse_password_verify_seconds", "PBKDF2 password verification time.", (), HASHING_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    "farmhouse_cache_requests_total", "Lookups of the in-process caches by result.", ("cache", "result")
+)
+CACHE_HIT_RATIO = Gauge(
+    "farmhouse_cache_hit_ratio", "Hits / lookups of the in-process caches, all workers together.", ("cache",)
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "farmhouse_db_pool_connections", "Pooled database connections by state (in_use, idle).", ("alias", "state")
+)
+DB_POOL_EVENTS = Counter(
+    "farmhouse_db_pool_events_total",
+    "Connection pool events (checkouts, waits, timeouts, created, recycled, ping_failures, discarded).",
+    ("alias", "event"),
+)
+
+
+def _cache_sources() -> Dict[str, Callable[[], Dict[str, float]]]:
+    from . import catalog, usercache
+
+    return {"catalog": catalog.cache.stats, "user": usercache.cache.stats}
+
+
+def sync_caches() -> None:
+    """Copy the hit/miss counters of the in-process caches into the store."""
+    for name, stats in _cache_sources().items():
+        values = stats()
+        CACHE_REQUESTS.set_total(values["hits"], cache=name, result="hit")
+        CACHE_REQUESTS.set_total(values["misses"], cache=name, result="miss")
+
+
+def sync_db_pools() -> None:
+    """Copy the state and counters of the connection pools into the store."""
+    from . import dbpool
+
+    for alias, values in dbpool.registry.stats().items():
+        for state in ("in_use", "idle"):
+            DB_POOL_CONNECTIONS.set(values[state], alias=alias, state=state)
+        for event in dbpool.ConnectionPool.COUNTERS:
+            DB_POOL_EVENTS.set_total(values[event], alias=alias, event=event)
+
+
+def _split(sample: str) -> Tuple[str, str]:
+    name, brace, rest = sample.partition("{")
+    return name, brace + rest
+
+
+def render() -> str:
+    """All families in the Prometheus text exposition format."""
+    samples = store.collect()
+    by_name: Dict[str, List[Tuple[str, float]]] = {}
+    for sample, value in samples.items():
+        name, labels = _split(sample)
+        by_name.setdefault(name, []).append((labels, value))
+
+    hits: Dict[str, Dict[str, float]] = {}
+    for labels, value in by_name.get(CACHE_REQUESTS.name, []):
+        cache = labels.split('cache="')[1].split('"')[0]
+        result = "hit" if 'result="hit"' in labels else "miss"
+        hits.setdefault(cache, {"hit": 0.0, "miss": 0.0})[result] += value
+
+    lines = []
+    for name in sorted(FAMILIES):
+        family = FAMILIES[name]
+        lines.append(f"# HELP {name} {family.documentation}")
+        lines.append(f"# TYPE {name} {family.kind}")
+        if isinstance(family, Histogram):
+            lines.extend(_histogram_lines(family, by_name))
+        elif family is CACHE_HIT_RATIO:
+            for cache, counts in sorted(hits.items()):
+                total = counts["hit"] + counts["miss"]
+                lines.append(f'{name}{{cache="{cache}"}} {counts["hit"] / total if total else 0.0}')
+        else:
+            for labels, value in sorted(by_name.get(name, [])):
+                lines.append(f"{name}{labels} {_format(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(family: Histogram, by_name) -> List[str]:
+    series: Dict[str, Dict[str, float]] = {}
+    for labels, value in by_name.get(family.name + "_bucket", []):
+        base, _, bound = labels.rpartition('le="')
+        series.setdefault(base, {})[bound.rstrip('"}')] = value
+    lines = []
+    for base in sorted(series):
+        cumulative = 0.0
+        for bound in family._bounds:
+            cumulative += series[base].get(bound, 0.0)
+            lines.append(f'{family.name}_bucket{base}le="{bound}"}} {_format(cumulative)}')
+        labels = base[:-1] + "}" if base != "{" else ""
+        for suffix in ("_count", "_sum"):
+            value = dict(by_name.get(family.name + suffix, [])).get(labels, 0.0)
+            lines.append(f"{family.name}{suffix}{labels} {_format(value)}")
+    return lines
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def route_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None and match.view_name else "<unresolved>"
+
+
+class MetricsMiddleware:
+    """Time every request per URL name and refresh the cache and pool counters."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _record(self, request, status: int, elapsed: float) -> None:
+        route = route_name(request)
+        REQUEST_SECONDS.observe(elapsed, route=route, method=request.method)
+        RESPONSES.inc(route=route, status=status)
+        sync_caches()
+        sync_db_pools()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response.status_code, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response.status_code, time.perf_counter() - started)
+        return response
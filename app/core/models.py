@@ -246,21 +246,23 @@ class Booking(models.Model):
         verbose_name_plural = "Prenotazioni"
 
 
-class BookingDetail(models.Model):
+class BookingDetail(CPkModel):
     booking = models.ForeignKey(
         Booking,
         models.CASCADE,
         db_column="ID_prenotazione",
         related_name="details",
+        primary_key=True,
     )
     service = models.ForeignKey(
         Service,
         models.CASCADE,
         db_column="ID_servizio",
         related_name="booking_details",
+        primary_key=True,
     )
-    start_date = models.DateField(db_column="data_inizio")
-    end_date = models.DateField(db_column="data_fine")
+    start_date = models.DateTimeField(db_column="data_inizio")
+    end_date = models.DateTimeField(db_column="data_fine")
 
     class Meta:
         db_table = "DETTAGLIO_PRENOTAZIONE"
@@ -352,6 +354,29 @@ class Enrolls(CPkModel):
         unique_together = (("event", "username"),)
 
 
+class Waitlist(models.Model):
+    id = models.AutoField(primary_key=True, db_column="ID_attesa")
+    event = models.ForeignKey(
+        Event,
+        models.CASCADE,
+        db_column="ID_evento",
+        to_field="id",
+        related_name="waitlist",
+    )
+    username = models.ForeignKey(
+        User, models.CASCADE, db_column="username", to_field="username"
+    )
+    participants = models.IntegerField(db_column="partecipanti", default=1)
+    request_date = models.DateTimeField(db_column="data_richiesta", null=True)
+
+    class Meta:
+        db_table = "LISTA_ATTESA"
+        managed = False
+        verbose_name = "Lista d'attesa"
+        verbose_name_plural = "Liste d'attesa"
+        unique_together = (("event", "username"),)
+
+
 class Product(models.Model):
     id = models.AutoField(primary_key=True, db_column="ID_prodotto")
     name = models.CharField(max_length=100, db_column="nome")
@@ -0,0 +1,303 @@
+"""
+On-demand profiling of single requests, for staff users.
+
+Overview
+- A staff user adds ?_profile=<mode> to a URL, or sends the header
+  "X-Profile: <mode>", and ProfilingMiddleware runs that one request under a
+  profiler:
+    - "cprofile" (or "1"): deterministic cProfile, saved as a .pstats file
+      (python -m pstats, snakeviz, ...);
+    - "sample": a sampling profiler (one stack per millisecond), saved in
+      the speedscope format (https://www.speedscope.app).
+  Requests of other users, and staff requests without the trigger, only pay
+  for the presence check.
+- Every profile gets a .json side file with the URL, user, status, duration
+  and the SQL summary of the request (count, DB time, duplicated statements,
+  see core.querystats). The staff page /staff/profiles/ lists the most
+  recent ones with download links.
+
+WSGI and ASGI
+- Under WSGI the request runs on one thread, which is the one profiled.
+- Under ASGI a request runs on the event loop plus one sync thread of its
+  own (ThreadSensitiveContext) for sync views, ORM calls and templates. Both
+  threads are profiled: the sampler keeps only event-loop stacks that belong
+  to this request, while cProfile records everything the event loop runs
+  during the request, concurrent requests included.
+
+Settings
+- PROFILING_ENABLED: honour the trigger (default True).
+- PROFILING_DIR: output directory (default BASE_DIR/profiles).
+- PROFILING_KEEP: profiles kept; older ones are deleted (default 50).
+- PROFILING_SAMPLE_INTERVAL: sampler period in seconds (default 0.001).
+"""
+
+import cProfile
+import json
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .querystats import RequestQueries, normalize, route_name, wrap_connections
+
+QUERY_PARAM = "_profile"
+HEADER = "HTTP_X_PROFILE"
+MODES = {"1": "cprofile", "cprofile": "cprofile", "sample": "sample"}
+SUFFIXES = {"cprofile": ".pstats", "sample": ".speedscope.json"}
+NAME_RE = re.compile(r"^[\w.-]+$")
+
+
+def profile_dir() -> Path:
+    return Path(getattr(settings, "PROFILING_DIR", settings.BASE_DIR / "profiles"))
+
+
+def requested_mode(request) -> Optional[str]:
+    """Profiler requested by a staff user for this request, or None."""
+    value = request.GET.get(QUERY_PARAM) or request.META.get(HEADER)
+    if not value or not getattr(settings, "PROFILING_ENABLED", True):
+        return None
+    user = getattr(request, "user", None)
+    if user is None or not user.is_staff:
+        return None
+    return MODES.get(value.lower())
+
+
+class Sampler(threading.Thread):
+    """
+    Sample the stacks of some threads at a fixed period.
+
+    `targets` maps thread ids to an anchor frame: when set, only stacks
+    containing it are kept (the event loop runs other requests too).
+    """
+
+    def __init__(self, targets: Dict[int, object], interval: float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.targets = targets
+        self.interval = interval
+        self.samples: List[Tuple[Tuple, float]] = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for ident, anchor in self.targets.items():
+                frame = frames.get(ident)
+                stack, anchored = [], anchor is None
+                while frame is not None:
+                    anchored = anchored or frame is anchor
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if stack and anchored:
+                    self.samples.append((tuple(reversed(stack)), now - last))
+            last = now
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def speedscope(self, name: str, duration: float) -> Dict:
+        frames, index, samples, weights = [], {}, [], []
+        for stack, weight in self.samples:
+            row = []
+            for key in stack:
+                if key not in index:
+                    index[key] = len(frames)
+                    frames.append({"name": key[0], "file": key[1], "line": key[2]})
+                row.append(index[key])
+            samples.append(row)
+            weights.append(weight)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "farmhouse core.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": duration,
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+class Session:
+    """Profiler, SQL collector and output of one profiled request."""
+
+    def __init__(self, request, mode: str):
+        self.request = request
+        self.mode = mode
+        self.queries = RequestQueries()
+        self.profiles: List[cProfile.Profile] = []
+        self.sampler: Optional[Sampler] = None
+        self.started = 0.0
+
+    # cProfile only sees the thread it is enabled on: one profile per thread
+    def enable_here(self):
+        if self.mode == "cprofile":
+            profile = cProfile.Profile()
+            self.profiles.append(profile)
+            profile.enable()
+            return profile
+        return None
+
+    def start_sampler(self, targets: Dict[int, object]) -> None:
+        interval = getattr(settings, "PROFILING_SAMPLE_INTERVAL", 0.001)
+        self.sampler = Sampler(targets, interval)
+        self.sampler.start()
+
+    def save(self, response, elapsed: float) -> Path:
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        route = re.sub(r"[^\w-]", "_", route_name(self.request))
+        base = f"{stamp}-{route}-{uuid.uuid4().hex[:6]}"
+        title = f"{self.request.method} {self.request.get_full_path()}"
+
+        path = directory / (base + SUFFIXES[self.mode])
+        if self.mode == "cprofile":
+            stats = pstats.Stats(self.profiles[0])
+            for profile in self.profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(path)
+        else:
+            path.write_text(json.dumps(self.sampler.speedscope(title, elapsed)))
+
+        meta = {
+            "file": path.name,
+            "mode": self.mode,
+            "created": time.time(),
+            "method": self.request.method,
+            "url": self.request.get_full_path(),
+            "route": route_name(self.request),
+            "user": self.request.user.get_username(),
+            "status": response.status_code,
+            "ms": round(elapsed * 1000, 2),
+            "queries": self.queries.count,
+            "db_ms": round(self.queries.duration * 1000, 2),
+            "duplicated": self.queries.duplicated(),
+            "duplicates": [
+                {"executions": n, "sql": normalize(self.queries.statements[key])}
+                for key, n in sorted(self.queries.duplicates().items(), key=lambda item: -item[1])
+            ],
+        }
+        (directory / (base + ".json")).write_text(json.dumps(meta, indent=2))
+        prune(getattr(settings, "PROFILING_KEEP", 50))
+        return path
+
+
+def recent(limit: int = 50) -> List[Dict]:
+    """Metadata of the most recent profiles, newest first."""
+    entries = []
+    for meta_path in profile_dir().glob("*.json"):
+        if meta_path.name.endswith(".speedscope.json"):
+            continue
+        try:
+            entries.append(json.loads(meta_path.read_text()))
+        except ValueError:
+            continue
+    entries.sort(key=lambda meta: meta.get("created", 0), reverse=True)
+    return entries[:limit]
+
+
+def prune(keep: int) -> None:
+    for meta in recent(limit=10**6)[keep:]:
+        (profile_dir() / meta["file"]).unlink(missing_ok=True)
+        (profile_dir() / (meta["file"].split(".")[0] + ".json")).unlink(missing_ok=True)
+
+
+def profile_file(name: str) -> Optional[Path]:
+    """Path of a saved profile, or None for names outside the directory."""
+    if not NAME_RE.match(name) or not name.endswith(tuple(SUFFIXES.values())):
+        return None
+    path = profile_dir() / name
+    return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """Run trigger-carrying staff requests under a profiler; see the module docstring."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        session = Session(request, mode)
+        stack = wrap_connections(session.queries)
+        if mode == "sample":
+            session.start_sampler({threading.get_ident(): None})
+        profile = session.enable_here()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+            if session.sampler is not None:
+                session.sampler.stop()
+            stack.close()
+        session.save(response, elapsed)
+        return response
+
+    async def __acall__(self, request):
+        # request.user is a lazy object that may query: resolve it off the loop
+        mode = await sync_to_async(requested_mode)(request)
+        if mode is None:
+            return await self.get_response(request)
+
+        session = Session(request, mode)
+
+        def start_sync_thread():
+            # runs on the request's sync thread (ThreadSensitiveContext)
+            return threading.get_ident(), wrap_connections(session.queries), session.enable_here()
+
+        sync_ident, stack, sync_profile = await sync_to_async(start_sync_thread)()
+        if mode == "sample":
+            session.start_sampler({
+                sync_ident: None,
+                threading.get_ident(): sys._getframe(),
+            })
+        loop_profile = session.enable_here()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            if loop_profile is not None:
+                loop_profile.disable()
+            if session.sampler is not None:
+                session.sampler.stop()
+
+            def stop_sync_thread():
+                if sync_profile is not None:
+                    sync_profile.disable()
+                stack.close()
+
+            await sync_to_async(stop_sync_thread)()
+        await sync_to_async(session.save)(response, elapsed)
+        return response
@@ -0,0 +1,246 @@
+"""
+Per-request SQL instrumentation.
+
+Overview
+- QueryStatsMiddleware wraps a sampled request with
+  connection.execute_wrapper() on every configured database and records,
+  for each statement, its duration and a fingerprint of the normalized SQL
+  (literals replaced by ?, IN lists collapsed). A fingerprint seen more than
+  once in the same request is flagged as duplicated: the typical N+1 is one
+  SELECT executed per row of a loop (e.g. Service.objects.filter(type=...)
+  for every service type).
+- The totals go to the Server-Timing response header, readable in the
+  browser developer tools:
+      Server-Timing: db;dur=4.1;desc="6 queries", dup;desc="5 duplicated", app;dur=12.8
+- A rolling summary per URL name (requests, queries and DB time over the
+  last QUERY_STATS_WINDOW sampled requests, most duplicated statements) is
+  kept in the module instance `registry` and shown to staff at
+  /staff/queries/.
+
+Settings
+- QUERY_STATS_SAMPLE_RATE: fraction of requests instrumented (default 0.01;
+  0 disables the middleware, 1.0 instruments every request). Unsampled
+  requests only pay one random().
+- QUERY_STATS_WINDOW: sampled requests kept per URL name (default 200).
+- QUERY_STATS_SERVER_TIMING: add the Server-Timing header (default True).
+
+Notes
+- The summary is per process, like the other stats() of the core modules:
+  with several workers each one reports its own share of the traffic.
+- The collector of the current request is available as
+  request.query_stats, for code that wants to add its own details.
+- Under ASGI the wrappers are installed from the sync_to_async thread the
+  request's ORM calls run on, since database connections are per thread.
+- Fingerprints are memoized per SQL string: Django sends parameters
+  separately, so the same ORM query always produces the same string.
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from functools import lru_cache
+from typing import Deque, Dict, List, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)", re.I)
+SPACE_RE = re.compile(r"\s+")
+
+# duplicated statements kept per URL name (the most repeated ones win)
+TOP_DUPLICATES = 10
+
+
+@lru_cache(maxsize=2048)
+def normalize(sql: str) -> str:
+    """SQL with literals replaced by ? and IN lists collapsed to IN (...)."""
+    sql = STRING_RE.sub("?", sql)
+    sql = NUMBER_RE.sub("?", sql)
+    sql = IN_LIST_RE.sub("IN (...)", sql)
+    return SPACE_RE.sub(" ", sql).strip()
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """Short stable id of the normalized statement."""
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+class RequestQueries:
+    """execute_wrapper collecting the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+        self.statements: Dict[str, str] = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            self.statements.setdefault(key, sql)
+
+    def duplicates(self) -> Dict[str, int]:
+        """{fingerprint: executions} of the statements run more than once."""
+        return {key: n for key, n in self.fingerprints.items() if n > 1}
+
+    def duplicated(self) -> int:
+        """Executions beyond the first of every repeated statement."""
+        return sum(n - 1 for n in self.duplicates().values())
+
+    def server_timing(self, elapsed: float) -> str:
+        parts = [f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"']
+        if self.duplicated():
+            parts.append(f'dup;desc="{self.duplicated()} duplicated"')
+        parts.append(f"app;dur={elapsed * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class QueryStatsRegistry:
+    """Rolling per-URL-name summary of the instrumented requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[Tuple[int, float, int]]] = {}
+        self._requests: Counter = Counter()
+        self._duplicates: Dict[str, Dict[str, List]] = {}
+
+    @property
+    def window(self) -> int:
+        return getattr(settings, "QUERY_STATS_WINDOW", 200)
+
+    def record(self, route: str, queries: RequestQueries, elapsed: float) -> None:
+        with self._lock:
+            samples = self._samples.get(route)
+            if samples is None or samples.maxlen != self.window:
+                samples = self._samples[route] = deque(samples or (), maxlen=self.window)
+            samples.append((queries.count, queries.duration, queries.duplicated()))
+            self._requests[route] += 1
+
+            seen = self._duplicates.setdefault(route, {})
+            for key, n in queries.duplicates().items():
+                entry = seen.setdefault(key, [0, 0, normalize(queries.statements[key])])
+                entry[0] += 1  # requests
+                entry[1] = max(entry[1], n)  # worst executions per request
+            if len(seen) > TOP_DUPLICATES:
+                keep = sorted(seen.items(), key=lambda item: (-item[1][0], -item[1][1]))
+                self._duplicates[route] = dict(keep[:TOP_DUPLICATES])
+
+    def summary(self) -> List[Dict[str, object]]:
+        """One entry per URL name, the heaviest DB time first."""
+        with self._lock:
+            rows = []
+            for route, samples in self._samples.items():
+                counts = sorted(count for count, _, _ in samples)
+                db_ms = [duration * 1000 for _, duration, _ in samples]
+                rows.append({
+                    "route": route,
+                    "requests": self._requests[route],
+                    "window": len(samples),
+                    "avg_queries": round(sum(counts) / len(counts), 1),
+                    "max_queries": counts[-1],
+                    "avg_db_ms": round(sum(db_ms) / len(db_ms), 2),
+                    "max_db_ms": round(max(db_ms), 2),
+                    "requests_with_duplicates": sum(1 for _, _, dup in samples if dup),
+                    "duplicates": [
+                        {"fingerprint": key, "requests": n, "max_executions": worst, "sql": sql}
+                        for key, (n, worst, sql) in sorted(
+                            self._duplicates.get(route, {}).items(), key=lambda item: -item[1][0]
+                        )
+                    ],
+                })
+        return sorted(rows, key=lambda row: -row["avg_db_ms"] * row["window"])
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"routes": len(self._samples), "requests": sum(self._requests.values())}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._requests.clear()
+            self._duplicates.clear()
+
+
+registry = QueryStatsRegistry()
+
+
+def wrap_connections(collector) -> ExitStack:
+    """Install `collector` as execute wrapper of this thread's connections;
+    closing the returned stack removes it."""
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(collector))
+    return stack
+
+
+def route_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or match._func_path
+
+
+class QueryStatsMiddleware:
+    """Instrument a sample of the requests; see the module docstring."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self) -> bool:
+        rate = getattr(settings, "QUERY_STATS_SAMPLE_RATE", 0.01)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def _wrap(self, request) -> Tuple[ExitStack, RequestQueries]:
+        queries = request.query_stats = RequestQueries()
+        return wrap_connections(queries), queries
+
+    def _finish(self, request, response, queries: RequestQueries, elapsed: float):
+        registry.record(route_name(request), queries, elapsed)
+        if getattr(settings, "QUERY_STATS_SERVER_TIMING", True):
+            timing = queries.server_timing(elapsed)
+            existing = response.headers.get("Server-Timing")
+            response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        stack, queries = self._wrap(request)
+        started = time.perf_counter()
+        with stack:
+            response = self.get_response(request)
+        return self._finish(request, response, queries, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        # connections are per thread: install the wrappers on the thread that
+        # runs the request's ORM calls (sync_to_async, thread_sensitive)
+        stack, queries = await sync_to_async(self._wrap)(request)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._finish(request, response, queries, time.perf_counter() - started)
@@ -0,0 +1,356 @@
+"""
+Full-text search over reviews, events and animal activities.
+
+Overview
+- SOURCES names the searchable texts: RECENSIONE.descrizione ("reviews"),
+  EVENTO.titolo + descrizione ("events") and ATTIVITA_CON_ANIMALI.descrizione
+  ("activities").
+- search(source, text, queryset=None) returns `queryset` narrowed to the
+  rows matching `text`, annotated with `search_score` and ordered by it
+  (best first, then newest). The caller's filters are kept: the public event
+  search passes the upcoming events, the admin its filtered changelist.
+- On MySQL the match runs in the database:
+  MATCH (columns) AGAINST (text IN NATURAL LANGUAGE MODE) on the FULLTEXT
+  indexes of sql/db.sql, which rank by relevance.
+- Elsewhere (SQLite profile, tests) `local` keeps an inverted index per
+  source in process memory (token -> {pk: term frequency}) and ranks like
+  InnoDB: sum over the query tokens of TF * IDF^2, with
+  IDF = log10(1 + rows / rows containing the token). Candidates are
+  checked against the queryset's filters best first, in batches growing
+  from 2 * SEARCH_MAX_RESULTS to FILTER_BATCH_MAX, until
+  SEARCH_MAX_RESULTS of them pass or the candidates run out: two queries
+  when the filter keeps most rows, a few more when it is selective (the
+  upcoming events among years of past ones).
+
+Bounded latency
+- MySQL reads the FULLTEXT index only; callers slice the result (the event
+  search shows SEARCH_MAX_RESULTS rows).
+- The local index only visits the postings of the query tokens, at most
+  SEARCH_MAX_TERMS of them, and of a common token only its
+  POSTINGS_PER_TERM most frequent documents (a "champion list"): a search
+  reads at most SEARCH_MAX_TERMS * POSTINGS_PER_TERM postings however many
+  reviews there are, which also bounds the candidates a filter is checked
+  on. Stopwords and tokens shorter than three characters
+  are not indexed, as with InnoDB's defaults.
+
+Keeping the local index current
+- Each source index is built on its first search in the process, reading
+  only the pk and text columns in chunks (a few seconds per 100,000 rows).
+- core.signals calls local.changed() after saves and deletes commit: the
+  process that wrote updates its index in place and bumps a version counter
+  in the SEARCH_CACHE_ALIAS cache; other processes see a newer version and
+  rebuild on their next search. Builds read the primary
+  (core.dbrouter.rebuild_alias()), which already has the change the new
+  version stands for; the candidates are then filtered on the queryset's
+  own database.
+
+Settings
+- SEARCH_MAX_RESULTS: rows returned by a local search and shown by the
+  event search (default 50).
+- SEARCH_MAX_TERMS: query tokens considered (default 8).
+- SEARCH_CACHE_ALIAS: cache holding the local index versions (default
+  "default"; use a shared backend with several workers).
+
+Notes
+- MySQL needs the FULLTEXT indexes of sql/db.sql; a database created before
+  they were added gets them with the three CREATE FULLTEXT INDEX statements.
+- Tokens are case- and accent-insensitive in the local index; MySQL follows
+  the column collation.
+"""
+
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import Case, FloatField, Model, QuerySet, Value, When
+from django.db.models.expressions import RawSQL
+
+from . import dbrouter
+from .models import AnimalActivity, Event, Review
+
+
+class Source(NamedTuple):
+    model: type[Model]
+    fields: Tuple[str, ...]
+
+
+SOURCES: Dict[str, Source] = {
+    "reviews": Source(Review, ("description",)),
+    "events": Source(Event, ("title", "description")),
+    "activities": Source(AnimalActivity, ("description",)),
+}
+
+MIN_TOKEN_LENGTH = 3
+# postings of a token read per search: its most frequent documents
+POSTINGS_PER_TERM = 2000
+# largest pk__in list sent to check candidates against a queryset's filters
+FILTER_BATCH_MAX = 1000
+TOKEN_RE = re.compile(r"\w+")
+# InnoDB's default stopword list, plus the common Italian function words
+STOPWORDS = frozenset(
+    (
+        "a about an are as at be by com de en for from how i in is it la of on or that the this "
+        "to was what when where who will with und www "
+        "il lo le gli un una uno di da del della dei delle con su per tra fra che non sono nel "
+        "nella alla allo agli alle dal dalla anche come"
+    ).split()
+)
+
+
+def max_results() -> int:
+    return getattr(settings, "SEARCH_MAX_RESULTS", 50)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case, accent-free tokens of `text`, without stopwords."""
+    folded = text.lower()
+    if not folded.isascii():
+        folded = unicodedata.normalize("NFKD", folded)
+        folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return [
+        token for token in TOKEN_RE.findall(folded)
+        if len(token) >= MIN_TOKEN_LENGTH and token not in STOPWORDS
+    ]
+
+
+def query_terms(text: str) -> List[str]:
+    """Distinct tokens of a query, in order, at most SEARCH_MAX_TERMS."""
+    terms = list(dict.fromkeys(tokenize(text)))
+    return terms[: getattr(settings, "SEARCH_MAX_TERMS", 8)]
+
+
+class InvertedIndex:
+    """token -> {pk: term frequency}, ranked TF * IDF^2 like InnoDB."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[object, int]] = defaultdict(dict)
+        self.documents: Dict[object, Tuple[str, ...]] = {}  # pk -> distinct tokens
+        # token -> min-heap of its POSTINGS_PER_TERM best (tf, pk), for tokens with more
+        self._champions: Dict[str, List[Tuple[int, object]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, pk, text: str) -> None:
+        self.remove(pk)
+        counts = Counter(tokenize(text))
+        for token, tf in counts.items():
+            self.postings[token][pk] = tf
+            champions = self._champions.get(token)
+            if champions is not None and (tf, pk) > champions[0]:
+                heapq.heapreplace(champions, (tf, pk))
+        self.documents[pk] = tuple(counts)
+
+    def remove(self, pk) -> None:
+        for token in self.documents.pop(pk, ()):
+            posting = self.postings[token]
+            tf = posting.pop(pk, None)
+            champions = self._champions.get(token)
+            if champions is not None and (tf, pk) >= champions[0]:
+                del self._champions[token]  # rebuilt on the next search
+            if not posting:
+                del self.postings[token]
+
+    def champions(self, term: str) -> Iterable[Tuple[object, int]]:
+        """(pk, tf) pairs of `term` read by a search: all of them, or the
+        POSTINGS_PER_TERM most frequent (newest first on ties) for common tokens."""
+        posting = self.postings[term]
+        if len(posting) <= POSTINGS_PER_TERM:
+            return posting.items()
+        champions = self._champions.get(term)
+        if champions is None:
+            champions = heapq.nlargest(POSTINGS_PER_TERM, ((tf, pk) for pk, tf in posting.items()))
+            heapq.heapify(champions)
+            self._champions[term] = champions
+        return ((pk, tf) for tf, pk in champions)
+
+    def scores(self, terms: Iterable[str]) -> Dict[object, float]:
+        total = len(self.documents)
+        scores: Dict[object, float] = defaultdict(float)
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log10(1 + total / len(posting))
+            weight = idf * idf
+            for pk, tf in self.champions(term):
+                scores[pk] += tf * weight
+        return scores
+
+    def top(self, terms: Iterable[str], limit: Optional[int]) -> List[Tuple[object, float]]:
+        """Best `limit` (pk, score) pairs (all with None), ties broken by the newest pk."""
+        scores = self.scores(terms)
+        if limit is None:
+            return sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def document_text(values: Iterable[Optional[str]]) -> str:
+    return " ".join(value or "" for value in values)
+
+
+class LocalSearch:
+    """Per-process inverted indexes of SOURCES; see the module docstring."""
+
+    VERSION_KEY = "search:version:%s"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, Tuple[int, InvertedIndex]] = {}  # source -> (version, index)
+        self.builds = 0
+        self.updates = 0
+        self.searches = 0
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, "SEARCH_CACHE_ALIAS", "default")]
+
+    def version(self, source: str) -> int:
+        key = self.VERSION_KEY % source
+        version = self.backend.get(key)
+        if version is None:
+            # unique start value, as in core.catalog
+            self.backend.add(key, time.time_ns(), timeout=None)
+            version = self.backend.get(key)
+        return version
+
+    def index(self, source: str, using: Optional[str] = None) -> InvertedIndex:
+        """The current index of `source`, rebuilt when another process changed it."""
+        version = self.version(source)
+        with self._lock:
+            entry = self._indexes.get(source)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        spec = SOURCES[source]
+        index = InvertedIndex()
+        rows = spec.model._default_manager.using(dbrouter.rebuild_alias(using)).values_list(
+            "pk", *spec.fields
+        )
+        for pk, *values in rows.iterator(chunk_size=2000):
+            index.add(pk, document_text(values))
+        with self._lock:
+            self._indexes[source] = (version, index)
+            self.builds += 1
+        return index
+
+    def top(self, source: str, terms: List[str], limit: Optional[int], using: Optional[str] = None):
+        """Best `limit` (pk, score) pairs of `source` for the query tokens (all with None)."""
+        if not terms:
+            return []
+        index = self.index(source, using)
+        # changed() updates the index in place under the same lock
+        with self._lock:
+            self.searches += 1
+            return index.top(terms, limit)
+
+    def changed(self, source: str, instance: Model, deleted: bool = False) -> None:
+        """Apply a committed save or delete of `instance` to the local index."""
+        key = self.VERSION_KEY % source
+        try:
+            version = self.backend.incr(key)
+        except ValueError:
+            self.backend.add(key, time.time_ns(), timeout=None)
+            version = None
+        with self._lock:
+            entry = self._indexes.get(source)
+            if entry is None:
+                return
+            if version is None or entry[0] != version - 1:
+                # another process changed the source too: rebuild on next use
+                del self._indexes[source]
+                return
+            index = entry[1]
+            if deleted:
+                index.remove(instance.pk)
+            else:
+                spec = SOURCES[source]
+                index.add(instance.pk, document_text(getattr(instance, f) for f in spec.fields))
+            self._indexes[source] = (version, index)
+            self.updates += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "builds": self.builds,
+                "updates": self.updates,
+                "searches": self.searches,
+                **{f"{name}_documents": len(index) for name, (_, index) in self._indexes.items()},
+            }
+
+
+local = LocalSearch()
+
+
+def source_for(model: type[Model]) -> Optional[str]:
+    for name, spec in SOURCES.items():
+        if spec.model is model:
+            return name
+    return None
+
+
+def _fulltext(spec: Source, text: str, queryset: QuerySet) -> QuerySet:
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(spec.model._meta.db_table)
+    columns = ", ".join(
+        f"{table}.{connection.ops.quote_name(spec.model._meta.get_field(name).column)}"
+        for name in spec.fields
+    )
+    match = RawSQL(f"MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)", [text])
+    return (
+        queryset.annotate(search_score=match)
+        .filter(search_score__gt=0)
+        .order_by("-search_score", "-pk")
+    )
+
+
+def _local(source: str, text: str, queryset: QuerySet) -> QuerySet:
+    terms = query_terms(text)
+    limit = max_results()
+    # every candidate the postings bound lets through, best first
+    ranked = local.top(source, terms, None, queryset.db)
+
+    # keep the best candidates that pass the queryset's own filters: a
+    # candidate not checked yet ranks below every one that passed
+    scores: Dict[object, float] = {}
+    start, size = 0, limit * 2
+    while start < len(ranked) and len(scores) < limit:
+        batch = dict(ranked[start:start + size])
+        for pk in queryset.filter(pk__in=list(batch)).values_list("pk", flat=True):
+            scores[pk] = batch[pk]
+        start += size
+        size = min(size * 4, FILTER_BATCH_MAX)
+    best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+    if not best:
+        return queryset.none().annotate(search_score=Value(0.0, output_field=FloatField()))
+    score = Case(
+        *(When(pk=pk, then=Value(value)) for pk, value in best),
+        output_field=FloatField(),
+    )
+    return (
+        queryset.filter(pk__in=[pk for pk, _ in best])
+        .annotate(search_score=score)
+        .order_by("-search_score", "-pk")
+    )
+
+
+def search(source: str, text: str, queryset: Optional[QuerySet] = None) -> QuerySet:
+    """Rows of `queryset` (default: all rows of the source) matching `text`, best first."""
+    spec = SOURCES[source]
+    if queryset is None:
+        queryset = spec.model._default_manager.all()
+    if connections[queryset.db].vendor == "mysql":
+        return _fulltext(spec, text, queryset)
+    return _local(source, text, queryset)
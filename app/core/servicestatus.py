@@ -0,0 +1,212 @@
+"""
+Service status scheduler: SERVIZIO.status is OCCUPATO while one of the
+service's bookings is running and DISPONIBILE once none is.
+
+Overview
+- StatusScheduler keeps a min-heap of (when, service id) transitions: the
+  data_inizio and data_fine of every DETTAGLIO_PRENOTAZIONE row that has not
+  ended. run_due() pops the transitions that are due and re-evaluates only
+  those services, with two UPDATEs restricted to them: OCCUPATO for the
+  ones with a running booking (data_inizio <= now < data_fine), DISPONIBILE
+  for the other OCCUPATO ones. Services in MANUTENZIONE are left alone.
+- New bookings are picked up incrementally: poll() reads the details of the
+  bookings above the highest ID_prenotazione seen so far (a range scan of
+  the primary key) and pushes their transitions.
+- sync() reconciles every service once and rebuilds the heap from the
+  bookings that have not ended: at startup, then every
+  SERVICE_STATUS_RESYNC_SECONDS as a safety net for changes polling cannot
+  see (dates edited in the admin, rows written with raw SQL).
+- `manage.py service_status_scheduler` runs the loop, sleeping until the
+  next transition or poll. It replaces the hourly MySQL EVENT
+  evt_aggiorna_stato_servizi, which scanned every service and left statuses
+  up to an hour stale.
+
+Settings
+- SERVICE_STATUS_POLL_SECONDS: seconds between polls for new bookings
+  (default 30), i.e. the longest delay before a booking that is already
+  running when it is made shows as OCCUPATO.
+- SERVICE_STATUS_RESYNC_SECONDS: seconds between full reconciliations
+  (default 86400; None only reconciles at startup).
+
+Notes
+- Run one scheduler per database. Each run_due() and poll() is one
+  transaction on the primary, so it never reads a lagging replica (see
+  core.dbrouter); the catalog cache version is bumped when a status changed.
+- OCCUPATO belongs to the scheduler: the admin actions (core.bulk) only set
+  DISPONIBILE and MANUTENZIONE, since a service set OCCUPATO by hand would
+  be released at its next transition.
+- A deleted booking keeps its transitions in the heap: re-evaluating the
+  service then finds nothing running, so it is released at the latest when
+  the deleted booking would have ended.
+- Booking ids are allocated before their transaction commits, so a booking
+  may become visible after a higher one. poll() re-reads the last
+  LOOKBACK_BOOKINGS ids and skips the details it already has.
+"""
+
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import catalog
+from .models import Booking, BookingDetail, Service
+
+OCCUPIED = "OCCUPATO"
+AVAILABLE = "DISPONIBILE"
+MAINTENANCE = "MANUTENZIONE"
+
+# booking ids re-read by every poll, for bookings committed out of id order
+LOOKBACK_BOOKINGS = 100
+
+
+def poll_seconds() -> float:
+    return getattr(settings, "SERVICE_STATUS_POLL_SECONDS", 30)
+
+
+def resync_seconds() -> Optional[float]:
+    return getattr(settings, "SERVICE_STATUS_RESYNC_SECONDS", 86400)
+
+
+def apply_statuses(service_ids: Iterable[int], now: datetime) -> Tuple[int, int]:
+    """
+    Set the status of `service_ids` from their bookings at `now`.
+
+    Returns (services set OCCUPATO, services set DISPONIBILE).
+    """
+    service_ids = set(service_ids)
+    running = set(
+        BookingDetail.objects.filter(
+            service_id__in=service_ids, start_date__lte=now, end_date__gt=now
+        ).values_list("service_id", flat=True)
+    )
+    occupied = (
+        Service.objects.filter(id__in=running)
+        .exclude(status__in=(OCCUPIED, MAINTENANCE))
+        .update(status=OCCUPIED)
+    )
+    released = (
+        Service.objects.filter(id__in=service_ids - running, status=OCCUPIED)
+        .update(status=AVAILABLE)
+    )
+    if occupied or released:
+        transaction.on_commit(catalog.cache.bump)
+    return occupied, released
+
+
+class StatusScheduler:
+    """Min-heap of booking start/end transitions; see the module docstring."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[datetime, int]] = []
+        self._seen: Set[Tuple[int, int]] = set()  # (booking, service) above the lookback floor
+        self.watermark = 0  # highest booking id read
+        self.synced_at: Optional[datetime] = None
+        self.transitions = 0
+        self.occupied = 0
+        self.released = 0
+        self.polls = 0
+        self.syncs = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _push(self, booking_id: int, service_id: int, start: datetime, end: datetime, now: datetime) -> None:
+        self._seen.add((booking_id, service_id))
+        if end <= now:
+            return
+        # a start already past is due at once (a booking read after it began)
+        heapq.heappush(self._heap, (start, service_id))
+        heapq.heappush(self._heap, (end, service_id))
+
+    def next_due(self) -> Optional[datetime]:
+        """Time of the earliest pending transition, or None."""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def sync(self, now: Optional[datetime] = None) -> Tuple[int, int]:
+        """Reconcile every service and rebuild the heap; returns apply_statuses()."""
+        now = now or timezone.now()
+        with transaction.atomic():
+            watermark = Booking.objects.aggregate(top=Max("id"))["top"] or 0
+            rows = BookingDetail.objects.filter(end_date__gt=now).values_list(
+                "booking_id", "service_id", "start_date", "end_date"
+            )
+            with self._lock:
+                self._heap, self._seen = [], set()
+                for row in rows.iterator(chunk_size=2000):
+                    self._push(*row, now)
+                self.watermark = watermark
+                self._prune()
+            stale = Service.objects.filter(status=OCCUPIED).values_list("id", flat=True)
+            running = BookingDetail.objects.filter(start_date__lte=now, end_date__gt=now)
+            changed = apply_statuses(set(stale) | set(running.values_list("service_id", flat=True)), now)
+        self.synced_at = now
+        self.syncs += 1
+        self.occupied += changed[0]
+        self.released += changed[1]
+        return changed
+
+    def _prune(self) -> None:
+        floor = self.watermark - LOOKBACK_BOOKINGS
+        self._seen = {key for key in self._seen if key[0] > floor}
+
+    def poll(self, now: Optional[datetime] = None) -> int:
+        """Push the transitions of the bookings made since the last poll; returns how many details."""
+        now = now or timezone.now()
+        with transaction.atomic():
+            rows = list(
+                BookingDetail.objects.filter(booking_id__gt=self.watermark - LOOKBACK_BOOKINGS)
+                .values_list("booking_id", "service_id", "start_date", "end_date")
+            )
+        added = 0
+        with self._lock:
+            for row in rows:
+                if (row[0], row[1]) in self._seen:
+                    continue
+                self._push(*row, now)
+                self.watermark = max(self.watermark, row[0])
+                added += 1
+            self._prune()
+            self.polls += 1
+        return added
+
+    def run_due(self, now: Optional[datetime] = None) -> Tuple[int, int]:
+        """Apply the transitions due at `now`; returns (set OCCUPATO, set DISPONIBILE)."""
+        now = now or timezone.now()
+        with self._lock:
+            due: List[Tuple[datetime, int]] = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+        if not due:
+            return 0, 0
+        try:
+            with transaction.atomic():
+                changed = apply_statuses({service_id for _, service_id in due}, now)
+        except BaseException:
+            with self._lock:  # retried on the next run
+                for entry in due:
+                    heapq.heappush(self._heap, entry)
+            raise
+        self.transitions += len(due)
+        self.occupied += changed[0]
+        self.released += changed[1]
+        return changed
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "pending": len(self._heap),
+                "next_due": self._heap[0][0] if self._heap else None,
+                "watermark": self.watermark,
+                "transitions": self.transitions,
+                "occupied": self.occupied,
+                "released": self.released,
+                "polls": self.polls,
+                "syncs": self.syncs,
+            }
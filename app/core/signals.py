@@ -0,0 +1,105 @@
+"""
+Signal handlers for the 'core' app.
+
+Registered from StaffConfig.ready(). Handlers must stay cheap: they run
+inside the request that saved or deleted the row.
+
+- BookingDetail post_save and Booking post_delete keep the availability
+  index in sync once the surrounding transaction commits. Deletions are
+  tracked on Booking because BookingDetail has a composite key: a receiver
+  on it would disable Django's fast-delete path, which cpkmodel relies on.
+- Service and subtype post_save/post_delete bump the catalog cache version.
+- Review, Event and AnimalActivity saves/deletes update the local full-text
+  index of core.search once committed.
+- Logout, Django user saves/deletes and DIPENDENTE changes drop the entry of
+  the affected user from core.usercache.
+- Successful, failed and throttled logins are counted in core.metrics.
+"""
+
+from django.contrib.auth.models import User as DjangoUser
+from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog, metrics, search, throttle, usercache
+from .availability import engine
+from .models import (
+    AnimalActivity,
+    Booking,
+    BookingDetail,
+    Employee,
+    Playground,
+    Pool,
+    Restaurant,
+    Room,
+    Service,
+)
+
+CATALOG_MODELS = (Service, Room, Pool, AnimalActivity, Playground, Restaurant)
+
+
+@receiver(post_save, sender=BookingDetail)
+def booking_detail_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: engine.add_detail(instance))
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    booking_id = instance.pk
+    transaction.on_commit(lambda: engine.remove_booking(booking_id))
+
+
+def catalog_changed(sender, **kwargs):
+    transaction.on_commit(catalog.cache.bump)
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model)
+    post_delete.connect(catalog_changed, sender=model)
+
+
+def search_document_saved(sender, instance, **kwargs):
+    source = search.source_for(sender)
+    transaction.on_commit(lambda: search.local.changed(source, instance))
+
+
+def search_document_deleted(sender, instance, **kwargs):
+    source = search.source_for(sender)
+    transaction.on_commit(lambda: search.local.changed(source, instance, deleted=True))
+
+
+for spec in search.SOURCES.values():
+    post_save.connect(search_document_saved, sender=spec.model)
+    post_delete.connect(search_document_deleted, sender=spec.model)
+
+
+@receiver(user_logged_out)
+def user_logged_out_handler(sender, user, **kwargs):
+    if user is not None:
+        usercache.cache.invalidate(user.pk)
+
+
+@receiver(user_logged_in)
+def user_logged_in_handler(sender, request, user, **kwargs):
+    metrics.LOGINS.inc(result="success")
+
+
+@receiver(user_login_failed)
+def user_login_failed_handler(sender, credentials, request=None, **kwargs):
+    throttled = isinstance(getattr(request, "_login_throttle", None), throttle.Throttled)
+    metrics.LOGINS.inc(result="throttled" if throttled else "failed")
+
+
+@receiver(post_save, sender=DjangoUser)
+@receiver(post_delete, sender=DjangoUser)
+def django_user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: usercache.cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def employee_changed(sender, instance, **kwargs):
+    username = instance.username_id
+    transaction.on_commit(lambda: usercache.cache.invalidate_username(username))
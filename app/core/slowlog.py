@@ -0,0 +1,219 @@
+"""
+Opt-in capture of slow SQL statements.
+
+Overview
+- With settings.SLOW_QUERY_MS set, every database connection gets an
+  execute wrapper (installed when the connection is opened) that times each
+  statement. Statements slower than the threshold are written as one JSON
+  line to a rotating log file with:
+    - duration, database alias and time of capture;
+    - the fingerprint and normalized SQL (core.querystats), so repeated
+      shapes aggregate whatever their parameters;
+    - the URL name of the request that ran it (e.g. "profile",
+      "admin:core_booking_changelist"), "-" outside requests;
+    - the innermost stack frame in the core package (file:line function),
+      i.e. the line of app code that built the query;
+    - the SQL text and, for SELECTs, the parameters, so the report command
+      can EXPLAIN a representative instance.
+- `python manage.py slow_queries` aggregates the log (rotated files
+  included) into a top-N report by total time or count.
+
+Settings
+- SLOW_QUERY_MS: threshold in milliseconds (default None: disabled).
+- SLOW_QUERY_LOG: log file path (default BASE_DIR/logs/slow-queries.log).
+- SLOW_QUERY_LOG_MAX_BYTES / SLOW_QUERY_LOG_BACKUPS: rotation (10 MB, 5).
+
+Notes
+- Fast statements cost one perf_counter() pair; the stack walk and the log
+  write happen only for slow ones.
+- The wrapper is the outermost one of its connection and stays installed
+  while the connection object lives; the per-request wrappers of
+  core.querystats and core.profiling come and go inside it.
+- SlowQueryMiddleware publishes the URL name through a context variable,
+  which also reaches the sync_to_async threads of async views.
+- SELECT parameters may contain personal data (usernames, e-mails): keep
+  the log readable by the operators only.
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .querystats import fingerprint, normalize
+
+current_view: contextvars.ContextVar = contextvars.ContextVar("slowlog_view", default="-")
+
+CORE_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+# instrumentation modules are never the caller of interest
+SKIPPED_FILES = {os.path.join(CORE_DIR, name) for name in ("slowlog.py", "querystats.py", "metrics.py")}
+MAX_PARAM_LENGTH = 200
+
+_logger_lock = threading.Lock()
+_logger: Optional[logging.Logger] = None
+
+
+def threshold() -> Optional[float]:
+    """Threshold in seconds, or None when the capture is disabled."""
+    ms = getattr(settings, "SLOW_QUERY_MS", None)
+    return None if ms is None else ms / 1000
+
+
+def log_path() -> Path:
+    return Path(getattr(settings, "SLOW_QUERY_LOG", settings.BASE_DIR / "logs" / "slow-queries.log"))
+
+
+def get_logger() -> logging.Logger:
+    """Logger writing bare JSON lines to the rotating slow-query log."""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            path = log_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=getattr(settings, "SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024),
+                backupCount=getattr(settings, "SLOW_QUERY_LOG_BACKUPS", 5),
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("core.slowlog.file")
+            logger.handlers = [handler]
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            _logger = logger
+        return _logger
+
+
+def reset_logger() -> None:
+    """Close the log file, e.g. after SLOW_QUERY_LOG changed (tests)."""
+    global _logger
+    with _logger_lock:
+        if _logger is not None:
+            for handler in _logger.handlers:
+                handler.close()
+            _logger.handlers = []
+            _logger = None
+
+
+def core_frame() -> str:
+    """'core/views.py:262 in profile_view' for the innermost app frame."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(CORE_DIR) and filename not in SKIPPED_FILES:
+            relative = "core/" + filename[len(CORE_DIR):].replace(os.sep, "/")
+            return f"{relative}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "-"
+
+
+def _param(value):
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    text = str(value)
+    return text if len(text) <= MAX_PARAM_LENGTH else text[:MAX_PARAM_LENGTH] + "…"
+
+
+class SlowQueryCapture:
+    """Execute wrapper of one connection; see the module docstring."""
+
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        limit = threshold()
+        if limit is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed >= limit:
+                self.record(sql, params, many, elapsed)
+
+    def record(self, sql: str, params, many: bool, elapsed: float) -> None:
+        entry = {
+            "ts": round(time.time(), 3),
+            "ms": round(elapsed * 1000, 3),
+            "db": self.alias,
+            "fingerprint": fingerprint(sql),
+            "normalized": normalize(sql),
+            "view": current_view.get(),
+            "frame": core_frame(),
+            "sql": sql,
+        }
+        if not many and params is not None and sql.lstrip()[:6].upper() == "SELECT":
+            entry["params"] = [_param(value) for value in params]
+        get_logger().info(json.dumps(entry, default=str))
+
+
+def install(sender, connection, **kwargs) -> None:
+    """connection_created receiver: wrap new connections while capture is on."""
+    if threshold() is None:
+        return
+    if not any(isinstance(w, SlowQueryCapture) for w in connection.execute_wrappers):
+        # at the bottom of the stack: the connection usually opens inside an
+        # execute_wrapper() block (core.querystats), which pops the top
+        # wrapper on exit, whatever it is
+        connection.execute_wrappers.insert(0, SlowQueryCapture(connection.alias))
+
+
+def read_entries(path: Optional[Path] = None) -> Iterator[Dict]:
+    """Entries of the log and of its rotated files, oldest file first."""
+    path = Path(path or log_path())
+    backups = sorted(
+        path.parent.glob(path.name + ".*"),
+        key=lambda p: int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0,
+        reverse=True,
+    )
+    for file in [*backups, path]:
+        if not file.exists():
+            continue
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn line of a crashed writer
+
+
+class SlowQueryMiddleware:
+    """Expose the URL name of the current request to the capture wrapper."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_view.set("-")
+        try:
+            return self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    async def __acall__(self, request):
+        token = current_view.set("-")
+        try:
+            return await self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(request.resolver_match.view_name)
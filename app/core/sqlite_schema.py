@@ -0,0 +1,181 @@
+"""
+SQLite port of the MySQL schema (sql/db.sql).
+
+Overview
+- The core models are unmanaged (managed = False): their tables, the
+  V_SERVIZI_DISPONIBILI view and the integrity triggers live in sql/db.sql,
+  which only runs on MySQL. sql/sqlite.sql is the same schema translated to
+  SQLite, so the test suite and the benchmark commands can run against an
+  in-memory database without a MySQL server.
+- build() executes sql/sqlite.sql on a SQLite connection. With the
+  config.settings_sqlite profile (SQLITE_SCHEMA = True) every new SQLite
+  connection that does not have the schema yet gets it, which covers the
+  test database Django creates in memory.
+
+Keeping the port in sync
+- diff() parses db.sql and compares it with a scratch database built from
+  sqlite.sql: tables and their columns (name, NOT NULL), views, indexes and
+  triggers (timing, event, table). Names are compared case-insensitively,
+  as MySQL on case-insensitive file systems and SQLite both do.
+- `python manage.py sqlite_schema --check` fails on any difference; run it
+  after changing db.sql.
+
+Notes
+- db.sql has no EVENT left to port: service statuses are kept by the
+  service_status_scheduler command (core.servicestatus) on both databases.
+- The FULLTEXT indexes are not ported (nor compared): on SQLite core.search
+  uses its in-process inverted index.
+- SIGNAL SQLSTATE '45000' becomes RAISE(ABORT, ...), which Django reports as
+  IntegrityError; MySQL reports the signal as OperationalError. Code catching
+  DatabaseError handles both.
+"""
+
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+
+from django.conf import settings
+
+SQL_DIR = Path(__file__).resolve().parent.parent / "sql"
+MYSQL_SCHEMA = SQL_DIR / "db.sql"
+SQLITE_SCHEMA = SQL_DIR / "sqlite.sql"
+
+# any table of the schema; its presence means the schema has been built
+MARKER_TABLE = "PERSONA"
+
+TABLE_RE = re.compile(r"CREATE\s+TABLE\s+(\w+)\s*\((.*?)\)\s*;", re.I | re.S)
+VIEW_RE = re.compile(r"CREATE\s+VIEW\s+(\w+)", re.I)
+INDEX_RE = re.compile(r"CREATE\s+INDEX\s+(\w+)\s+ON\s+(\w+)\s*\(([^)]*)\)", re.I)
+TRIGGER_RE = re.compile(
+    r"CREATE\s+TRIGGER\s+(\w+)\s+(BEFORE|AFTER)\s+(INSERT|UPDATE|DELETE)\s+ON\s+(\w+)", re.I
+)
+TABLE_CONSTRAINTS = ("CONSTRAINT", "PRIMARY", "UNIQUE", "FOREIGN", "CHECK", "KEY", "INDEX")
+
+Schema = Dict[str, Dict[str, object]]
+
+
+def build(dbapi_connection) -> None:
+    """Create tables, view, indexes and triggers on a sqlite3 connection."""
+    dbapi_connection.executescript(SQLITE_SCHEMA.read_text(encoding="utf-8"))
+
+
+def ensure_schema(sender, connection, **kwargs) -> None:
+    """connection_created receiver: build the schema on new SQLite databases."""
+    if connection.vendor != "sqlite" or not getattr(settings, "SQLITE_SCHEMA", False):
+        return
+    raw = connection.connection
+    found = raw.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE",
+        (MARKER_TABLE,),
+    ).fetchone()
+    if not found:
+        build(raw)
+
+
+def _strip_comments(sql: str) -> str:
+    return re.sub(r"--[^\n]*", "", sql)
+
+
+def _split_top_level(body: str) -> List[str]:
+    """Split a CREATE TABLE body on the commas outside parentheses."""
+    parts, depth, current = [], 0, []
+    for char in body:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _columns(body: str) -> Dict[str, bool]:
+    """{column: NOT NULL} of a CREATE TABLE body."""
+    columns = {}
+    for definition in _split_top_level(body):
+        name = definition.split()[0]
+        if name.upper() in TABLE_CONSTRAINTS:
+            continue
+        columns[name.lower()] = bool(re.search(r"\bNOT\s+NULL\b", definition, re.I))
+    return columns
+
+
+def parse(sql: str) -> Schema:
+    """Schema objects declared in a DDL script (either dialect)."""
+    sql = _strip_comments(sql)
+    return {
+        "tables": {name.lower(): _columns(body) for name, body in TABLE_RE.findall(sql)},
+        "views": {name.lower(): True for name in VIEW_RE.findall(sql)},
+        "indexes": {
+            name.lower(): (table.lower(), tuple(c.strip().lower() for c in cols.split(",")))
+            for name, table, cols in INDEX_RE.findall(sql)
+        },
+        "triggers": {
+            name.lower(): (timing.upper(), event.upper(), table.lower())
+            for name, timing, event, table in TRIGGER_RE.findall(sql)
+        },
+    }
+
+
+def introspect(dbapi_connection) -> Schema:
+    """The same structure as parse(), read back from a built SQLite database."""
+    schema: Schema = {"tables": {}, "views": {}, "indexes": {}, "triggers": {}}
+    rows = dbapi_connection.execute(
+        "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL"
+    ).fetchall()
+    for kind, name, table, sql in rows:
+        if kind == "table" and name != "sqlite_sequence":
+            info = dbapi_connection.execute(f'PRAGMA table_info("{name}")').fetchall()
+            schema["tables"][name.lower()] = {col[1].lower(): bool(col[3]) for col in info}
+        elif kind == "view":
+            schema["views"][name.lower()] = True
+        elif kind == "index":
+            info = dbapi_connection.execute(f'PRAGMA index_info("{name}")').fetchall()
+            schema["indexes"][name.lower()] = (table.lower(), tuple(col[2].lower() for col in info))
+        elif kind == "trigger":
+            _, timing, event, on = TRIGGER_RE.search(sql).groups()
+            schema["triggers"][name.lower()] = (timing.upper(), event.upper(), on.lower())
+    return schema
+
+
+def diff() -> List[str]:
+    """Differences between db.sql and the SQLite port; empty when in sync."""
+    expected = parse(MYSQL_SCHEMA.read_text(encoding="utf-8"))
+    scratch = sqlite3.connect(":memory:")
+    try:
+        build(scratch)
+        actual = introspect(scratch)
+    finally:
+        scratch.close()
+
+    problems = []
+    for kind in ("tables", "views", "indexes", "triggers"):
+        wanted, got = expected[kind], actual[kind]
+        for name in sorted(wanted.keys() - got.keys()):
+            problems.append(f"{kind[:-1]} {name}: missing in sqlite.sql")
+        for name in sorted(got.keys() - wanted.keys()):
+            problems.append(f"{kind[:-1]} {name}: not in db.sql")
+        for name in sorted(wanted.keys() & got.keys()):
+            if kind == "tables":
+                problems.extend(_column_diff(name, wanted[name], got[name]))
+            elif wanted[name] != got[name]:
+                problems.append(f"{kind[:-1]} {name}: {got[name]} in sqlite.sql, {wanted[name]} in db.sql")
+    return problems
+
+
+def _column_diff(table: str, wanted: Dict[str, bool], got: Dict[str, bool]) -> List[str]:
+    problems = []
+    for column in sorted(wanted.keys() - got.keys()):
+        problems.append(f"table {table}: column {column} missing in sqlite.sql")
+    for column in sorted(got.keys() - wanted.keys()):
+        problems.append(f"table {table}: column {column} not in db.sql")
+    for column in sorted(wanted.keys() & got.keys()):
+        if wanted[column] != got[column]:
+            nullability = "NOT NULL" if wanted[column] else "NULL"
+            problems.append(f"table {table}: column {column} should be {nullability}")
+    return problems
@@ -1,3 +1,1672 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import os
+import pstats
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User as DjangoUser
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connection, connections, transaction
+from django.contrib.auth.signals import user_logged_out
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import resolve
+from django.utils import timezone
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import adminperf, availability, bulk, catalog, enrollment, exports, search, dbpool, dbrouter, metrics, profiling, querystats, servicestatus, slowlog, sqlite_schema, throttle, usercache
+from .backends import UserBackend
+from .management.commands.bench_asgi import build_urlconf
+from .models import (
+    AnimalActivity, Booking, BookingDetail, Employee, Enrolls, Event, Order, OrderDetail, Person,
+    Playground, Pool, Product, Restaurant, Review, Room, Service, User, Waitlist,
+)
+
+
+class UnmanagedModelsTestCase(TestCase):
+    """
+    TestCase that creates the tables of the listed unmanaged models.
+
+    The core models map an existing schema (managed = False), so the test
+    database does not contain them unless they are created here. Tables that
+    exist already (built from sql/sqlite.sql by config.settings_sqlite) are
+    used as they are, triggers included.
+    """
+
+    unmanaged_models = ()
+
+    @classmethod
+    def setUpClass(cls):
+        existing = {name.lower() for name in connection.introspection.table_names()}
+        cls._created_models = [
+            model for model in cls.unmanaged_models if model._meta.db_table.lower() not in existing
+        ]
+        with connection.schema_editor() as editor:
+            for model in cls._created_models:
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in reversed(cls._created_models):
+                editor.delete_model(model)
+
+
+class IntervalIndexTests(SimpleTestCase):
+    t0 = datetime(2030, 7, 10, 10)
+
+    def test_intervals_are_half_open(self):
+        index = availability.IntervalIndex()
+        index.add(1, self.t0, self.t0 + timedelta(hours=2))
+        self.assertTrue(index.is_free(self.t0 + timedelta(hours=2), self.t0 + timedelta(hours=3)))
+        self.assertTrue(index.is_free(self.t0 - timedelta(hours=1), self.t0))
+        self.assertFalse(index.is_free(self.t0 + timedelta(hours=1, minutes=59), self.t0 + timedelta(hours=3)))
+        self.assertFalse(index.is_free(self.t0 - timedelta(hours=1), self.t0 + timedelta(minutes=1)))
+
+    def test_max_span_window_finds_long_bookings(self):
+        index = availability.IntervalIndex()
+        index.add(1, self.t0, self.t0 + timedelta(days=3))  # a long stay, starting well before
+        for day in range(1, 20):
+            index.add(day + 1, self.t0 + timedelta(days=day, hours=1), self.t0 + timedelta(days=day, hours=2))
+        self.assertEqual(index.max_span, timedelta(days=3))
+        self.assertEqual(
+            index.overlapping(self.t0 + timedelta(days=2), self.t0 + timedelta(days=2, minutes=30)),
+            [(self.t0, self.t0 + timedelta(days=3))],
+        )
+        self.assertTrue(index.is_free(self.t0 + timedelta(days=3), self.t0 + timedelta(days=3, hours=1)))
+
+    def test_remove_booking(self):
+        engine = availability.AvailabilityEngine()
+        engine._built_at = time.monotonic()  # skip the database build
+        engine._add(1, 7, self.t0, self.t0 + timedelta(hours=2))
+        engine._add(1, 8, self.t0, self.t0 + timedelta(hours=2))
+        engine._add(2, 7, self.t0 + timedelta(hours=4), self.t0 + timedelta(hours=5))
+        self.assertFalse(engine.is_free(7, self.t0, self.t0 + timedelta(hours=1)))
+        engine.remove_booking(1)
+        self.assertTrue(engine.is_free(7, self.t0, self.t0 + timedelta(hours=1)))
+        self.assertTrue(engine.is_free(8, self.t0, self.t0 + timedelta(hours=1)))
+        self.assertFalse(engine.is_free(7, self.t0 + timedelta(hours=4), self.t0 + timedelta(hours=6)))
+
+    @override_settings(USE_TZ=False)
+    def test_date_only_input_covers_the_whole_day(self):
+        day = date(2030, 7, 10)
+        self.assertEqual(availability.normalize(day, day), (datetime(2030, 7, 10), datetime(2030, 7, 11)))
+        self.assertEqual(
+            availability.normalize(self.t0, self.t0 + timedelta(hours=1)),
+            (self.t0, self.t0 + timedelta(hours=1)),
+        )
+
+
+@skipUnless(getattr(settings, "SQLITE_SCHEMA", False), "DETTAGLIO_PRENOTAZIONE has a composite key")
+class BookingOverlapTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Service, Booking)
+
+    @classmethod
+    def setUpTestData(cls):
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password="-", email="mario@example.com")
+        cls.service = Service.objects.create(price=5, type="PISCINA")
+        cls.user = DjangoUser.objects.create(username="mrossi")
+
+    def setUp(self):
+        usercache.cache.clear()
+        availability.engine.invalidate()
+        self.addCleanup(availability.engine.invalidate)
+        self.client.force_login(self.user)
+
+    def book(self, start_time, end_time):
+        return self.client.post("/services/book/", {
+            "service_type": "PISCINA", "instance": self.service.pk,
+            "start_date": "2030-07-10", "start_time": start_time, "end_time": end_time,
+        })
+
+    def test_database_check_catches_bookings_the_index_missed(self):
+        self.assertTrue(availability.is_free(self.service, datetime(2030, 7, 10), datetime(2030, 7, 11)))
+        # written by another worker: no signal reaches this process's index
+        booking = Booking.objects.create(username_id="mrossi", booking_date=timezone.now())
+        start = availability.normalize(datetime(2030, 7, 10, 10), datetime(2030, 7, 10, 12))
+        BookingDetail.objects.bulk_create([BookingDetail(booking=booking, service=self.service, start_date=start[0], end_date=start[1])])
+        self.assertTrue(availability.is_free(self.service, *start))
+
+        self.book("11:00", "12:00")
+        self.assertEqual(BookingDetail.objects.count(), 1)
+        messages_ = [str(m) for m in self.client.get("/").context["messages"]]
+        self.assertIn("The selected service is already booked for that period.", messages_)
+
+        self.book("12:00", "13:00")  # adjacent: half-open intervals
+        self.assertEqual(BookingDetail.objects.count(), 2)
+
+    def test_date_only_rows_block_their_day(self):
+        booking = Booking.objects.create(username_id="mrossi", booking_date=timezone.now())
+        midnight = availability.normalize(date(2030, 7, 10), date(2030, 7, 10))[0]
+        BookingDetail.objects.bulk_create([BookingDetail(booking=booking, service=self.service, start_date=midnight, end_date=midnight)])
+        self.assertTrue(availability.booked(self.service, midnight + timedelta(hours=9), midnight + timedelta(hours=10)).exists())
+        self.assertFalse(availability.booked(self.service, midnight + timedelta(days=1), midnight + timedelta(days=1, hours=1)).exists())
+
+
+class CatalogTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Service, Room, Pool, AnimalActivity, Playground, Restaurant)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(id=Service.objects.create(price=80, type="CAMERA"), room_code="C1", max_capacity=2)
+        cls.pools = [
+            Pool.objects.create(id=Service.objects.create(price=5, type="PISCINA"), sunbed_code=f"L{i}")
+            for i in range(2)
+        ]
+        cls.activity = AnimalActivity.objects.create(
+            id=Service.objects.create(price=15, type="ATTIVITA_CON_ANIMALI"), activity_code="A1", description="Pony"
+        )
+        Pool.objects.create(id=Service.objects.create(price=5, type="PISCINA", status="MANUTENZIONE"), sunbed_code="L9")
+        Service.objects.create(price=1, type="PISCINA")  # no subtype row: skipped
+
+    def test_load_catalog_is_one_query(self):
+        with self.assertNumQueries(1):
+            grouped = catalog.load_catalog()
+            prices = {s_type: [instance.id.price for instance in instances] for s_type, instances in grouped.items()}
+        self.assertEqual(list(grouped), ["ATTIVITA_CON_ANIMALI", "CAMERA", "PISCINA"])
+        self.assertEqual(grouped["PISCINA"], self.pools)
+        self.assertEqual(prices["CAMERA"], [self.room.id.price])
+        with self.assertNumQueries(1):
+            self.assertEqual(catalog.load_catalog("pool"), {"PISCINA": self.pools})
+
+
+class CatalogCacheTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Service, Room, Pool, AnimalActivity, Playground, Restaurant)
+
+    @classmethod
+    def setUpTestData(cls):
+        Pool.objects.create(id=Service.objects.create(price=5, type="PISCINA"), sunbed_code="L1")
+
+    def setUp(self):
+        cache.clear()
+        catalog.cache.bump()
+
+    def test_hits_and_misses(self):
+        worker, other_worker = catalog.CatalogCache(), catalog.CatalogCache()
+        with self.assertNumQueries(1):
+            payload = worker.get()
+        with self.assertNumQueries(0):
+            self.assertIs(worker.get(), payload)  # local copy
+            self.assertEqual(other_worker.get(), payload)  # shared cache
+        self.assertEqual(worker.stats(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+        self.assertEqual(other_worker.stats()["hits"], 1)
+
+    def test_signals_bump_the_version(self):
+        payload = catalog.cache.get()
+        version = catalog.cache.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.create(price=5, type="PISCINA")
+            Pool.objects.create(id=service, sunbed_code="L2")
+        self.assertGreater(catalog.cache.version(), version)
+        self.assertEqual(len(catalog.cache.get()["catalog"]["PISCINA"]), 2)
+        self.assertEqual(len(payload["catalog"]["PISCINA"]), 1)
+
+        version = catalog.cache.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Pool.objects.get(id=service).delete()
+        self.assertGreater(catalog.cache.version(), version)
+        self.assertEqual(len(catalog.cache.get()["catalog"]["PISCINA"]), 1)
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=0.05)
+    def test_local_copy_expires(self):
+        worker = catalog.CatalogCache()
+        worker.get()
+        with self.assertNumQueries(0):
+            worker.get()
+        time.sleep(0.1)
+        with self.assertNumQueries(1):
+            worker.get()
+        self.assertEqual(worker.stats()["misses"], 2)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    LOGIN_THROTTLE_RATES={},
+)
+class UserBackendTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee)
+
+    # Per-login query budget for the repeat-login path (user already synced).
+    MAX_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.hashers import make_password
+
+        guest = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        staff = Person.objects.create(cf="MSTLNZ99F06J234V", name="Paolo", surname="Mast", phone="2")
+        User.objects.create(username="mrossi", cf=guest, password=make_password("secret"), email="mario@example.com")
+        User.objects.create(username="pmast", cf=staff, password=make_password("secret"), email="paolo@example.com")
+        Employee.objects.create(username_id="pmast", hire_date="2020-05-01")
+
+    def setUp(self):
+        self.backend = UserBackend()
+
+    def test_invalid_credentials(self):
+        self.assertIsNone(self.backend.authenticate(None, username="mrossi", password="wrong"))
+        self.assertIsNone(self.backend.authenticate(None, username="nobody", password="secret"))
+
+    def test_first_login_creates_local_user(self):
+        user = self.backend.authenticate(None, username="pmast", password="secret")
+        self.assertEqual(user.email, "paolo@example.com")
+        self.assertTrue(user.is_staff)
+        self.assertFalse(user.has_usable_password())
+
+    def test_repeat_login_is_write_free(self):
+        self.backend.authenticate(None, username="mrossi", password="secret")
+        with self.assertNumQueries(self.MAX_QUERIES):
+            user = self.backend.authenticate(None, username="mrossi", password="secret")
+        self.assertFalse(user.is_staff)
+
+    def test_changed_attributes_are_synced(self):
+        self.backend.authenticate(None, username="mrossi", password="secret")
+        User.objects.filter(username="mrossi").update(email="new@example.com")
+        user = self.backend.authenticate(None, username="mrossi", password="secret")
+        self.assertEqual(DjangoUser.objects.get(pk=user.pk).email, "new@example.com")
+
+    def test_repeat_login_hashes_once_and_writes_nothing(self):
+        from unittest import mock
+
+        self.backend.authenticate(None, username="pmast", password="secret")
+        with mock.patch("core.backends.check_password", wraps=check_password) as check:
+            with CaptureQueriesContext(connection) as queries:
+                user = self.backend.authenticate(None, username="pmast", password="secret")
+        self.assertTrue(user.is_staff)
+        check.assert_called_once()
+        writes = [q["sql"] for q in queries if not q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(writes, [])
+
+    async def test_async_authenticate_uses_hashing_pool(self):
+        from . import hashing
+
+        submitted = hashing.pool.stats()["submitted"]
+        self.assertIsNone(await self.backend.aauthenticate(None, username="mrossi", password="wrong"))
+        user = await self.backend.aauthenticate(None, username="mrossi", password="secret")
+        self.assertEqual(user.username, "mrossi")
+        self.assertEqual(hashing.pool.stats()["submitted"], submitted + 2)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class UserCacheTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee)
+
+    @classmethod
+    def setUpTestData(cls):
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password="!", email="mario@example.com")
+        cls.user = DjangoUser.objects.create(username="mrossi")
+
+    def setUp(self):
+        usercache.cache.clear()
+        self.backend = UserBackend()
+
+    def test_get_user_and_profile_hit_the_database_once(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+            profile = usercache.cache.profile(self.user)
+            self.assertEqual(profile.cf.name, "Mario")
+            self.assertFalse(hasattr(profile, "employee"))
+
+    def test_callers_get_copies(self):
+        self.backend.get_user(self.user.pk).first_name = "changed"
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, "")
+
+    def test_employee_change_invalidates(self):
+        usercache.cache.profile(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Employee.objects.create(username_id="mrossi", hire_date="2020-05-01")
+        self.assertTrue(hasattr(usercache.cache.profile(self.user), "employee"))
+
+    def test_logout_and_user_save_invalidate(self):
+        self.backend.get_user(self.user.pk)
+        user_logged_out.send(sender=DjangoUser, request=None, user=self.user)
+        self.assertEqual(usercache.cache.stats()["entries"], 0)
+
+        self.backend.get_user(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            DjangoUser.objects.filter(pk=self.user.pk).first().save()
+        self.assertEqual(usercache.cache.stats()["entries"], 0)
+
+    @override_settings(USER_CACHE_SIZE=1)
+    def test_lru_eviction(self):
+        other = DjangoUser.objects.create(username="local-admin")
+        self.backend.get_user(self.user.pk)
+        self.assertIsNone(usercache.cache.profile(other))
+        self.assertEqual(usercache.cache.stats()["entries"], 1)
+        self.assertEqual(usercache.cache.stats()["evictions"], 1)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    LOGIN_THROTTLE_RATES={"username": "3/min", "ip": "5/min", "global": None},
+)
+class LoginThrottleTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee)
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.hashers import make_password
+
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password=make_password("secret"), email="m@example.com")
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def attempt(self, username="mrossi", password="wrong", ip="10.0.0.1"):
+        from django.contrib.auth import authenticate
+
+        request = self.factory.post("/login/", REMOTE_ADDR=ip)
+        return authenticate(request, username=username, password=password)
+
+    def test_username_bucket_blocks_before_hashing(self):
+        from unittest import mock
+
+        for _ in range(3):
+            self.attempt()
+        rejected = throttle.limiter.stats()["rejected"].get("username", 0)
+        with mock.patch("core.backends.check_password") as check:
+            self.assertIsNone(self.attempt(password="secret", ip="10.0.0.2"))
+            check.assert_not_called()
+        self.assertEqual(throttle.limiter.stats()["rejected"]["username"], rejected + 1)
+
+    def test_ip_bucket_spans_usernames(self):
+        for i in range(5):
+            self.attempt(username=f"user{i}")
+        self.assertIsNone(self.attempt(password="secret"))
+        self.assertIsNotNone(self.attempt(password="secret", ip="10.0.0.9"))
+
+    def test_one_charge_per_request(self):
+        request = self.factory.post("/login/", REMOTE_ADDR="10.0.0.1")
+        for _ in range(3):
+            throttle.limiter.check(request, "mrossi")
+        self.assertIsNotNone(self.attempt(password="secret"))
+
+    def test_login_view_answers_429(self):
+        for _ in range(3):
+            self.client.post("/login/", {"username": "mrossi", "password": "wrong"})
+        response = self.client.post("/login/", {"username": "mrossi", "password": "secret"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    LOGIN_THROTTLE_RATES={},
+)
+class AsyncAuthViewsTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee)
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.hashers import make_password
+
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password=make_password("secret"), email="m@example.com")
+
+    def setUp(self):
+        usercache.cache.clear()
+        # core.urls picks the views when it is imported
+        with override_settings(ASYNC_AUTH_VIEWS=True):
+            urls = importlib.reload(importlib.import_module("core.urls"))
+        self.addCleanup(importlib.reload, urls)
+        self.enterContext(override_settings(ROOT_URLCONF=urls.__name__))
+
+    def test_routing(self):
+        from . import views
+
+        self.assertIs(resolve("/login/").func, views.alogin_view)
+        self.assertIs(resolve("/register/").func, views.aregister_view)
+
+    async def test_login(self):
+        response = await self.async_client.post("/login/?next=/profile/", {"username": "mrossi", "password": "secret"})
+        self.assertRedirects(response, "/profile/", fetch_redirect_response=False)
+        session = await self.async_client.asession()
+        self.assertEqual(await session.aget("_auth_user_backend"), "core.backends.UserBackend")
+
+    async def test_failed_login(self):
+        response = await self.async_client.post("/login/", {"username": "mrossi", "password": "wrong"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors)
+        session = await self.async_client.asession()
+        self.assertIsNone(await session.aget("_auth_user_id"))
+
+    async def test_register(self):
+        data = {
+            "tax_code": "vrdgpp80a01h501x", "name": "Giuseppe", "surname": "Verdi", "username": "gverdi",
+            "email": "g@example.com", "password1": "s3cret-pass", "password2": "s3cret-pass",
+        }
+        response = await self.async_client.post("/register/", data)
+        self.assertRedirects(response, "/login/", fetch_redirect_response=False)
+        user = await User.objects.select_related("cf").aget(username="gverdi")
+        self.assertEqual(user.cf.cf, "VRDGPP80A01H501X")
+        self.assertTrue(check_password("s3cret-pass", user.password))
+
+        response = await self.async_client.post("/register/", data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("username", response.context["form"].errors)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ImportUsersCommandTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User)
+
+    CSV = (
+        "tax_code,name,surname,phone,city,username,email,password\n"
+        "aaaaaaaaaaaaaaa1,Anna,Bianchi,,Roma,abianchi,anna@example.com,pw1\n"
+        "BBBBBBBBBBBBBBB2,Bruno,Verdi,333,,taken,bruno@example.com,pw2\n"
+        "RSSMRA80A01H501U,Carla,Neri,,,cneri,carla@example.com,pw3\n"
+        "SHORT,Dario,Gialli,,,dgialli,dario@example.com,pw4\n"
+        "DDDDDDDDDDDDDDD4,Elena,Blu,,,abianchi,elena@example.com,pw5\n"
+        "EEEEEEEEEEEEEEE5,Fabio,Rosa,,,frosa,fabio@example.com,pw6\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="taken", cf=person, password="!", email="taken@example.com")
+
+    def test_import(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as f:
+            f.write(self.CSV)
+            f.flush()
+            out, err = io.StringIO(), io.StringIO()
+            call_command("import_users", f.name, chunk_size=2, workers=0, stdout=out, stderr=err)
+
+        self.assertIn("read=6 created=2 existing=2 duplicate=1 invalid=1 failed=0", out.getvalue())
+        self.assertIn("line 5: invalid", err.getvalue())
+        user = User.objects.select_related("cf").get(username="abianchi")
+        self.assertEqual(user.cf.cf, "AAAAAAAAAAAAAAA1")
+        self.assertTrue(check_password("pw1", user.password))
+        self.assertTrue(User.objects.filter(username="frosa").exists())
+
+
+class SQLiteSchemaTests(SimpleTestCase):
+    """sql/sqlite.sql matches db.sql and its triggers behave like the MySQL ones."""
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        self.addCleanup(self.db.close)
+        sqlite_schema.build(self.db)
+        self.db.executescript("""
+            INSERT INTO PERSONA VALUES ('RSSMRA80A01H501U', 'Mario', 'Rossi', '1', NULL);
+            INSERT INTO UTENTE VALUES ('mrossi', 'RSSMRA80A01H501U', '!', 'mario@example.com');
+            INSERT INTO DIPENDENTE VALUES ('mrossi', '2020-05-01', NULL);
+            INSERT INTO EVENTO (ID_evento, posti, titolo, descrizione, data_evento, username)
+                VALUES (1, 3, 'Vendemmia', '-', '2030-09-01', 'mrossi');
+            INSERT INTO SERVIZIO (ID_servizio, prezzo, tipo_servizio) VALUES (1, 50, 'CAMERA');
+            INSERT INTO PRENOTAZIONE (ID_prenotazione, username) VALUES (1, 'mrossi'), (2, 'mrossi');
+            INSERT INTO DETTAGLIO_PRENOTAZIONE VALUES (1, 1, '2020-01-01 14:00:00', '2020-01-02 10:00:00');
+            INSERT INTO DETTAGLIO_PRENOTAZIONE VALUES (2, 1, '2999-01-01 14:00:00', '2999-01-02 10:00:00');
+        """)
+
+    def seats(self):
+        return self.db.execute("SELECT posti FROM EVENTO WHERE ID_evento = 1").fetchone()[0]
+
+    def test_port_matches_db_sql(self):
+        self.assertEqual(sqlite_schema.diff(), [])
+
+    def test_seat_triggers(self):
+        self.db.execute("INSERT INTO ISCRIVE (ID_evento, username, partecipanti) VALUES (1, 'mrossi', 2)")
+        self.assertEqual(self.seats(), 1)
+        self.db.execute("DELETE FROM ISCRIVE WHERE ID_evento = 1")
+        self.assertEqual(self.seats(), 3)
+        with self.assertRaisesMessage(sqlite3.IntegrityError, "Posti insufficienti"):
+            self.db.execute("INSERT INTO ISCRIVE (ID_evento, username, partecipanti) VALUES (1, 'mrossi', 4)")
+        self.assertEqual(self.seats(), 3)
+
+    def test_review_trigger(self):
+        insert = (
+            "INSERT INTO RECENSIONE (tipo_servizio, voto, descrizione, username, ID_prenotazione)"
+            " VALUES ('CAMERA', 5, '-', 'mrossi', ?)"
+        )
+        self.db.execute(insert, (1,))
+        with self.assertRaisesMessage(sqlite3.IntegrityError, "solo dopo la fine"):
+            self.db.execute(insert, (2,))
+        with self.assertRaisesMessage(sqlite3.IntegrityError, "Non esiste"):
+            self.db.execute(insert.replace("CAMERA", "PISCINA"), (1,))
+
+    def test_view_lists_available_services(self):
+        self.db.execute("INSERT INTO CAMERA VALUES (1, 'C1', 2)")
+        self.db.execute(
+            "INSERT INTO SERVIZIO (ID_servizio, prezzo, tipo_servizio, status)"
+            " VALUES (2, 9, 'PISCINA', 'MANUTENZIONE')"
+        )
+        rows = self.db.execute("SELECT ID_servizio, codice, max_capienza FROM V_SERVIZI_DISPONIBILI").fetchall()
+        self.assertEqual(rows, [(1, "C1", 2)])
+
+
+@override_settings(QUERY_STATS_SAMPLE_RATE=1.0)
+class QueryStatsTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee)
+
+    def setUp(self):
+        querystats.registry.clear()
+        # user ids are reused once a test rolls back
+        usercache.cache.clear()
+        self.request = RequestFactory().get("/services/")
+        self.request.resolver_match = resolve("/services/")
+
+    def loop_view(self, request):
+        for username in ("a", "b", "c"):
+            DjangoUser.objects.filter(username=username).exists()
+        DjangoUser.objects.count()
+        return HttpResponse("ok")
+
+    def test_fingerprint_normalizes_literals(self):
+        self.assertEqual(
+            querystats.normalize("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3)"),
+            "SELECT * FROM t WHERE a = ? AND b IN (...)",
+        )
+        self.assertEqual(
+            querystats.fingerprint("SELECT 1 FROM t WHERE id = 5"),
+            querystats.fingerprint("SELECT 1  FROM t WHERE id = 7"),
+        )
+
+    def test_duplicates_are_flagged(self):
+        response = querystats.QueryStatsMiddleware(self.loop_view)(self.request)
+
+        timing = response["Server-Timing"]
+        self.assertIn('desc="4 queries"', timing)
+        self.assertIn('dup;desc="2 duplicated"', timing)
+        [row] = querystats.registry.summary()
+        self.assertEqual((row["route"], row["max_queries"]), ("services", 4))
+        self.assertEqual(row["duplicates"][0]["max_executions"], 3)
+        self.assertEqual(self.request.query_stats.count, 4)
+
+    @override_settings(QUERY_STATS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_wrapped(self):
+        response = querystats.QueryStatsMiddleware(self.loop_view)(self.request)
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(querystats.registry.summary(), [])
+
+    async def test_async_requests(self):
+        async def view(request):
+            await DjangoUser.objects.filter(username="a").aexists()
+            await DjangoUser.objects.filter(username="b").aexists()
+            return HttpResponse("ok")
+
+        response = await querystats.QueryStatsMiddleware(view)(self.request)
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+
+    def test_summary_is_staff_only(self):
+        self.client.force_login(DjangoUser.objects.create(username="guest"))
+        self.assertEqual(self.client.get("/staff/queries/").status_code, 302)
+        self.client.force_login(DjangoUser.objects.create(username="boss", is_staff=True))
+        self.client.get("/login/")
+        response = self.client.get("/staff/queries/?format=json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("login", [row["route"] for row in response.json()["routes"]])
+
+
+@override_settings(
+    PASSWORD_HASHERS=["core.hashers.TimedPBKDF2PasswordHasher"],
+    LOGIN_THROTTLE_RATES={},
+)
+class MetricsTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee)
+
+    def setUp(self):
+        usercache.cache.clear()
+        metrics.store.reset()
+        self.addCleanup(metrics.store.reset)
+
+    def sample(self, text, line_start):
+        return [line for line in text.splitlines() if line.startswith(line_start)]
+
+    def test_workers_are_summed_from_their_files(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.LOGINS.inc(result="failed")
+            metrics.LOGINS.inc(result="failed")
+            metrics.PASSWORD_VERIFY_SECONDS.observe(0.4)
+            # another worker
+            other = metrics.MmapValues(metrics.Path(directory) / "1.db")
+            other.set('farmhouse_logins_total{result="failed"}', 3)
+            other.set('farmhouse_password_verify_seconds_bucket{le="0.2"}', 1)
+            other.close()
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+            text = metrics.render()
+
+        self.assertIn('farmhouse_logins_total{result="failed"} 5', text)
+        self.assertIn('farmhouse_password_verify_seconds_bucket{le="0.3"} 1', text)
+        self.assertIn('farmhouse_password_verify_seconds_bucket{le="0.5"} 2', text)
+        self.assertIn('farmhouse_password_verify_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn("farmhouse_password_verify_seconds_count 1", text)
+
+    def test_reused_pid_keeps_the_exited_worker_file(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # an exited worker that had the PID of this process
+            exited = metrics.MmapValues(metrics.Path(directory) / f"{os.getpid()}-1.db")
+            exited.set('farmhouse_logins_total{result="failed"}', 4)
+            exited.close()
+            metrics.LOGINS.inc(result="failed")
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertIn('farmhouse_logins_total{result="failed"} 5', metrics.render())
+
+    def test_endpoint(self):
+        from django.contrib.auth.hashers import make_password
+
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password=make_password("secret"), email="m@example.com")
+        self.client.post("/login/", {"username": "mrossi", "password": "wrong"})
+        self.client.post("/login/", {"username": "mrossi", "password": "secret"})
+
+        text = self.client.get("/metrics").content.decode()
+
+        self.assertIn('farmhouse_logins_total{result="failed"} 1', text)
+        self.assertIn('farmhouse_logins_total{result="success"} 1', text)
+        self.assertIn("farmhouse_password_verify_seconds_count 2", text)
+        self.assertEqual(
+            self.sample(text, 'farmhouse_http_request_duration_seconds_count{route="login",method="POST"}'),
+            ['farmhouse_http_request_duration_seconds_count{route="login",method="POST"} 2'],
+        )
+        self.assertTrue(self.sample(text, 'farmhouse_cache_hit_ratio{cache="user"}'))
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.9"])
+    def test_endpoint_is_restricted(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.force_login(DjangoUser.objects.create(username="boss", is_staff=True))
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+class SlowQueryLogTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee)
+
+    def setUp(self):
+        usercache.cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, "slow.log")
+        settings = override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_LOG=self.log)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        slowlog.reset_logger()
+        self.addCleanup(slowlog.reset_logger)
+
+    def test_capture_and_report(self):
+        self.client.force_login(DjangoUser.objects.create(username="boss", is_staff=True))
+        with connection.execute_wrapper(slowlog.SlowQueryCapture("default")):
+            self.client.get("/staff/queries/")
+            self.client.get("/staff/queries/")
+
+        entries = list(slowlog.read_entries(self.log))
+        session = [e for e in entries if "django_session" in e["sql"]]
+        self.assertEqual(len(session), 2)
+        self.assertEqual(session[0]["view"], "query-stats")
+        self.assertEqual(session[0]["fingerprint"], session[1]["fingerprint"])
+        self.assertTrue(any(e["frame"].startswith("core/usercache.py:") for e in entries))
+
+        out = io.StringIO()
+        call_command("slow_queries", log=self.log, sort="count", explain=True, json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        top = next(g for g in report if g["fingerprint"] == session[0]["fingerprint"])
+        self.assertEqual((top["count"], top["views"]), (2, {"query-stats": 2}))
+        self.assertTrue(top["explain"])
+
+    def test_capture_installed_mid_request_keeps_the_wrapper_stack(self):
+        from django.db.backends.signals import connection_created
+
+        saved = list(connection.execute_wrappers)
+        connection.execute_wrappers[:] = [w for w in saved if not isinstance(w, slowlog.SlowQueryCapture)]
+        base = len(connection.execute_wrappers)
+        self.addCleanup(lambda: connection.execute_wrappers.__setitem__(slice(None), saved))
+
+        def view(request):
+            # with CONN_MAX_AGE = 0 the connection opens inside the request
+            connection_created.send(sender=type(connection), connection=connection)
+            DjangoUser.objects.count()
+            return HttpResponse("ok")
+
+        middleware = querystats.QueryStatsMiddleware(view)
+        sizes = []
+        with override_settings(QUERY_STATS_SAMPLE_RATE=1.0):
+            for _ in range(3):
+                request = RequestFactory().get("/services/")
+                request.resolver_match = resolve("/services/")
+                middleware(request)
+                wrappers = connection.execute_wrappers
+                self.assertFalse(any(isinstance(w, querystats.RequestQueries) for w in wrappers))
+                self.assertIsInstance(wrappers[0], slowlog.SlowQueryCapture)
+                sizes.append(len(wrappers))
+        self.assertEqual(sizes, [base + 1] * 3)
+        self.assertEqual(request.query_stats.count, 1)
+
+    def test_disabled_by_default(self):
+        with override_settings(SLOW_QUERY_MS=None), connection.execute_wrapper(slowlog.SlowQueryCapture("default")):
+            DjangoUser.objects.count()
+        self.assertFalse(os.path.exists(self.log))
+
+
+class ProfilingTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee)
+
+    def setUp(self):
+        usercache.cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        settings = override_settings(PROFILING_DIR=self.dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.staff = DjangoUser.objects.create(username="boss", is_staff=True)
+
+    def saved(self):
+        return profiling.recent()
+
+    def test_cprofile_with_query_summary(self):
+        def busy_view(request):
+            for username in ("a", "b"):
+                DjangoUser.objects.filter(username=username).exists()
+            return HttpResponse("ok")
+
+        request = RequestFactory().get("/services/?_profile=1")
+        request.resolver_match = resolve("/services/")
+        request.user = self.staff
+        profiling.ProfilingMiddleware(busy_view)(request)
+
+        [meta] = self.saved()
+        self.assertEqual((meta["route"], meta["user"], meta["mode"]), ("services", "boss", "cprofile"))
+        self.assertEqual((meta["queries"], meta["duplicated"]), (2, 1))
+        stats = pstats.Stats(os.path.join(self.dir, meta["file"]))
+        self.assertTrue(any(func[2] == "busy_view" for func in stats.stats))
+
+        self.client.force_login(self.staff)
+        page = self.client.get("/staff/profiles/")
+        self.assertContains(page, meta["file"])
+        download = self.client.get(f"/staff/profiles/{meta['file']}")
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(self.client.get("/staff/profiles/..%2Fsettings.py").status_code, 404)
+
+    def test_sampler_writes_speedscope(self):
+        self.client.force_login(self.staff)
+        self.client.get("/staff/queries/", HTTP_X_PROFILE="sample")
+        [meta] = self.saved()
+        with open(os.path.join(self.dir, meta["file"])) as f:
+            document = json.load(f)
+        self.assertEqual(document["profiles"][0]["type"], "sampled")
+        self.assertEqual(document["name"], "GET /staff/queries/")
+
+    def test_only_staff_can_trigger(self):
+        self.client.force_login(DjangoUser.objects.create(username="guest"))
+        self.client.get("/login/?_profile=1")
+        self.assertEqual(self.saved(), [])
+
+    async def test_async_request(self):
+        async def view(request):
+            await DjangoUser.objects.filter(username="a").aexists()
+            await asyncio.sleep(0.02)
+            await DjangoUser.objects.filter(username="b").aexists()
+            return HttpResponse("ok")
+
+        request = AsyncRequestFactory().get("/services/?_profile=sample")
+        request.resolver_match = resolve("/services/")
+        request.user = self.staff
+        await profiling.ProfilingMiddleware(view)(request)
+
+        [meta] = await asyncio.to_thread(self.saved)
+        self.assertEqual((meta["route"], meta["queries"], meta["duplicated"]), ("services", 2, 1))
+
+
+class FakeConnection:
+    """DB-API connection of a fake driver, for the pool tests."""
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self):
+        if not self.alive:
+            raise OSError("server has gone away")
+
+    def rollback(self):
+        self.ping()
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def pool(self, **kwargs):
+        self.connections = []
+
+        def connect():
+            self.connections.append(FakeConnection())
+            return self.connections[-1]
+
+        return dbpool.ConnectionPool(connect, **{"size": 2, "timeout": 0.05, **kwargs})
+
+    def test_connections_are_reused(self):
+        pool = self.pool()
+        first = pool.checkout()
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+        self.assertEqual(first.rollbacks, 1)
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["checkouts"], stats["in_use"], stats["idle"]), (1, 2, 1, 0))
+
+    def test_checkout_times_out_when_full(self):
+        pool = self.pool()
+        pool.checkout(), pool.checkout()
+        with self.assertRaises(dbpool.PoolTimeout):
+            pool.checkout()
+        stats = pool.stats()
+        self.assertEqual((stats["open"], stats["waits"], stats["timeouts"]), (2, 1, 1))
+
+    def test_waiting_checkout_gets_returned_connection(self):
+        pool = self.pool(size=1, timeout=2)
+        held = pool.checkout()
+        threading.Timer(0.05, pool.checkin, [held]).start()
+        self.assertIs(pool.checkout(), held)
+        self.assertEqual(pool.stats()["waits"], 1)
+
+    def test_dead_connection_is_replaced(self):
+        pool = self.pool()
+        dead = pool.checkout()
+        pool.checkin(dead)
+        dead.alive = False
+        fresh = pool.checkout()
+        self.assertIsNot(fresh, dead)
+        self.assertTrue(dead.closed)
+        self.assertEqual((pool.stats()["ping_failures"], pool.stats()["open"]), (1, 1))
+
+    def test_old_connection_is_recycled(self):
+        pool = self.pool(recycle=0.01)
+        old = pool.checkout()
+        pool.checkin(old)
+        time.sleep(0.02)
+        self.assertIsNot(pool.checkout(), old)
+        self.assertTrue(old.closed)
+        self.assertEqual(pool.stats()["recycled"], 1)
+
+    def test_broken_connection_is_discarded_on_checkin(self):
+        pool = self.pool()
+        conn = pool.checkout()
+        conn.alive = False
+        pool.checkin(conn)
+        self.assertEqual((pool.stats()["open"], pool.stats()["discarded"]), (0, 1))
+        self.assertTrue(conn.closed)
+
+    def test_discarded_connection_frees_the_slot(self):
+        pool = self.pool(size=1)
+        conn = pool.checkout()
+        pool.discard(conn)
+        pool.discard(conn)  # once only
+        self.assertTrue(conn.closed)
+        self.assertEqual(conn.rollbacks, 0)
+        self.assertEqual((pool.stats()["open"], pool.stats()["discarded"]), (0, 1))
+        self.assertIsNot(pool.checkout(), conn)
+
+    def test_failed_connect_frees_the_slot(self):
+        pool = dbpool.ConnectionPool(lambda: 1 / 0, size=1, timeout=0.01)
+        for _ in range(2):
+            with self.assertRaises(ZeroDivisionError):
+                pool.checkout()
+        self.assertEqual(pool.stats()["open"], 0)
+
+    def test_forked_process_drops_inherited_connections(self):
+        pool = self.pool()
+        inherited = pool.checkout()
+        pool._pid = -1  # as seen from a child process
+        pool.checkin(inherited)
+        self.assertFalse(inherited.closed)
+        self.assertEqual(pool.stats()["open"], 0)
+
+    def test_metrics_export(self):
+        metrics.store.reset()
+        self.addCleanup(metrics.store.reset)
+        pool = self.pool()
+        pool.checkout()
+        dbpool.registry._pools["bench"] = pool
+        self.addCleanup(dbpool.registry._pools.pop, "bench")
+        metrics.sync_db_pools()
+        text = metrics.render()
+        self.assertIn('farmhouse_db_pool_connections{alias="bench",state="in_use"} 1', text)
+        self.assertIn('farmhouse_db_pool_events_total{alias="bench",event="created"} 1', text)
+
+
+@override_settings(DB_REPLICA_ALIAS="replica", DB_PIN_SECONDS=60)
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Two SQLite databases stand in for the primary and the replica. Rows
+    written with .using("default") reach only the primary, as if the
+    replica lagged behind.
+    """
+
+    # "replica" is added by setUpClass: the test runner only knows the
+    # aliases of DATABASES
+    databases = {"default"}
+    CF = "RPLCTN00A01H501U"
+    models = (Person, Service, Room, Pool, AnimalActivity, Playground, Restaurant)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        configured = connections.configure_settings({
+            "default": dict(connections.settings["default"]),
+            "replica": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": os.path.join(cls.replica_dir.name, "replica.sqlite3"),
+            },
+        })
+        connections.settings["replica"] = configured["replica"]
+        cls.databases = cls.databases | {"replica"}
+        cls.created = []
+        for alias in ("default", "replica"):
+            existing = {name.upper() for name in connections[alias].introspection.table_names()}
+            with connections[alias].schema_editor() as editor:
+                for model in cls.models:
+                    if model._meta.db_table.upper() not in existing:
+                        editor.create_model(model)
+                        cls.created.append((alias, model))
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias, model in reversed(cls.created):
+            with connections[alias].schema_editor() as editor:
+                editor.delete_model(model)
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.addCleanup(self.delete_rows)
+        Person.objects.using("default").create(cf=self.CF, name="Lagging", surname="Replica", phone="1")
+
+    def delete_rows(self):
+        # raw: a queryset delete() would also collect the (missing) UTENTE rows
+        for alias in ("default", "replica"):
+            with connections[alias].cursor() as cursor:
+                cursor.execute("DELETE FROM PERSONA WHERE CF LIKE 'RPLCTN%%'")
+                cursor.execute("DELETE FROM ATTIVITA_CON_ANIMALI WHERE cod_attivita LIKE 'R%%'")
+                cursor.execute("DELETE FROM SERVIZIO WHERE prezzo = 777")
+
+    def lagging_activity(self) -> int:
+        """An activity written to the primary only."""
+        service = Service.objects.using("default").create(price=777, type="ATTIVITA_CON_ANIMALI")
+        AnimalActivity.objects.using("default").create(id=service, activity_code="R01", description="pony rides")
+        return service.pk
+
+    def visible(self) -> bool:
+        return Person.objects.filter(cf=self.CF).exists()
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertFalse(self.visible())
+        Person.objects.create(cf="RPLCTN00A01H501V", name="New", surname="Row", phone="1")
+        self.assertTrue(Person.objects.using("default").filter(cf="RPLCTN00A01H501V").exists())
+        self.assertIsNone(dbrouter.PrimaryReplicaRouter().db_for_read(DjangoUser))
+
+    def test_transaction_reads_from_primary(self):
+        with transaction.atomic():
+            self.assertTrue(self.visible())
+
+    def test_cache_rebuilds_read_primary(self):
+        pk = self.lagging_activity()
+        self.assertFalse(AnimalActivity.objects.filter(pk=pk).exists())
+
+        # the version bump of the write is followed by a rebuild
+        catalog_cache = catalog.CatalogCache()
+        catalog_cache.backend.clear()
+        catalog_cache.bump()
+        activities = catalog_cache.get()["catalog"]["ATTIVITA_CON_ANIMALI"]
+        self.assertIn(pk, [activity.pk for activity in activities])
+
+        index = search.LocalSearch()
+        self.assertEqual([hit[0] for hit in index.top("activities", ["pony"], 5, "replica")], [pk])
+
+    def test_routing_is_off_without_replica(self):
+        with override_settings(DB_REPLICA_ALIAS="missing"):
+            self.assertTrue(self.visible())
+
+    def chain(self, view):
+        return SessionMiddleware(dbrouter.ReplicaPinMiddleware(view))
+
+    def send(self, handler, method="get", cookies=None):
+        request = getattr(RequestFactory(), method)("/")
+        request.COOKIES.update(cookies or {})
+        return handler(request)
+
+    def test_session_reads_primary_after_write(self):
+        def view(request):
+            if request.method == "POST":
+                Person.objects.filter(cf=self.CF).update(city="Cesena")
+            return HttpResponse(str(self.visible()))
+
+        handler = self.chain(view)
+        self.assertEqual(self.send(handler).content, b"False")
+        response = self.send(handler, "post")
+        self.assertEqual(response.content, b"True")  # same request: pinned by the write
+        cookies = {key: morsel.value for key, morsel in response.cookies.items()}
+        self.assertEqual(self.send(handler, cookies=cookies).content, b"True")
+        self.assertEqual(self.send(handler).content, b"False")  # other sessions are not pinned
+
+        with override_settings(DB_PIN_SECONDS=0.05):
+            response = self.send(handler, "post", cookies)
+            time.sleep(0.1)
+            self.assertEqual(self.send(handler, cookies=cookies).content, b"False")
+
+    async def test_async_session_reads_primary_after_write(self):
+        async def view(request):
+            if request.method == "POST":
+                await Person.objects.filter(cf=self.CF).aupdate(city="Cesena")
+            return HttpResponse(str(await Person.objects.filter(cf=self.CF).aexists()))
+
+        handler = self.chain(view)
+        request = AsyncRequestFactory().post("/")
+        response = await handler(request)
+        self.assertEqual(response.content, b"True")
+        request = AsyncRequestFactory().get("/")
+        request.COOKIES.update({key: morsel.value for key, morsel in response.cookies.items()})
+        self.assertEqual((await handler(request)).content, b"True")
+        self.assertEqual((await handler(AsyncRequestFactory().get("/"))).content, b"False")
+
+
+# BookingDetail and Enrolls have composite keys, which schema_editor cannot
+# create: the profile page needs the tables of sql/sqlite.sql.
+@skipUnless(getattr(settings, "SQLITE_SCHEMA", False), "run with config.settings_sqlite")
+class AsyncReadViewsTests(UnmanagedModelsTestCase):
+    unmanaged_models = (
+        Person, User, Employee, Service, Room, Pool, AnimalActivity, Playground, Restaurant,
+        Booking, BookingDetail, Review, Event, Enrolls,
+    )
+    pages = ("/", "/services/", "/event/", "/event/?q=harvest", "/profile/")
+    CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="[^"]*"')
+
+    @classmethod
+    def setUpTestData(cls):
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        staff = Person.objects.create(cf="MSTLNZ99F06J234V", name="Paolo", surname="Mast", phone="2")
+        User.objects.create(username="mrossi", cf=person, password="-", email="mario@example.com")
+        User.objects.create(username="pmast", cf=staff, password="-", email="paolo@example.com")
+        Employee.objects.create(username_id="pmast", hire_date="2020-05-01")
+
+        service = Service.objects.create(price=10, type="PISCINA")
+        Pool.objects.create(id=service, sunbed_code="L01")
+        booking = Booking.objects.create(username_id="mrossi", booking_date=timezone.now())
+        start = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time())) + timedelta(hours=10)
+        BookingDetail.objects.create(booking=booking, service=service, start_date=start, end_date=start + timedelta(hours=2))
+        event = Event.objects.create(
+            seats=10, title="Harvest", description="-", date=timezone.localdate() + timedelta(days=3), username_id="pmast"
+        )
+        Enrolls.objects.create(event_id=event.pk, username_id="mrossi", participants=2)
+
+    def setUp(self):
+        usercache.cache.clear()
+        catalog.cache.bump()
+        self.user = DjangoUser.objects.create(username="mrossi")
+
+    def html(self, response):
+        return self.CSRF_RE.sub("", response.content.decode())
+
+    def test_same_pages_as_sync_views(self):
+        self.client.force_login(self.user)
+        async_to_sync(self.async_client.aforce_login)(self.user)
+        for path in self.pages:
+            with self.subTest(path=path):
+                expected = self.client.get(path)
+                with override_settings(ROOT_URLCONF=build_urlconf(use_async=True)):
+                    self.assertTrue(asyncio.iscoroutinefunction(resolve(path.split("?")[0]).func))
+                    response = async_to_sync(self.async_client.get)(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [t.name for t in response.templates], [t.name for t in expected.templates]
+                )
+                self.assertEqual(self.html(response), self.html(expected))
+
+    async def test_profile_querysets_are_evaluated(self):
+        await self.async_client.aforce_login(self.user)
+        with override_settings(ROOT_URLCONF=build_urlconf(use_async=True)):
+            response = await self.async_client.get("/profile/")
+        # iterating an unevaluated queryset here would raise SynchronousOnlyOperation
+        [subscription] = response.context["subscriptions"]
+        self.assertEqual(subscription.event.title, "Harvest")
+        self.assertEqual(list(response.context["reviews"]), [])
+
+    async def test_profile_requires_login(self):
+        with override_settings(ROOT_URLCONF=build_urlconf(use_async=True)):
+            response = await self.async_client.get("/profile/")
+        self.assertEqual(response.status_code, 302)
+
+
+# Enrolls has a composite key and the seat arithmetic is done by the triggers
+# of sql/sqlite.sql.
+@skipUnless(getattr(settings, "SQLITE_SCHEMA", False), "run with config.settings_sqlite")
+class EnrollmentTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee, Event, Enrolls, Waitlist)
+    usernames = ("mrossi", "lbianchi", "gverdi", "aneri")
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Person.objects.create(cf="MSTLNZ99F06J234V", name="Paolo", surname="Mast", phone="0")
+        User.objects.create(username="pmast", cf=staff, password="-", email="paolo@example.com")
+        Employee.objects.create(username_id="pmast", hire_date="2020-05-01")
+        for i, username in enumerate(cls.usernames):
+            person = Person.objects.create(cf=f"RSSMRA80A01H50{i}U", name=username, surname="-", phone=str(i))
+            User.objects.create(username=username, cf=person, password="-", email=f"{username}@example.com")
+        cls.event = Event.objects.create(
+            seats=5, title="Harvest", description="-", date=date(2030, 9, 1), username_id="pmast"
+        )
+
+    def seats(self):
+        return Event.objects.get(pk=self.event.pk).seats
+
+    def participants(self, username):
+        return Enrolls.objects.filter(event_id=self.event.pk, username_id=username).values_list(
+            "participants", flat=True
+        ).first()
+
+    def test_reserve_seats_enrolls_through_the_trigger(self):
+        self.assertEqual(enrollment.reserve_seats(self.event.pk, "mrossi", 2), enrollment.ENROLLED)
+        self.assertEqual(self.seats(), 3)
+        self.assertEqual(self.participants("mrossi"), 2)
+
+    def test_reserve_seats_extends_an_enrollment(self):
+        enrollment.reserve_seats(self.event.pk, "mrossi", 2)
+        self.assertEqual(enrollment.reserve_seats(self.event.pk, "mrossi", 3), enrollment.UPDATED)
+        self.assertEqual(self.seats(), 0)
+        self.assertEqual(self.participants("mrossi"), 5)
+
+    def test_reserve_seats_never_oversells(self):
+        enrollment.reserve_seats(self.event.pk, "mrossi", 4)
+        # refused by trg_decrementa_posti_evento
+        self.assertEqual(enrollment.reserve_seats(self.event.pk, "lbianchi", 2), enrollment.NO_SEATS)
+        # refused by the conditional UPDATE
+        self.assertEqual(enrollment.reserve_seats(self.event.pk, "mrossi", 2), enrollment.NO_SEATS)
+        self.assertEqual(self.seats(), 1)
+        self.assertEqual(self.participants("mrossi"), 4)
+        self.assertIsNone(self.participants("lbianchi"))
+        with self.assertRaises(ValueError):
+            enrollment.reserve_seats(self.event.pk, "mrossi", 0)
+
+    def fill(self):
+        enrollment.reserve_seats(self.event.pk, "mrossi", 5)
+
+    def test_join_waitlist_keeps_the_first_position(self):
+        self.fill()
+        self.assertEqual(enrollment.join_waitlist(self.event.pk, "lbianchi", 2), 1)
+        self.assertEqual(enrollment.join_waitlist(self.event.pk, "gverdi", 1), 2)
+        self.assertEqual(enrollment.join_waitlist(self.event.pk, "lbianchi", 4), 1)
+        self.assertEqual(Waitlist.objects.get(username_id="lbianchi").participants, 2)
+
+    def test_seats_freed_before_joining_the_waitlist(self):
+        self.fill()
+        self.assertEqual(enrollment.reserve_seats(self.event.pk, "lbianchi", 2), enrollment.NO_SEATS)
+        # a cancellation commits before the request is queued: nobody to promote yet
+        self.assertTrue(enrollment.cancel_enrollment(self.event.pk, "mrossi"))
+        self.assertIsNone(enrollment.join_waitlist(self.event.pk, "lbianchi", 2))
+        self.assertEqual(self.participants("lbianchi"), 2)
+        self.assertFalse(Waitlist.objects.exists())
+        self.assertEqual(self.seats(), 3)
+
+    def test_cancel_promotes_first_fit(self):
+        enrollment.reserve_seats(self.event.pk, "mrossi", 3)
+        enrollment.reserve_seats(self.event.pk, "aneri", 2)
+        enrollment.join_waitlist(self.event.pk, "lbianchi", 3)
+        enrollment.join_waitlist(self.event.pk, "gverdi", 2)
+
+        # 2 seats freed: lbianchi (3) keeps the head of the queue, gverdi (2) is served
+        self.assertTrue(enrollment.cancel_enrollment(self.event.pk, "aneri"))
+        self.assertEqual(self.participants("gverdi"), 2)
+        self.assertEqual(list(Waitlist.objects.values_list("username_id", flat=True)), ["lbianchi"])
+        self.assertEqual(self.seats(), 0)
+
+        self.assertTrue(enrollment.cancel_enrollment(self.event.pk, "mrossi"))
+        self.assertEqual(self.participants("lbianchi"), 3)
+        self.assertFalse(Waitlist.objects.exists())
+        self.assertEqual(self.seats(), 0)
+        self.assertFalse(enrollment.cancel_enrollment(self.event.pk, "mrossi"))
+
+    def test_promote_waitlist_in_batches(self):
+        self.fill()
+        for username in self.usernames[1:]:
+            enrollment.join_waitlist(self.event.pk, username, 1)
+        Enrolls.objects.filter(event_id=self.event.pk, username_id="mrossi").delete()
+        with transaction.atomic():
+            self.assertEqual(enrollment.promote_waitlist(self.event.pk, batch_size=2), 3)
+        self.assertFalse(Waitlist.objects.exists())
+        self.assertEqual(self.seats(), 2)
+        self.assertEqual(
+            sorted(Enrolls.objects.filter(event_id=self.event.pk).values_list("username_id", flat=True)),
+            ["aneri", "gverdi", "lbianchi"],
+        )
+
+    def test_promotion_of_an_enrolled_user_needs_the_seats(self):
+        enrollment.reserve_seats(self.event.pk, "mrossi", 2)
+        enrollment.reserve_seats(self.event.pk, "lbianchi", 3)
+        enrollment.join_waitlist(self.event.pk, "mrossi", 2)
+
+        def take_seats(execute, sql, params, many, context):
+            # the seats vanish between the read and the conditional UPDATE
+            if sql.startswith('UPDATE "EVENTO"'):
+                context["connection"].connection.execute('UPDATE "EVENTO" SET "posti" = 0')
+            return execute(sql, params, many, context)
+
+        with transaction.atomic():
+            Enrolls.objects.filter(event_id=self.event.pk, username_id="lbianchi").delete()
+            with connection.execute_wrapper(take_seats):
+                self.assertEqual(enrollment.promote_waitlist(self.event.pk), 0)
+        self.assertEqual(self.participants("mrossi"), 2)
+        self.assertTrue(Waitlist.objects.filter(username_id="mrossi").exists())
+        self.assertEqual(self.seats(), 0)
+
+
+class AdminPerformanceTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee, Booking)
+
+    @classmethod
+    def setUpTestData(cls):
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password="-", email="mario@example.com")
+        cls.admin = DjangoUser.objects.create(username="boss", is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_bookings(self, n):
+        Booking.objects.bulk_create(
+            Booking(username_id="mrossi", booking_date=timezone.now()) for _ in range(n)
+        )
+
+    def changelist_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/core/booking/")
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in queries if q["sql"].startswith("SELECT") and "FROM \"PRENOTAZIONE\"" in q["sql"]]
+
+    def test_changelist_joins_displayed_keys_and_counts_once(self):
+        self.add_bookings(3)
+        few = self.changelist_sql()
+        self.add_bookings(20)
+        self.assertEqual(len(self.changelist_sql()), len(few))
+
+        [count] = [sql for sql in few if "COUNT(" in sql]
+        [rows] = [sql for sql in few if "ORDER BY" in sql]
+        self.assertIn("UTENTE", rows)
+        self.assertNotIn("PERSONA", rows)
+
+    def test_sortable_columns_are_indexed(self):
+        request = RequestFactory().get("/admin/core/booking/")
+        model_admin = admin.site._registry[Booking]
+        self.assertEqual(model_admin.get_sortable_by(request), ["id", "username"])
+        self.assertEqual(model_admin.get_list_select_related(request), ("username",))
+        self.assertEqual(
+            admin.site._registry[BookingDetail].get_list_select_related(request), ("booking", "service")
+        )
+
+    @skipUnless(connection.vendor == "sqlite", "reads the estimate from sqlite_stat1")
+    def test_approximate_count_above_threshold(self):
+        self.add_bookings(5)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.add_bookings(2)  # not in the statistics yet
+        self.assertEqual(adminperf.approximate_count(Booking), 5)
+
+        queryset = Booking.objects.order_by("-pk")
+        with override_settings(ADMIN_APPROXIMATE_COUNT_THRESHOLD=5):
+            self.assertEqual(adminperf.ApproximateCountPaginator(queryset, 10).count, 5)
+            filtered = queryset.filter(username_id="mrossi")
+            self.assertEqual(adminperf.ApproximateCountPaginator(filtered, 10).count, 7)
+        with override_settings(ADMIN_APPROXIMATE_COUNT_THRESHOLD=6):
+            self.assertEqual(adminperf.ApproximateCountPaginator(queryset, 10).count, 7)
+
+
+class SearchTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee, Service, AnimalActivity, Booking, Review, Event)
+
+    @classmethod
+    def setUpTestData(cls):
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        staff = Person.objects.create(cf="MSTLNZ99F06J234V", name="Paolo", surname="Mast", phone="2")
+        User.objects.create(username="mrossi", cf=person, password="-", email="mario@example.com")
+        User.objects.create(username="pmast", cf=staff, password="-", email="paolo@example.com")
+        Employee.objects.create(username_id="pmast", hire_date="2020-05-01")
+        cls.booking = Booking.objects.create(username_id="mrossi", booking_date=timezone.now())
+        today = timezone.localdate()
+        cls.festival = Event.objects.create(
+            seats=10, title="Harvest festival", description="Music in the vineyard",
+            date=today + timedelta(days=3), username_id="pmast",
+        )
+        cls.tasting = Event.objects.create(
+            seats=10, title="Wine tasting", description="Taste the harvest: harvest wines, harvest food",
+            date=today + timedelta(days=5), username_id="pmast",
+        )
+        Event.objects.create(
+            seats=10, title="Old harvest", description="-", date=today - timedelta(days=5), username_id="pmast",
+        )
+        Event.objects.create(
+            seats=10, title="Pottery", description="Clay", date=today + timedelta(days=1), username_id="pmast",
+        )
+
+    def setUp(self):
+        search.local.clear()
+        cache.clear()
+
+    def test_tokenize_folds_case_accents_and_stopwords(self):
+        self.assertEqual(search.tokenize("Attività con gli ANIMALI, è bello!"), ["attivita", "animali", "bello"])
+
+    def test_inverted_index_ranks_by_frequency_and_rarity(self):
+        index = search.InvertedIndex()
+        index.add(1, "harvest festival")
+        index.add(2, "harvest harvest wines")
+        index.add(3, "pottery")
+        self.assertEqual([pk for pk, _ in index.top(["harvest"], 10)], [2, 1])
+        index.remove(2)
+        self.assertEqual([pk for pk, _ in index.top(["harvest", "wines"], 10)], [1])
+
+    def test_event_search_ranks_upcoming_matches(self):
+        response = self.client.get("/event/", {"q": "Harvest"})
+        self.assertEqual(list(response.context["eventi"]), [self.tasting, self.festival])
+        self.assertContains(response, 'value="Harvest"')
+        response = self.client.get("/event/", {"q": "karaoke"})
+        self.assertContains(response, "No upcoming events match")
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_filter_is_applied_past_the_best_candidates(self):
+        # more past matches, ranked higher, than the first batches check
+        old = timezone.localdate() - timedelta(days=30)
+        Event.objects.bulk_create(
+            Event(seats=1, title="Harvest harvest harvest", description="-", date=old, username_id="pmast")
+            for _ in range(60)
+        )
+        upcoming = Event.objects.filter(date__gte=timezone.localdate())
+        search.local.index("events")
+        with CaptureQueriesContext(connection) as queries:
+            found = list(search.search("events", "harvest", upcoming))
+        self.assertEqual(found, [self.tasting, self.festival])
+        # batches of 4, 16 and 64 candidates, then the result
+        self.assertEqual(len(queries), 4)
+
+    def test_local_index_follows_saves_and_deletes(self):
+        self.assertFalse(search.search("activities", "pony").exists())
+        builds = search.local.stats()["builds"]
+        service = Service.objects.create(price=10, type="ATTIVITA_CON_ANIMALI")
+        with self.captureOnCommitCallbacks(execute=True):
+            activity = AnimalActivity.objects.create(id=service, activity_code="A01", description="Pony rides")
+        [found] = search.search("activities", "ponies pony")
+        self.assertEqual((found, found.search_score > 0), (activity, True))
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.delete()
+        self.assertFalse(search.search("activities", "pony").exists())
+        self.assertEqual(search.local.stats()["builds"], builds)  # updated in place
+
+    def test_admin_search_by_relevance(self):
+        self.client.force_login(DjangoUser.objects.create(username="boss", is_staff=True, is_superuser=True))
+        response = self.client.get("/admin/core/event/", {"q": "harvest"})
+        old = Event.objects.get(title="Old harvest")
+        # one "harvest" each for the festival and the old event: newest first
+        self.assertEqual(list(response.context["cl"].result_list), [self.tasting, old, self.festival])
+        response = self.client.get("/admin/core/event/", {"q": "harvest", "o": "1"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.festival, self.tasting, old])
+
+
+class BulkActionsTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Employee, Service, Booking)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = DjangoUser.objects.create(username="boss", is_staff=True, is_superuser=True)
+        cls.sunbeds = [Service.objects.create(price=5, type="PISCINA") for _ in range(5)]
+
+    def setUp(self):
+        usercache.cache.clear()
+        self.client.force_login(self.admin)
+
+    def post_action(self, path, action, selected, **data):
+        return self.client.post(
+            path, {"action": action, helpers.ACTION_CHECKBOX_NAME: [str(getattr(row, "pk", row)) for row in selected], **data}
+        )
+
+    def test_set_service_status_is_one_update(self):
+        selected = [service.pk for service in self.sunbeds[:3]]
+        version = catalog.cache.version()
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.post_action("/admin/core/service/", "set_status_manutenzione", selected)
+        self.assertEqual(response.status_code, 302)
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            sorted(Service.objects.filter(status="MANUTENZIONE").values_list("pk", flat=True)), selected
+        )
+        self.assertNotEqual(catalog.cache.version(), version)
+        messages_ = [str(m) for m in self.client.get("/admin/core/service/").context["messages"]]
+        self.assertIn("3 services set to MANUTENZIONE.", messages_)
+
+    def test_occupied_is_left_to_the_scheduler(self):
+        request = RequestFactory().get("/admin/core/service/")
+        request.user = self.admin
+        actions = admin.site._registry[Service].get_actions(request)
+        self.assertIn("set_status_manutenzione", actions)
+        self.assertNotIn("set_status_occupato", actions)
+        with self.assertRaises(ValueError):
+            bulk.set_service_status(Service.objects.all(), "OCCUPATO")
+
+    @skipUnless(getattr(settings, "SQLITE_SCHEMA", False), "SVOLGE and DETTAGLIO_PRENOTAZIONE have composite keys")
+    def test_clone_week_of_assignments(self):
+        from .models import Performs, Shift
+
+        person = Person.objects.create(cf="MSTLNZ99F06J234V", name="Paolo", surname="Mast", phone="2")
+        User.objects.create(username="pmast", cf=person, password="-", email="paolo@example.com")
+        Employee.objects.create(username_id="pmast", hire_date="2020-05-01")
+        shifts = [
+            Shift.objects.create(day=day, start_hour="08:00", end_hour="14:00", description="-")
+            for day in ("LUN", "MAR")
+        ]
+        monday = timezone.make_aware(datetime(2030, 6, 3, 8))
+        for offset, shift in enumerate(shifts):
+            Performs.objects.create(username_id="pmast", shift=shift, start_date=monday + timedelta(days=offset))
+        Performs.objects.create(username_id="pmast", shift=shifts[0], start_date=monday - timedelta(weeks=1))
+
+        # "select all": the rows of the page are posted too
+        page = [row.pk for row in Performs.objects.all()]
+        response = self.client.post(
+            "/admin/core/performs/",
+            {"action": "clone_week", "index": "0", "select_across": "1", helpers.ACTION_CHECKBOX_NAME: page},
+        )
+        self.assertTemplateUsed(response, "admin/core/bulk_action.html")
+        data = {"select_across": "1", "apply": "1", "week": "2030-06-05", "weeks": "1"}
+        self.post_action("/admin/core/performs/", "clone_week", page, **data)
+        cloned = Performs.objects.filter(start_date__gte=monday + timedelta(weeks=1))
+        self.assertEqual(
+            sorted(cloned.values_list("start_date", flat=True)),
+            [monday + timedelta(weeks=1), monday + timedelta(weeks=1, days=1)],
+        )
+        # the target week is complete: nothing to create the second time
+        self.assertEqual(bulk.clone_week(Performs.objects.all(), date(2030, 6, 3)), {"created": 0, "skipped": 2})
+
+    @skipUnless(getattr(settings, "SQLITE_SCHEMA", False), "SVOLGE and DETTAGLIO_PRENOTAZIONE have composite keys")
+    def test_cancel_bookings_in_range(self):
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password="-", email="mario@example.com")
+        start = timezone.make_aware(datetime(2030, 7, 10, 10))
+        both, single = (Booking.objects.create(username_id="mrossi", booking_date=timezone.now()) for _ in range(2))
+        for booking, service, days in ((both, self.sunbeds[0], 0), (both, self.sunbeds[1], 20), (single, self.sunbeds[2], 1)):
+            BookingDetail.objects.create(
+                booking=booking, service=service, start_date=start + timedelta(days=days),
+                end_date=start + timedelta(days=days, hours=2),
+            )
+
+        data = {"apply": "1", "start": "2030-07-10", "end": "2030-07-11"}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_action("/admin/core/bookingdetail/", "cancel_bookings", BookingDetail.objects.all(), **data)
+        self.assertEqual(list(BookingDetail.objects.values_list("service_id", flat=True)), [self.sunbeds[1].pk])
+        self.assertEqual(list(Booking.objects.values_list("pk", flat=True)), [both.pk])
+        messages_ = [str(m) for m in self.client.get("/admin/core/bookingdetail/").context["messages"]]
+        self.assertIn("Cancelled 2 booking details and 1 bookings left empty.", messages_)
+
+
+@skipUnless(getattr(settings, "SQLITE_SCHEMA", False), "the export rows have composite keys")
+class ExportTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Product, Order)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = DjangoUser.objects.create(username="boss", is_staff=True, is_superuser=True)
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password="-", email="mario@example.com")
+        products = [Product.objects.create(name=f"Jam {i}", price="4.50") for i in range(3)]
+        cls.orders = []
+        for day in (date(2026, 8, 31), date(2026, 9, 1), date(2026, 9, 30)):
+            order = Order.objects.create(
+                username_id="mrossi", date=timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            )
+            for quantity, product in enumerate(reversed(products), 1):
+                OrderDetail.objects.create(order=order, product=product, quantity=quantity, unit_price="4.50")
+            cls.orders.append(order)
+
+    def test_month_csv_streams_in_key_order(self):
+        out = io.StringIO()
+        call_command("export_data", "orders", month="2026-09", chunk_size=2, stdout=out, stderr=io.StringIO())
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "order,username,date,product,product_name,quantity,unit_price")
+        self.assertEqual(len(lines), 7)
+        keys = [tuple(map(int, line.split(",")[0:4:3])) for line in lines[1:]]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual({key[0] for key in keys}, {self.orders[1].pk, self.orders[2].pk})
+        # local midnight, written in UTC
+        self.assertEqual(datetime.fromisoformat(lines[1].split(",")[2]), self.orders[1].date)
+
+    def test_ndjson_rows_are_fetched_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            records = [json.loads(line) for line in exports.lines("orders", exports.queryset("orders"), "ndjson", 4)]
+        self.assertEqual(len(queries), 1)  # one cursor, fetched four rows at a time
+        self.assertEqual(len(records), 9)
+        self.assertEqual(records[0]["unit_price"], "4.50")
+        self.assertEqual(records[0]["username"], "mrossi")
+
+    def test_admin_action_streams_the_selected_orders(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            "/admin/core/order/", {"action": "export_csv", helpers.ACTION_CHECKBOX_NAME: [self.orders[0].pk]}
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        body = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(body.splitlines()), 4)
+        self.assertTrue(all(line.startswith(f"{self.orders[0].pk},") for line in body.splitlines()[1:]))
+
+
+@skipUnless(getattr(settings, "SQLITE_SCHEMA", False), "DETTAGLIO_PRENOTAZIONE has a composite key")
+class ServiceStatusSchedulerTests(UnmanagedModelsTestCase):
+    unmanaged_models = (Person, User, Service, Booking)
+
+    @classmethod
+    def setUpTestData(cls):
+        person = Person.objects.create(cf="RSSMRA80A01H501U", name="Mario", surname="Rossi", phone="1")
+        User.objects.create(username="mrossi", cf=person, password="-", email="mario@example.com")
+        cls.services = [Service.objects.create(price=5, type="PISCINA") for _ in range(4)]
+        cls.t0 = timezone.make_aware(datetime(2030, 7, 10, 10))
+
+    def book(self, service, start, hours=2):
+        booking = Booking.objects.create(username_id="mrossi", booking_date=timezone.now())
+        BookingDetail.objects.create(
+            booking=booking, service=service, start_date=start, end_date=start + timedelta(hours=hours)
+        )
+        return booking
+
+    def statuses(self):
+        return [Service.objects.get(pk=service.pk).status for service in self.services]
+
+    def test_transitions_flip_only_the_affected_services(self):
+        first, second, maintained, stale = self.services
+        Service.objects.filter(pk=maintained.pk).update(status="MANUTENZIONE")
+        Service.objects.filter(pk=stale.pk).update(status="OCCUPATO")
+        self.book(first, self.t0)
+        self.book(second, self.t0 + timedelta(hours=1))
+        self.book(maintained, self.t0)
+
+        scheduler = servicestatus.StatusScheduler()
+        self.assertEqual(scheduler.sync(self.t0 - timedelta(minutes=1)), (0, 1))
+        self.assertEqual(self.statuses(), ["DISPONIBILE", "DISPONIBILE", "MANUTENZIONE", "DISPONIBILE"])
+        self.assertEqual(scheduler.next_due(), self.t0)
+        self.assertEqual(scheduler.run_due(self.t0 - timedelta(seconds=1)), (0, 0))
+
+        version = catalog.cache.version()
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(scheduler.run_due(self.t0), (1, 0))
+        # nothing to release: the second UPDATE is not even sent
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("UPDATE")]), 1)
+        self.assertEqual(self.statuses(), ["OCCUPATO", "DISPONIBILE", "MANUTENZIONE", "DISPONIBILE"])
+        self.assertNotEqual(catalog.cache.version(), version)
+
+        self.assertEqual(scheduler.run_due(self.t0 + timedelta(hours=1)), (1, 0))
+        self.assertEqual(scheduler.run_due(self.t0 + timedelta(hours=2)), (0, 1))
+        self.assertEqual(self.statuses(), ["DISPONIBILE", "OCCUPATO", "MANUTENZIONE", "DISPONIBILE"])
+        self.assertEqual(scheduler.run_due(self.t0 + timedelta(hours=3)), (0, 1))
+        self.assertEqual(len(scheduler), 0)
+
+    def test_poll_reads_only_new_bookings(self):
+        self.book(self.services[0], self.t0)
+        scheduler = servicestatus.StatusScheduler()
+        scheduler.sync(self.t0 - timedelta(hours=1))
+        self.assertEqual(scheduler.poll(self.t0 - timedelta(hours=1)), 0)
+
+        booking = self.book(self.services[1], self.t0 - timedelta(minutes=30))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(scheduler.poll(self.t0 - timedelta(minutes=10)), 1)
+        [select] = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+        self.assertIn('"ID_prenotazione" >', select)
+        self.assertEqual(scheduler.watermark, booking.pk)
+        # already running when it was read: due at once
+        self.assertEqual(scheduler.run_due(self.t0 - timedelta(minutes=10)), (1, 0))
+        self.assertEqual(self.statuses()[:2], ["DISPONIBILE", "OCCUPATO"])
+
+    def test_once_reconciles_and_exits(self):
+        self.book(self.services[2], timezone.now() - timedelta(hours=1))
+        out = io.StringIO()
+        call_command("service_status_scheduler", once=True, stdout=out)
+        self.assertEqual(self.statuses()[2], "OCCUPATO")
+        self.assertIn("sync: 1 OCCUPATO, 0 DISPONIBILE", out.getvalue())
+
+
+@skipUnless(getattr(settings, "SQLITE_SCHEMA", False), "run with config.settings_sqlite")
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class GenerateDataTests(TestCase):
+    options = {
+        "users": 30, "employees": 3, "services_per_type": 2, "start": date(2030, 6, 1), "days": 14,
+        "events": 4, "batch_size": 7, "seed": 7,
+    }
+
+    def generate(self, prefix):
+        """Row counts of one run, rolled back afterwards."""
+        out = io.StringIO()
+        with transaction.atomic():
+            call_command("generate_data", prefix=prefix, stdout=out, **self.options)
+            seats = list(Event.objects.order_by("id").values_list("seats", flat=True))
+            transaction.set_rollback(True)
+        counts = dict(line.split(": ") for line in out.getvalue().splitlines() if ": " in line)
+        return counts, seats
+
+    def test_runs_are_reproducible(self):
+        counts, seats = self.generate("GENA")
+        self.assertEqual(int(counts["UTENTE"]), 30)
+        self.assertEqual(int(counts["SERVIZIO"]), 10)
+        self.assertGreater(int(counts["DETTAGLIO_PRENOTAZIONE"]), 0)
+        self.assertGreater(int(counts["iscrive"]), 0)
+        # another prefix, same seed: the same rows
+        self.assertEqual(self.generate("GENB"), (counts, seats))
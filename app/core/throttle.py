@@ -0,0 +1,168 @@
+"""
+Login throttle based on token buckets.
+
+Overview
+- A failed login costs a full PBKDF2 verification (1,000,000 iterations), so
+  an unthrottled burst of credential-stuffing requests can keep every worker
+  CPU busy. The limiter charges one token per login attempt from a bucket per
+  username, per client IP and a global bucket; when any of them is empty the
+  attempt is rejected before a password is hashed.
+- Buckets refill continuously: a rate of "5/min" allows a burst of 5
+  attempts and then one more every 12 seconds. The global bucket caps the
+  number of password verifications per cache, whatever the traffic.
+
+Usage
+- login_view/alogin_view call limiter.check() first and answer 429 with a
+  Retry-After header when it raises Throttled.
+- UserBackend and LocalModelBackend call it too, so every authenticate()
+  (admin login included) is covered. A request is charged only once: the
+  outcome is remembered on the request object.
+- Throttled subclasses PermissionDenied, which makes django.contrib.auth's
+  authenticate() stop trying further backends and return None.
+
+Settings
+- LOGIN_THROTTLE_RATES: {"username": "5/min", "ip": "20/min",
+  "global": "300/min"}; a scope set to None is not limited.
+- LOGIN_THROTTLE_CACHE_ALIAS: cache holding the buckets (default "default").
+  Use a cache shared by all workers (file, Redis, Memcached) to enforce the
+  limits across processes; with locmem each process has its own buckets.
+
+Notes
+- Buckets are read and written without a lock around the cache round trip;
+  under heavy concurrency a few extra attempts may slip through, the limits
+  are not exceeded by more than the number of concurrent workers.
+- The client IP is REMOTE_ADDR; behind a reverse proxy configure it to set
+  REMOTE_ADDR to the real client address.
+- limiter.stats() reports allowed attempts and rejections per scope.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATES = {"username": "5/min", "ip": "20/min", "global": "300/min"}
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+ALLOWED = "allowed"  # request marker: attempt already charged and allowed
+
+
+class Throttled(PermissionDenied):
+    """Login attempt rejected; `wait` is the number of seconds to back off."""
+
+    def __init__(self, scope: str, wait: float):
+        self.scope = scope
+        self.wait = wait
+        super().__init__("Too many login attempts. Please try again later.")
+
+
+def parse_rate(rate: Optional[str]) -> Optional[Tuple[int, int]]:
+    """'5/min' -> (5, 60); None disables the scope."""
+    if not rate:
+        return None
+    count, period = rate.split("/")
+    return int(count), PERIODS[period.strip().lower()]
+
+
+def client_ip(request) -> Optional[str]:
+    if request is None:
+        return None
+    return request.META.get("REMOTE_ADDR") or None
+
+
+class LoginThrottle:
+    KEY = "login-throttle:%s:%s"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected: Dict[str, int] = {}
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, "LOGIN_THROTTLE_CACHE_ALIAS", "default")]
+
+    @property
+    def rates(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        rates = getattr(settings, "LOGIN_THROTTLE_RATES", DEFAULT_RATES)
+        return {scope: parse_rate(rate) for scope, rate in rates.items()}
+
+    def _buckets(self, request, username: Optional[str]) -> List[Tuple[str, str, int, int]]:
+        """(scope, cache key, capacity, period) of every bucket the attempt is charged to."""
+        idents = {"global": "all", "ip": client_ip(request)}
+        if username:
+            idents["username"] = hashlib.sha256(username.lower().encode()).hexdigest()
+        buckets = []
+        for scope, rate in self.rates.items():
+            ident = idents.get(scope)
+            if rate is not None and ident is not None:
+                buckets.append((scope, self.KEY % (scope, ident), rate[0], rate[1]))
+        return buckets
+
+    def check(self, request, username: Optional[str]) -> None:
+        """
+        Charge one login attempt, or raise Throttled without charging anything.
+
+        Calling it again for the same request repeats the first outcome.
+        """
+        marker = getattr(request, "_login_throttle", None)
+        if isinstance(marker, Throttled):
+            raise marker
+        if marker == ALLOWED:
+            return
+
+        buckets = self._buckets(request, username)
+        now = time.time()
+        states = self.backend.get_many([key for _, key, _, _ in buckets])
+
+        updated = {}
+        for scope, key, capacity, period in buckets:
+            tokens, stamp = states.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * capacity / period)
+            if tokens < 1:
+                wait = math.ceil((1 - tokens) * period / capacity)
+                self._reject(request, Throttled(scope, wait))
+            updated[key] = (tokens - 1, now, period)
+
+        for key, (tokens, stamp, period) in updated.items():
+            # an idle bucket is full again after `period` seconds
+            self.backend.set(key, (tokens, stamp), timeout=period)
+        with self._lock:
+            self.allowed += 1
+        if request is not None:
+            request._login_throttle = ALLOWED
+
+    def _reject(self, request, exc: Throttled) -> None:
+        with self._lock:
+            self.rejected[exc.scope] = self.rejected.get(exc.scope, 0) + 1
+        logger.warning(
+            "Login throttled (%s bucket) from %s", exc.scope, client_ip(request) or "-"
+        )
+        if request is not None:
+            request._login_throttle = exc
+        raise exc
+
+    def reset(self, request=None, username: Optional[str] = None) -> None:
+        """Refill the IP/username buckets (e.g. after an admin unlock)."""
+        self.backend.delete_many(
+            [key for scope, key, _, _ in self._buckets(request, username) if scope != "global"]
+        )
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "allowed": self.allowed,
+                "rejected": dict(self.rejected),
+                "rejected_total": sum(self.rejected.values()),
+            }
+
+
+limiter = LoginThrottle()
@@ -1,22 +1,44 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_AUTH_VIEWS:
+    register_view, login_view = views.aregister_view, views.alogin_view
+else:
+    register_view, login_view = views.register_view, views.login_view
+
+if settings.ASYNC_READ_VIEWS:
+    homepage, services, profile_view, list_event = (
+        views.ahomepage, views.aservices, views.aprofile_view, views.alist_event
+    )
+else:
+    homepage, services, profile_view, list_event = (
+        views.homepage, views.services, views.profile_view, views.list_event
+    )
+
 urlpatterns = [
-    path("", views.homepage, name="homepage"),
+    path("", homepage, name="homepage"),
     path("servizio/<int:id_servizio>/prenota/", views.book_service, name="book_service"),
-    path("services/", views.services, name="services"),
+    path("services/", services, name="services"),
     path("services/book/", views.book_service_from_services, name="book_service_from_services"),
     # Registration endpoint:
-    path("register/", views.register_view, name="register"),
+    path("register/", register_view, name="register"),
     # Login endpoint:
-    path("login/", views.login_view, name="login"),
+    path("login/", login_view, name="login"),
     # Profile endpoint
-    path("profile/", views.profile_view, name="profile"),
+    path("profile/", profile_view, name="profile"),
     # Logout endpoint
     path("logout/", views.logout_view, name="logout"),
-    path("event/", views.list_event, name="list-event"),
+    path("event/", list_event, name="list-event"),
     path("event/<int:event_id>/subscribe/", views.event_subscription, name="event_subscription"),
     path("event/<int:event_id>/cancel/", views.cancel_enrollment, name="cancel_enrollment"),
     path("services/<str:type>/", views.choose_service, name="choose_service"),
     path("booking/<str:type>/", views.book_service, name="book_service"),
+    # Prometheus scrape endpoint (core.metrics)
+    path("metrics", views.metrics_view, name="metrics"),
+    # Staff: per-URL SQL summary (core.querystats)
+    path("staff/queries/", views.query_stats_view, name="query-stats"),
+    # Staff: request profiles (core.profiling)
+    path("staff/profiles/", views.profile_list_view, name="profiles"),
+    path("staff/profiles/<str:name>", views.profile_download_view, name="profile-download"),
 ]
@@ -0,0 +1,156 @@
+"""
+Per-process cache of logged-in users.
+
+Overview
+- Every authenticated request used to cost a DjangoUser primary-key query
+  (UserBackend.get_user, called by the session middleware) and, in the
+  profile and booking views, a second query for the UTENTE row.
+- UserCache resolves a session user id to the Django user together with
+  its UTENTE row (PERSONA and DIPENDENTE joined in) in one step, and keeps
+  the result for a short time in a bounded LRU map.
+- Callers always receive copies of the cached instances, so per-request
+  changes never leak into other requests or threads.
+
+Settings
+- USER_CACHE_TTL: seconds an entry is served before it is reloaded
+  (default 300; 0 disables the cache).
+- USER_CACHE_SIZE: maximum number of entries per process (default 1000).
+
+Invalidation
+- core.signals drops the entry on logout, on every save/delete of the
+  Django user (login, admin edits, UserBackend attribute sync) and on
+  DIPENDENTE changes; the UTENTE admin drops it in save_model().
+- The cache lives in process memory: other worker processes notice a change
+  at the latest after USER_CACHE_TTL seconds.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User as DjangoUser
+
+from .models import User
+
+# (expires_at, django user, UTENTE row or None)
+Entry = Tuple[float, DjangoUser, Optional[User]]
+
+
+class UserCache:
+    """
+    TTL + LRU map: Django user id -> (Django user, UTENTE row).
+
+    Counters (hits, misses, evictions) are per process; see stats().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Entry]" = OrderedDict()
+        self._ids_by_username: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bumped by every invalidation; a load that raced with one is not stored
+        self._generation = 0
+
+    @property
+    def ttl(self) -> int:
+        return getattr(settings, "USER_CACHE_TTL", 300)
+
+    @property
+    def size(self) -> int:
+        return getattr(settings, "USER_CACHE_SIZE", 1000)
+
+    def _lookup(self, user_id: int) -> Optional[Entry]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def _load(self, user_id: int) -> Optional[Entry]:
+        generation = self._generation
+        user = DjangoUser.objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        profile = (
+            User.objects.select_related("cf", "employee")
+            .filter(username=user.username)
+            .first()
+        )
+        entry = (time.monotonic() + self.ttl, user, profile)
+        if self.ttl > 0:
+            with self._lock:
+                if generation != self._generation:
+                    return entry
+                self._entries[user_id] = entry
+                self._entries.move_to_end(user_id)
+                self._ids_by_username[user.username] = user_id
+                while len(self._entries) > self.size:
+                    _, (_, old, _) = self._entries.popitem(last=False)
+                    self._ids_by_username.pop(old.username, None)
+                    self.evictions += 1
+        return entry
+
+    def get(self, user_id: int) -> Tuple[Optional[DjangoUser], Optional[User]]:
+        """
+        Return (Django user, UTENTE row) for `user_id`.
+
+        The Django user is None if it does not exist; the UTENTE row is None
+        for local-only accounts (e.g. superusers created with createsuperuser).
+        """
+        entry = self._lookup(user_id) or self._load(user_id)
+        if entry is None:
+            return None, None
+        _, user, profile = entry
+        return copy.copy(user), copy.copy(profile) if profile is not None else None
+
+    def get_user(self, user_id: int) -> Optional[DjangoUser]:
+        return self.get(user_id)[0]
+
+    def profile(self, user) -> Optional[User]:
+        """Return the UTENTE row of an authenticated Django user."""
+        if not getattr(user, "is_authenticated", False):
+            return None
+        return self.get(user.pk)[1]
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._ids_by_username.pop(entry[1].username, None)
+
+    def invalidate_username(self, username: str) -> None:
+        with self._lock:
+            self._generation += 1
+            user_id = self._ids_by_username.pop(username, None)
+            if user_id is not None:
+                self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._ids_by_username.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+cache = UserCache()
@@ -7,27 +7,49 @@ This module exposes simple views used by the app:
 - login_view: displays & processes the authentication form.
 - profile_view: shows data for the currently logged-in user.
 - logout_view: logs out the current user.
+- alogin_view / aregister_view: async variants of login_view and
+  register_view for ASGI; password hashing runs on core.hashing.pool.
+- ahomepage / aservices / alist_event / aprofile_view: async variants of the
+  read-only pages for ASGI (settings.ASYNC_READ_VIEWS), rendering the same
+  templates with the same context. Querysets are run with the async ORM
+  before rendering, so templates never query from the event loop.
+- list_event / alist_event search the upcoming events with ?q= (core.search).
+- Login attempts go through core.throttle first; over-limit attempts get a
+  429 response before any password is hashed.
 
 Notes:
 - Templates used by these views are under core/auth/ and user/.
 - register_view relies on RegisterForm from .forms which encapsulates
   validation and persistence of PersonModel and UserModel.
 - profile_view expects UserModel to relate to PersonModel via the CF FK.
+- The UTENTE row of the logged-in user comes from core.usercache, loaded
+  together with the session user, instead of a per-view query.
+- metrics_view: Prometheus metrics of all workers (core.metrics).
+- query_stats_view: staff-only summary of the SQL run per URL name
+  (core.querystats).
+- profile_list_view / profile_download_view: staff pages listing and serving
+  the request profiles saved by core.profiling.
 """
 
+from django.conf import settings
 from django.utils import timezone
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, logout
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin, login, logout
 from django.contrib.auth.forms import AuthenticationForm
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
+from django.http import FileResponse, HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db import DatabaseError
+from django.db import DatabaseError, transaction
 from datetime import datetime, timedelta
 from django.db.models import Q, Prefetch
 from .models import *
 
-from .forms import RegisterForm
+from . import (
+    availability, catalog, enrollment, hashing, metrics, profiling, querystats, search, throttle, usercache,
+)
+from .forms import AsyncAuthenticationForm, RegisterForm
 # from django.contrib.auth.decorators import login_required
 
 from django.contrib.auth.decorators import login_required
@@ -52,47 +74,83 @@ def homepage(request: HttpRequest) -> HttpResponse:
     Methods: GET
 
     Template: index.html
-    Context: none
+    Context:
+      - servizi_disponibili: one available Service per service type
 
     Returns a simple HttpResponse rendering the homepage template.
     """
-    tipi_servizi = Service.objects.values_list("type", flat=True).distinct()
-    servizi = Service.objects.filter(type__in=tipi_servizi, status="DISPONIBILE")
-    tipi_unici = []
-    visti = set()
-    for s in servizi:
-        if s.type not in visti:
-            tipi_unici.append(s)
-            visti.add(s.type)
+    return render(request, "index.html", _homepage_context())
+
 
-    return render(request, "index.html", {"servizi_disponibili": tipi_unici})
+def _homepage_context() -> dict:
+    return {"servizi_disponibili": catalog.cache.get()["summaries"]}
 
 
 def services(request):
-    from collections import defaultdict
-
-    service_types = Service.objects.filter(status="DISPONIBILE").values_list("type", flat=True).distinct()
-    grouped_services = {}
-    for s_type in service_types:
-        # Get all services of this type
-        services_of_type = Service.objects.filter(type=s_type, status="DISPONIBILE")
-        # Get related instances
-        if s_type == "CAMERA":
-            instances = Room.objects.filter(id__in=services_of_type)
-        elif s_type == "PISCINA":
-            instances = Pool.objects.filter(id__in=services_of_type)
-        elif s_type == "ATTIVITA_CON_ANIMALI":
-            instances = AnimalActivity.objects.filter(id__in=services_of_type)
-        elif s_type == "CAMPO_DA_GIOCO":
-            instances = Playground.objects.filter(id__in=services_of_type)
-        elif s_type == "RISTORANTE":
-            instances = Restaurant.objects.filter(id__in=services_of_type)
-        else:
-            instances = []
-        grouped_services[s_type] = instances
+    """
+    List the available services grouped by type.
+
+    The catalog comes from the versioned catalog cache (see core.catalog).
+    """
+    return render(request, "services.html", _services_context(request))
+
+
+def _services_context(request: HttpRequest) -> dict:
+    hours = ["%02d" % h for h in availability.SLOT_HOURS]
+    return {"grouped_services": catalog.cache.get()["catalog"], "hours": hours}
+
+
+async def _apin_user(request: HttpRequest):
+    """
+    Resolve the session user off the event loop and pin it on request.user.
+
+    request.user is a lazy object loaded on first access; templates read it
+    through the auth context processor, which in an async view would query
+    the database from the event loop. request.auser() also loads the session,
+    which the messages context processor reads.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+async def _aevaluate(queryset):
+    """
+    Run `queryset` (and its prefetches) with the async ORM and return it.
+
+    The rows stay in the queryset's result cache, so templates can iterate it
+    or call .exists() without touching the database.
+    """
+    async for _ in queryset:
+        pass
+    return queryset
+
+
+async def ahomepage(request: HttpRequest) -> HttpResponse:
+    """
+    Async variant of homepage (ASYNC_READ_VIEWS).
+
+    Reads the catalog cache in one sync_to_async call, as aservices does.
+    """
+    await _apin_user(request)
+    context = await sync_to_async(_homepage_context)()
+    return render(request, "index.html", context)
+
+
+async def aservices(request: HttpRequest) -> HttpResponse:
+    """
+    Async variant of services (ASYNC_READ_VIEWS).
+
+    The catalog cache is read in one sync_to_async call. It cannot be read
+    natively: Django's cache backends implement aget() and aset() as
+    sync_to_async wrappers, and async iteration of a queryset hops to the
+    sync thread per chunk, so an "async" read costs one hop for the version
+    check, another for the shared payload and more for a reload, where
+    this call costs one in all cases.
+    """
+    await _apin_user(request)
+    context = await sync_to_async(_services_context)(request)
+    return render(request, "services.html", context)
 
-    hours = ["08", "10", "12", "14", "16", "18", "20"]
-    return render(request, "services.html", {"grouped_services": grouped_services, "hours": hours})
 
 def register_view(request: HttpRequest) -> HttpResponse:
     """
@@ -150,6 +208,10 @@ def login_view(request: HttpRequest) -> HttpResponse:
       - form: AuthenticationForm instance
     """
     if request.method == "POST":
+        try:
+            throttle.limiter.check(request, request.POST.get("username"))
+        except throttle.Throttled as exc:
+            return _throttled_login(request, exc)
         form = AuthenticationForm(request, data=request.POST)
         if form.is_valid():
             user = form.get_user()
@@ -160,64 +222,124 @@ def login_view(request: HttpRequest) -> HttpResponse:
     return render(request, "core/auth/login.html", {"form": form})
 
 
+def _throttled_login(request: HttpRequest, exc: "throttle.Throttled") -> HttpResponse:
+    """Login page answered with 429 when core.throttle rejects the attempt."""
+    metrics.LOGINS.inc(result="throttled")
+    # AsyncAuthenticationForm validates the fields without authenticating
+    form = AsyncAuthenticationForm(request, data=request.POST)
+    form.is_valid()
+    form.add_error(None, exc.args[0])
+    response = render(request, "core/auth/login.html", {"form": form}, status=429)
+    response["Retry-After"] = str(exc.wait)
+    return response
+
+
+async def aregister_view(request: HttpRequest) -> HttpResponse:
+    """
+    Async variant of register_view.
+
+    Validation and persistence run in the sync thread; the new password is
+    hashed on the bounded hashing pool so the event loop stays responsive.
+    """
+    if request.method == "POST":
+        form = RegisterForm(request.POST)
+        if await sync_to_async(form.is_valid)():
+            password_hash = await hashing.amake_password(form.cleaned_data["password1"])
+            await sync_to_async(form.save)(password_hash=password_hash)
+            return redirect("login")
+    else:
+        form = RegisterForm()
+
+    return await sync_to_async(render)(request, "core/auth/register.html", {"form": form})
+
+
+async def alogin_view(request: HttpRequest) -> HttpResponse:
+    """
+    Async variant of login_view.
+
+    Credentials are checked with AsyncAuthenticationForm.aclean(), which
+    awaits the backends' aauthenticate(); UserBackend verifies the PBKDF2 hash
+    on core.hashing.pool.
+    """
+    if request.method == "POST":
+        try:
+            await sync_to_async(throttle.limiter.check)(request, request.POST.get("username"))
+        except throttle.Throttled as exc:
+            return await sync_to_async(_throttled_login)(request, exc)
+        form = AsyncAuthenticationForm(request, data=request.POST)
+        if await form.aclean():
+            await alogin(request, form.get_user())
+            return redirect(request.GET.get("next") or "/")
+    else:
+        form = AsyncAuthenticationForm(request)
+    return await sync_to_async(render)(request, "core/auth/login.html", {"form": form})
+
+
 @login_required
 def profile_view(request: HttpRequest) -> HttpResponse:
     """
     Show profile information for the logged-in user, including event enrollments
     and service bookings.
     """
-    try:
-        ut = User.objects.select_related("cf").get(username=request.user.username)
-    except User.DoesNotExist:
+    ut = usercache.cache.profile(request.user)
+    if ut is None:
         return render(request, "user/profile.html", {"person": None})
 
-    person = getattr(ut, "cf", None)
+    return render(
+        request,
+        "user/profile.html",
+        {"person": getattr(ut, "cf", None), **_profile_querysets(request.user.username)},
+    )
 
-    try:
-        subscriptions = (
-            Enrolls.objects.filter(
-                Q(username__username=request.user.username)
-                | Q(username=request.user.username)
-            )
-            .select_related("event")
-            .order_by("-event__date")
-        )
-    except Exception:
-        subscriptions = None
 
-    try:
-        bookings = (
-            Booking.objects.filter(username__username=request.user.username)
-            .select_related("username")
-            .prefetch_related(
-                Prefetch(
-                    "details",
-                    queryset=BookingDetail.objects.select_related("service"),
-                )
+def _profile_querysets(username: str) -> dict:
+    """Unevaluated querysets of the profile page of `username`."""
+    subscriptions = (
+        Enrolls.objects.filter(Q(username__username=username) | Q(username=username))
+        .select_related("event")
+        .order_by("-event__date")
+    )
+    bookings = (
+        Booking.objects.filter(username__username=username)
+        .select_related("username")
+        .prefetch_related(
+            Prefetch(
+                "details",
+                queryset=BookingDetail.objects.select_related("service"),
             )
-            .order_by("-booking_date") 
         )
-    except Exception:
-        bookings = Booking.objects.none()
+        .order_by("-booking_date")
+    )
+    reviews = (
+        Review.objects.filter(username__username=username)
+        .select_related("id_booking")
+        .order_by("-review_date")
+    )
+    return {"subscriptions": subscriptions, "bookings": bookings, "reviews": reviews}
 
-    try:
-        reviews = (
-            Review.objects.filter(username__username=request.user.username)
-            .select_related("id_booking")
-            .order_by("-review_date")
-        )
-    except Exception:
-        reviews = Review.objects.none()
 
+@login_required
+async def aprofile_view(request: HttpRequest) -> HttpResponse:
+    """
+    Async variant of profile_view (ASYNC_READ_VIEWS).
+
+    The querysets the template reads are run with the async ORM before
+    rendering. `bookings` is passed unevaluated, as profile_view does: the
+    template does not render it, and its BookingDetail prefetch (a CPkModel)
+    cannot run on this Django version.
+    """
+    user = await _apin_user(request)
+    ut = await sync_to_async(usercache.cache.profile)(user)
+    if ut is None:
+        return render(request, "user/profile.html", {"person": None})
+
+    querysets = _profile_querysets(user.username)
+    for key in ("subscriptions", "reviews"):
+        await _aevaluate(querysets[key])
     return render(
         request,
         "user/profile.html",
-        {
-            "person": person,
-            "subscriptions": subscriptions,
-            "bookings": bookings,
-            "reviews": reviews,
-        },
+        {"person": getattr(ut, "cf", None), **querysets},
     )
 
 
@@ -239,13 +361,43 @@ def logout_view(request: HttpRequest) -> HttpResponseRedirect:
     return redirect("/")
 
 
+def _current_profile(request: HttpRequest) -> User:
+    """UTENTE row of the logged-in user (cached, see core.usercache)."""
+    profile = usercache.cache.profile(request.user)
+    if profile is None:
+        raise Http404("No UTENTE row for the current user.")
+    return profile
+
+
 def list_event(request):
     """
     Shows all future events (data_evento >= today).
+    With ?q=, only the upcoming events matching the text, best match first
+    (core.search).
     If the user is authenticated, allows subscription.
     """
-    eventi = Event.objects.filter(date__gte=timezone.now().date()).order_by("date")
-    return render(request, "core/events/event-list.html", {"eventi": eventi})
+    query = request.GET.get("q", "").strip()
+    return render(
+        request,
+        "core/events/event-list.html",
+        {"eventi": _upcoming_events(query), "query": query},
+    )
+
+
+def _upcoming_events(query: str = ""):
+    events = Event.objects.filter(date__gte=timezone.now().date()).order_by("date")
+    if query:
+        events = search.search("events", query, events)[: search.max_results()]
+    return events
+
+
+async def alist_event(request: HttpRequest) -> HttpResponse:
+    """Async variant of list_event (ASYNC_READ_VIEWS)."""
+    await _apin_user(request)
+    query = request.GET.get("q", "").strip()
+    # the local search index is built and queried with the sync ORM
+    eventi = await _aevaluate(await sync_to_async(_upcoming_events)(query))
+    return render(request, "core/events/event-list.html", {"eventi": eventi, "query": query})
 
 
 @login_required
@@ -254,45 +406,52 @@ def event_subscription(request, event_id):
     Handles event enrollment for the authenticated user.
 
     - Retrieves the event by ID.
-    - On POST: gets the number of participants (default 1), finds the user in the DB.
-    - If an enrollment already exists, increments participants and decreases event seats accordingly.
-    - Shows a success message on success, error message on DB error (e.g., event full).
+    - On POST: gets the number of participants (default 1) and reserves the
+      seats through core.enrollment.reserve_seats, which creates or extends
+      the enrollment and decrements the event seats atomically in the DB.
+    - When the event is full the request is queued on the event waitlist and
+      promoted automatically as soon as seats are freed.
     - Always redirects to the event list.
     """
     event = get_object_or_404(Event, pk=event_id)
 
     if request.method == "POST":
-        participants = int(request.POST.get("partecipanti", 1))
-        user_db = get_object_or_404(User, username=request.user.username)
+        try:
+            participants = int(request.POST.get("partecipanti", 1))
+        except ValueError:
+            participants = 0
+        if participants < 1:
+            metrics.ENROLLMENTS.inc(result="invalid")
+            messages.error(request, "Number of participants must be at least 1.")
+            return redirect("list-event")
 
-        enrollment = Enrolls.objects.filter(event=event, username=user_db).first()
+        user_db = _current_profile(request)
 
         try:
-            if enrollment:
-                if event.seats >= participants:
-                    enrollment.participants += participants
-                    enrollment.save()
-                    event.seats -= participants
-                    event.save()
-                    messages.success(request, "Enrollment updated successfully!")
-                else:
-                    messages.error(request, "Not enough seats available.")
-            else:
-                if event.seats >= participants:
-                    Enrolls.objects.create(
-                        event=event,
-                        username=user_db,
-                        participants=participants,
-                    )
-                    event.seats -= participants
-                    event.save()
-                    messages.success(request, "Enrollment successful!")
-                else:
-                    messages.error(request, "Not enough seats available.")
+            result = enrollment.reserve_seats(event.pk, user_db.pk, participants)
         except DatabaseError:
-            messages.error(
-                request, "Invalid enrollment: no seats available or limit exceeded."
-            )
+            metrics.ENROLLMENTS.inc(result="error")
+            messages.error(request, "Enrollment failed, please try again.")
+            return redirect("list-event")
+
+        if result == enrollment.UPDATED:
+            metrics.ENROLLMENTS.inc(result="updated")
+            messages.success(request, "Enrollment updated successfully!")
+        elif result == enrollment.ENROLLED:
+            metrics.ENROLLMENTS.inc(result="enrolled")
+            messages.success(request, "Enrollment successful!")
+        else:
+            position = enrollment.join_waitlist(event.pk, user_db.pk, participants)
+            if position is None:
+                # seats were freed after the reservation failed
+                metrics.ENROLLMENTS.inc(result="enrolled")
+                messages.success(request, "Enrollment successful!")
+            else:
+                metrics.ENROLLMENTS.inc(result="waitlisted")
+                messages.info(
+                    request,
+                    f"Not enough seats available: you are number {position} on the waitlist.",
+                )
 
     return redirect("list-event")
 
@@ -301,21 +460,19 @@ def event_subscription(request, event_id):
 def cancel_enrollment(request, event_id):
     """
     Cancels the logged-in user's enrollment for an event.
-    The DB trigger handles seat increment.
+    The DB trigger handles seat increment; the freed seats are then assigned
+    to the event waitlist in the same transaction.
     """
     if request.method == "POST":
-        user_db = get_object_or_404(User, username=request.user.username)
-
-        enrollment = Enrolls.objects.filter(event_id=event_id, username=user_db).first()
-
-        if enrollment:
-            enrollment.delete()
+        user_db = _current_profile(request)
+        enrollment.cancel_enrollment(event_id, user_db.pk)
 
     return redirect("profile")
 
 
-def choose_service(request, tipo):
-    istanze = Service.objects.filter(type=tipo, status="DISPONIBILE")
+def choose_service(request, type):
+    tipo = catalog.normalize_type(type)
+    istanze = catalog.cache.get()["catalog"].get(tipo, [])
     return render(
         request, "core/choose_service.html", {"istanze": istanze, "tipo": tipo}
     )
@@ -338,19 +495,9 @@ def book_service(request, type=None, service_id=None, service_type=None):
         type = service_type
 
     if type:
-        # Dynamically select instances based on service type
-        if type == "ROOM":
-            instances = Room.objects.select_related("id").all()
-        elif type == "POOL":
-            instances = Pool.objects.select_related("id").all()
-        elif type == "ANIMAL_ACTIVITY":
-            instances = AnimalActivity.objects.select_related("id").all()
-        elif type == "PLAYGROUND":
-            instances = Playground.objects.select_related("id").all()
-        elif type == "RESTAURANT":
-            instances = Restaurant.objects.select_related("id").all()
-        else:
-            instances = []
+        # All instances of the type, whatever their status, in one query
+        tipo = catalog.normalize_type(type)
+        instances = catalog.load_catalog(tipo, available_only=False).get(tipo, [])
 
         context = {
             "instances": instances,
@@ -383,6 +530,17 @@ def book_service(request, type=None, service_id=None, service_type=None):
         raise Http404("Invalid parameter for service booking.")
 
 
+class _BookingConflict(Exception):
+    """The period was booked by another request; rolls the transaction back."""
+
+
+def _booking_rejected(request: HttpRequest, message: str, result: str = "invalid") -> HttpResponse:
+    """Count a refused booking, show why and go back to the services page."""
+    metrics.BOOKINGS.inc(result=result)
+    messages.error(request, message)
+    return redirect("services")
+
+
 @login_required(login_url="login")
 @require_POST
 def book_service_from_services(request):
@@ -390,9 +548,14 @@ def book_service_from_services(request):
     Handles booking submission from the services page.
     - Rooms (CAMERA): requires start_date and end_date.
     - Other services: requires start_date, start_time, end_time (max 2 consecutive hours).
-    - Creates Booking and BookingDetail records for the user.
+    - Rejects the request if the service is already booked for an overlapping
+      period: the availability index (see core.availability) answers most
+      conflicts without a query, then the transaction locks the Service row
+      and checks DETTAGLIO_PRENOTAZIONE, so concurrent requests on any worker
+      cannot both book the same period.
+    - Creates Booking and BookingDetail records for the user in one transaction.
     """
-    user_db = get_object_or_404(User, username=request.user.username)
+    user_db = _current_profile(request)
 
     service_type = request.POST.get("service_type")
     instance_id = request.POST.get("instance")
@@ -405,20 +568,24 @@ def book_service_from_services(request):
     try:
         service = Service.objects.get(id=instance_id)
     except Service.DoesNotExist:
-        messages.error(request, "Selected service does not exist.")
-        return redirect("services")
+        return _booking_rejected(request, "Selected service does not exist.")
 
     # Validate dates/times
     if service_type.upper() == "CAMERA":
         # Room booking → needs both start and end dates
         if not (start_date and end_date):
-            messages.error(request, "Please provide start and end dates.")
-            return redirect("services")
+            return _booking_rejected(request, "Please provide start and end dates.")
+        try:
+            dt_start = datetime.strptime(start_date, "%Y-%m-%d")
+            dt_end = datetime.strptime(end_date, "%Y-%m-%d")
+        except ValueError:
+            return _booking_rejected(request, "Invalid date format.")
+        if dt_end < dt_start:
+            return _booking_rejected(request, "End date must not be before start date.")
     else:
         # Other services → need date and both times
         if not (start_date and start_time and end_time):
-            messages.error(request, "Please provide date and time.")
-            return redirect("services")
+            return _booking_rejected(request, "Please provide date and time.")
         try:
             dt_start = datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M")
             dt_end = datetime.strptime(f"{start_date} {end_time}", "%Y-%m-%d %H:%M")
@@ -427,44 +594,84 @@ def book_service_from_services(request):
 
             # End time must be after start time
             if duration <= timedelta(0):
-                messages.error(request, "End time must be later than start time.")
-                return redirect("services")
+                return _booking_rejected(request, "End time must be later than start time.")
 
             # Max duration = 2 hours
             if duration > timedelta(hours=2):
-                messages.error(request, "Maximum booking duration is 2 hours.")
-                return redirect("services")
+                return _booking_rejected(request, "Maximum booking duration is 2 hours.")
 
         except Exception:
-            messages.error(request, "Invalid date or time format.")
-            return redirect("services")
+            return _booking_rejected(request, "Invalid date or time format.")
+
+    dt_start, dt_end = availability.normalize(dt_start, dt_end)
+
+    # Fast pre-filter on the in-memory interval index (may lag other workers)
+    if not availability.is_free(service, dt_start, dt_end):
+        return _booking_rejected(request, "The selected service is already booked for that period.", "conflict")
 
     # Create Booking and BookingDetail
     try:
-        booking = Booking.objects.create(
-            username=user_db,
-            booking_date=timezone.now(),
-        )
-
-        if service_type.upper() == "CAMERA":
-            # Room booking detail
-            BookingDetail.objects.create(
-                booking=booking,
-                service=service,
-                start_date=start_date,
-                end_date=end_date,
+        with transaction.atomic():
+            # the row lock serializes the bookings of this service; the
+            # overlap is then checked on the database itself
+            Service.objects.select_for_update().get(pk=service.pk)
+            if availability.booked(service, dt_start, dt_end).exists():
+                raise _BookingConflict
+            booking = Booking.objects.create(
+                username=user_db,
+                booking_date=timezone.now(),
             )
-        else:
-            # Other services → same-day booking with max 2 hours
             BookingDetail.objects.create(
                 booking=booking,
                 service=service,
-                start_date=start_date,
-                end_date=start_date,
+                start_date=dt_start,
+                end_date=dt_end,
             )
 
+        metrics.BOOKINGS.inc(result="success")
         messages.success(request, "Booking successful!")
+    except _BookingConflict:
+        return _booking_rejected(request, "The selected service is already booked for that period.", "conflict")
     except Exception as e:
+        metrics.BOOKINGS.inc(result="error")
         messages.error(request, f"Booking failed: {str(e)}")
 
     return redirect("services")
+
+
+@staff_member_required
+def query_stats_view(request: HttpRequest) -> HttpResponse:
+    """
+    Staff page with the rolling per-URL-name SQL summary of this worker
+    (see core.querystats); ?format=json returns the same data as JSON.
+    """
+    summary = querystats.registry.summary()
+    if request.GET.get("format") == "json":
+        return JsonResponse({"routes": summary, "stats": querystats.registry.stats()})
+    return render(request, "core/staff/query-stats.html", {"routes": summary})
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Prometheus scrape endpoint (core.metrics), open to staff users and to the
+    addresses in settings.METRICS_ALLOWED_IPS.
+    """
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+    if allowed and throttle.client_ip(request) not in allowed and not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@staff_member_required
+def profile_list_view(request: HttpRequest) -> HttpResponse:
+    """Recent request profiles (core.profiling), newest first."""
+    return render(request, "core/staff/profiles.html", {"profiles": profiling.recent()})
+
+
+@staff_member_required
+def profile_download_view(request: HttpRequest, name: str) -> FileResponse:
+    """Download one saved .pstats / .speedscope.json file."""
+    path = profiling.profile_file(name)
+    if path is None:
+        raise Http404("No such profile.")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
@@ -211,6 +211,18 @@ CREATE TABLE ISCRIVE (
     CONSTRAINT FKisc_UTE_FK FOREIGN KEY (username) REFERENCES UTENTE(username)
 );
 
+CREATE TABLE LISTA_ATTESA (
+    ID_attesa INT AUTO_INCREMENT NOT NULL,
+    ID_evento INT NOT NULL,
+    username VARCHAR(32) NOT NULL,
+    partecipanti INT NOT NULL CHECK (partecipanti > 0),
+    data_richiesta TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT ID_LISTA_ATTESA_ID PRIMARY KEY (ID_attesa),
+    CONSTRAINT SID_LISTA_ATTESA_ID UNIQUE (ID_evento, username),
+    CONSTRAINT FKatt_EVE FOREIGN KEY (ID_evento) REFERENCES EVENTO(ID_evento),
+    CONSTRAINT FKatt_UTE_FK FOREIGN KEY (username) REFERENCES UTENTE(username)
+);
+
 CREATE TABLE OSPITA (
     CF VARCHAR(16) NOT NULL,
     username VARCHAR(32) NOT NULL,
@@ -259,6 +271,8 @@ CREATE INDEX FKesegue_IND ON ORDINE (username);
 CREATE INDEX FKeffettua_IND ON PRENOTAZIONE (username);
 CREATE INDEX FKgiudica_IND ON RECENSIONE (ID_prenotazione);
 CREATE INDEX FKisc_UTE_IND ON iscrive (username);
+CREATE INDEX FKatt_EVE_IND ON LISTA_ATTESA (ID_evento, ID_attesa);
+CREATE INDEX FKatt_UTE_IND ON LISTA_ATTESA (username);
 CREATE INDEX FKosp_UTE_IND ON ospita (username);
 CREATE INDEX FKriguarda_IND ON DETTAGLIO_PRENOTAZIONE (ID_servizio);
 CREATE INDEX FKriguardano_IND ON DETTAGLIO_ORDINE (ID_ordine);
@@ -266,6 +280,12 @@ CREATE INDEX FKscrive_IND ON RECENSIONE (username);
 CREATE INDEX FKsvo_TUR_IND ON svolge (ID_turno);
 CREATE INDEX FKcom_PAC_IND ON composto (ID_pacchetto);
 
+-- Full-text indexes (core.search); on an existing database run these three
+-- statements once
+CREATE FULLTEXT INDEX FT_RECENSIONE_IND ON RECENSIONE (descrizione);
+CREATE FULLTEXT INDEX FT_EVENTO_IND ON EVENTO (titolo, descrizione);
+CREATE FULLTEXT INDEX FT_ATTIVITA_IND ON ATTIVITA_CON_ANIMALI (descrizione);
+
 -- Trigger Section
 -- _______________
 
@@ -302,27 +322,21 @@ BEGIN
 END$$
 
 -- Trigger: che decrementa il numero di posti rimasti dell'evento in base al numero di partecipanti iscritti
+-- Il controllo e il decremento avvengono nella stessa UPDATE condizionale,
+-- così due iscrizioni concorrenti non possono leggere lo stesso valore di posti.
 CREATE TRIGGER trg_decrementa_posti_evento
 BEFORE INSERT ON iscrive
 FOR EACH ROW
 BEGIN
-    DECLARE posti_disponibili INT;
+    UPDATE EVENTO
+    SET posti = posti - NEW.partecipanti
+    WHERE ID_evento = NEW.ID_evento
+      AND posti >= NEW.partecipanti;
 
-    -- Recupero i posti disponibili
-    SELECT posti
-    INTO posti_disponibili
-    FROM EVENTO
-    WHERE ID_evento = NEW.ID_evento;
-
-    -- Se non ci sono abbastanza posti, blocco l'iscrizione
-    IF posti_disponibili < NEW.partecipanti THEN
+    -- Se nessuna riga è stata aggiornata non ci sono abbastanza posti: blocco l'iscrizione
+    IF ROW_COUNT() = 0 THEN
         SIGNAL SQLSTATE '45000'
             SET MESSAGE_TEXT = 'Posti insufficienti per questo evento';
-    ELSE
-        -- Decremento i posti disponibili
-        UPDATE EVENTO
-        SET posti = posti_disponibili - NEW.partecipanti
-        WHERE ID_evento = NEW.ID_evento;
     END IF;
 END$$
 
@@ -334,7 +348,7 @@ BEGIN
   UPDATE EVENTO
   SET posti = posti + OLD.partecipanti
   WHERE ID_evento = OLD.ID_evento;
-END;
+END$$
 
 
 -- Trigger: che si assicura che un utente abbia usufruito del servizio che vuole recensire
@@ -374,95 +388,9 @@ DELIMITER ;
 
 -- Event Section
 -- _______________
-DELIMITER $$
-
-CREATE EVENT IF NOT EXISTS evt_aggiorna_stato_servizi
-ON SCHEDULE EVERY 1 HOUR
-STARTS CURRENT_TIMESTAMP
-DO
-BEGIN
-    -- 1. Servizi che devono essere OCCUPATI perché la prenotazione è attiva
-    UPDATE SERVIZIO S
-    SET S.status = 'OCCUPATO'
-    WHERE EXISTS (
-        SELECT 1
-        FROM DETTAGLIO_PRENOTAZIONE DP
-        WHERE DP.ID_servizio = S.ID_servizio
-          AND DP.data_inizio <= NOW()
-          AND DP.data_fine > NOW()
-    );
-
-    -- 2. Servizi che devono tornare DISPONIBILI perché la prenotazione è finita
-    UPDATE SERVIZIO S
-    SET S.status = 'DISPONIBILE'
-    WHERE S.status = 'OCCUPATO'
-      AND NOT EXISTS (
-          SELECT 1
-          FROM DETTAGLIO_PRENOTAZIONE DP
-          WHERE DP.ID_servizio = S.ID_servizio
-            AND DP.data_fine > NOW()
-      );
-END$$
+-- Service statuses (OCCUPATO while a booking is running, DISPONIBILE after)
+-- are updated by `python manage.py service_status_scheduler` when each
+-- booking starts and ends. It replaces the hourly evt_aggiorna_stato_servizi
+-- event, which is dropped from databases created before.
 
-DELIMITER $$
-
-
-CREATE EVENT IF NOT EXISTS evt_aggiorna_stato_servizi
-ON SCHEDULE EVERY 1 HOUR
-STARTS CURRENT_TIMESTAMP
-DO
-BEGIN
-    -- 1. Servizi che devono essere OCCUPATI perché la prenotazione è attiva
-    UPDATE SERVIZIO S
-    SET S.status = 'OCCUPATO'
-    WHERE EXISTS (
-        SELECT 1
-        FROM DETTAGLIO_PRENOTAZIONE DP
-        WHERE DP.ID_servizio = S.ID_servizio
-          AND DP.data_inizio <= NOW()
-          AND DP.data_fine > NOW()
-    );
-
-    -- 2. Servizi che devono tornare DISPONIBILI perché la prenotazione è finita
-    UPDATE SERVIZIO S
-    SET S.status = 'DISPONIBILE'
-    WHERE S.status = 'OCCUPATO'
-      AND NOT EXISTS (
-          SELECT 1
-          FROM DETTAGLIO_PRENOTAZIONE DP
-          WHERE DP.ID_servizio = S.ID_servizio
-            AND DP.data_fine > NOW()
-      );
-END$$
-
-DELIMITER $$
-
-CREATE EVENT IF NOT EXISTS evt_aggiorna_stato_servizi
-ON SCHEDULE EVERY 1 HOUR
-STARTS CURRENT_TIMESTAMP
-DO
-BEGIN
-    -- 1. Servizi che devono essere OCCUPATI perché la prenotazione è attiva
-    UPDATE SERVIZIO S
-    SET S.status = 'OCCUPATO'
-    WHERE EXISTS (
-        SELECT 1
-        FROM DETTAGLIO_PRENOTAZIONE DP
-        WHERE DP.ID_servizio = S.ID_servizio
-          AND DP.data_inizio <= NOW()
-          AND DP.data_fine > NOW()
-    );
-
-    -- 2. Servizi che devono tornare DISPONIBILI perché la prenotazione è finita
-    UPDATE SERVIZIO S
-    SET S.status = 'DISPONIBILE'
-    WHERE S.status = 'OCCUPATO'
-      AND NOT EXISTS (
-          SELECT 1
-          FROM DETTAGLIO_PRENOTAZIONE DP
-          WHERE DP.ID_servizio = S.ID_servizio
-            AND DP.data_fine > NOW()
-      );
-END$$
-
-DELIMITER ;
+DROP EVENT IF EXISTS evt_aggiorna_stato_servizi;